@@ -1,53 +1,37 @@
 import alblogs
 import logging
 import datetime
-import os.path
-import gzip
 
-LOGGER = None
+from alblogs import archive, jobs
 
-# 10 MB buffer for reading/writing
-BUFFER_SIZE = 10 * 1024 * 1024
+LOGGER = None
 
 
 def read_arguments():
     argparser = alblogs.get_default_argparser()
     argparser.add_argument("date", metavar="DATE", type=str, help="Date for which to process ALB logs (yyyy-mm-dd)")
-    argparser.add_argument("-a", "--age", action='store', default=7, metavar="AGE", type=int, help="Minimum age (in days) for files to archive")
+    argparser.add_argument("-a", "--age", action='store', default=jobs.DEFAULT_ARCHIVE_AGE, metavar="AGE", type=int, help="Minimum age (in days) for files to archive")
+    argparser.add_argument("-w", "--workers", action='store', default=1, metavar="WORKERS", type=int, help="Number of worker processes used for compressing (default 1, no worker processes)")
+    argparser.add_argument("-f", "--format", action='store', default="gz", choices=sorted(archive.FORMAT_EXTENSIONS.keys()), help="Archive format (default gz)")
+    argparser.add_argument("-k", "--compact", action="store_true", help="Compact the database (VACUUM INTO) before archiving it")
+    argparser.add_argument("-i", "--clientfilter", action="store_true", help="Also write a bloom filter of the client addresses next to the archive")
+    argparser.add_argument("-d", "--dropindexes", action="store_true", help="Drop the secondary indexes from the compacted database, they are rebuilt when needed (implies --compact)")
 
     args = argparser.parse_args()
 
-    # try to convert args.date to check if it is a valid date
-    datetime.datetime.strptime(args.date, '%Y-%m-%d')
-
-    return args
+    if args.workers < 1:
+        argparser.error("Number of workers must be at least 1")
 
+    if not archive.is_format_available(args.format):
+        argparser.error("Archive format {} is not available, the required package is not installed".format(args.format))
 
-def archive_file(filename, filepath, size, arch_dir):
-    target_zip = "{}.gz".format(os.path.join(arch_dir, filename))
-    if os.path.exists(target_zip):
-        raise RuntimeError("Target for archiving '{}' already exists".format(target_zip))
+    if args.dropindexes:
+        args.compact = True
 
-    LOGGER.info("Start archiving {} to {}".format(filepath, target_zip))
-
-    LOGGER.debug("Processing {:,d} bytes".format(size))
-
-    with open(filepath, 'rb') as infile:
-        with gzip.open(target_zip, 'wb') as outfile:
-            buffer = infile.read(BUFFER_SIZE)
-            processed = 0
-            while buffer:
-                outfile.write(buffer)
-                processed += len(buffer)
-
-                if processed % (5 * BUFFER_SIZE) == 0:
-                    LOGGER.debug("Read {:,d} bytes".format(processed))
-
-                buffer = infile.read(BUFFER_SIZE)
+    # try to convert args.date to check if it is a valid date
+    datetime.datetime.strptime(args.date, '%Y-%m-%d')
 
-    LOGGER.debug("Read {:,d} bytes".format(processed))
-    LOGGER.info("Finished archiving {} to {}".format(filepath, target_zip))
-    os.remove(filepath)
+    return args
 
 # ------------------------------ MAIN PROGRAM ------------------------------
 
@@ -60,28 +44,5 @@ LOGGER.info("Starting archive.py")
 
 config = alblogs.get_configuration()
 
-arch_dir = config.get_archive_dir()
-if os.path.exists(arch_dir):
-    if not os.path.isdir(arch_dir):
-        raise RuntimeError("Path '{}' is not a directory".format(arch_dir))
-else:
-    os.makedirs(arch_dir)
-
-LOGGER.info("Start date  : {}".format(args.date))
-LOGGER.info("Age         : {}".format(args.age))
-
-age_delta = datetime.timedelta(days=args.age)
-
-arch_date = (datetime.datetime.strptime(args.date, '%Y-%m-%d') - age_delta).strftime('%Y-%m-%d')
-
-LOGGER.info("Archive date: {}".format(arch_date))
-
-data_dir = config.get_data_dir()
-
-with os.scandir(data_dir) as it:
-    for entry in it:
-        if entry.is_file() and entry.name.endswith("-alblogs.db") and entry.name[:10] < arch_date:
-            LOGGER.info("Found file to archive: {}".format(entry.path))
-            archive_file(entry.name, entry.path, entry.stat().st_size, arch_dir)
-
-
+jobs.archive_logs(config, args.date, age=args.age, archive_format=args.format, workers=args.workers,
+                  compact=args.compact, drop_indexes=args.dropindexes, client_filter=args.clientfilter)
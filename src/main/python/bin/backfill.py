@@ -0,0 +1,129 @@
+import alblogs
+import logging
+import os.path
+import datetime
+import subprocess
+import multiprocessing.pool
+
+LOGGER = None
+
+
+def read_arguments():
+    argparser = alblogs.get_default_argparser()
+    argparser.add_argument("fromdate", metavar="FROMDATE", type=str, help="First date to backfill (yyyy-mm-dd)")
+    argparser.add_argument("todate", metavar="TODATE", type=str, help="Last date to backfill (yyyy-mm-dd)")
+    argparser.add_argument("-w", "--workers", action='store', default=os.cpu_count(), metavar="WORKERS", type=int, help="Number of dates processed concurrently (default {})".format(os.cpu_count()))
+    argparser.add_argument("-s", "--skipdownload", action="store_true", help="When this option is provided the downloading of logs is skipped")
+    argparser.add_argument("-r", "--replace", action="store_true", help="Also process dates for which stats are already loaded, replacing them")
+
+    args = argparser.parse_args()
+
+    # try to convert the dates to check if they are valid dates
+    from_date = datetime.datetime.strptime(args.fromdate, '%Y-%m-%d')
+    to_date = datetime.datetime.strptime(args.todate, '%Y-%m-%d')
+
+    if from_date > to_date:
+        argparser.error("FROMDATE must not be after TODATE")
+
+    if args.workers < 1:
+        argparser.error("Number of workers must be at least 1")
+
+    return args
+
+
+def date_range(from_date, to_date):
+    result = []
+    current = datetime.datetime.strptime(from_date, '%Y-%m-%d')
+    last = datetime.datetime.strptime(to_date, '%Y-%m-%d')
+    while current <= last:
+        result.append(current.strftime('%Y-%m-%d'))
+        current += datetime.timedelta(days=1)
+
+    return result
+
+
+def get_logsdb_file(datestr):
+    return "{}/{}-alblogs.db".format(config.get_data_dir(), datestr)
+
+
+def execute(params):
+    LOGGER.debug("Execute: {}".format(params))
+
+    result = subprocess.run(params)
+    if result.returncode != 0:
+        raise RuntimeError("Process '{}' returned error".format(" ".join(params[1:])))
+
+
+def process_date(datestr):
+    # Runs in a pool thread, the actual work is done by the child processes so the dates are
+    # processed in parallel. Every date writes its own logs database, stats.db is only written
+    # by the main thread.
+    try:
+        if not args.skipdownload:
+            params = ["python", "download_logs.py"]
+            if args.config:
+                params.append("--config={}".format(args.config))
+            params.append(datestr)
+            execute(params)
+
+        if os.path.exists(get_logsdb_file(datestr)):
+            LOGGER.info("Logs database for date {} already exists, not parsing logs again".format(datestr))
+        else:
+            params = ["python", "parse_logs.py"]
+            if args.config:
+                params.append("--config={}".format(args.config))
+            params.append(datestr)
+            execute(params)
+
+    except RuntimeError as e:
+        return datestr, str(e)
+
+    return datestr, None
+
+# ------------------------------ MAIN PROGRAM ------------------------------
+
+
+args = read_arguments()
+
+alblogs.initialize(args)
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.info("Starting backfill.py")
+
+config = alblogs.get_configuration()
+
+statsdb_file = "{}/stats.db".format(config.get_data_dir())
+statsdb = alblogs.open_statsdb(statsdb_file, create=True)
+
+# a date is skipped only when stats have been loaded from its own logs, a date of which only the
+# entries in the logs of the next date are loaded (e.g. its own load failed) is processed again
+if args.replace:
+    dates = date_range(args.fromdate, args.todate)
+else:
+    dates = statsdb.query_missing_dates(args.fromdate, args.todate)
+    for datestr in sorted(set(date_range(args.fromdate, args.todate)) - set(dates)):
+        LOGGER.info("Stats for date {} are already loaded, skipping it".format(datestr))
+
+LOGGER.info("Backfilling {} dates using {} workers".format(len(dates), args.workers))
+
+failed_dates = []
+with multiprocessing.pool.ThreadPool(processes=args.workers) as pool:
+    # dates are transferred to stats.db one at a time, as soon as their logs database is complete
+    for datestr, error in pool.imap_unordered(process_date, dates):
+        if error is None:
+            try:
+                statsdb.transfer_date(datestr, get_logsdb_file(datestr))
+                LOGGER.info("Stats for date {} loaded".format(datestr))
+                continue
+            except RuntimeError as e:
+                error = str(e)
+
+        LOGGER.error("Backfill of date {} failed: {}".format(datestr, error))
+        failed_dates.append(datestr)
+
+statsdb.log_cache_stats()
+
+if len(failed_dates) > 0:
+    raise RuntimeError("Backfill failed for {} dates: {}".format(len(failed_dates), ", ".join(sorted(failed_dates))))
+
+LOGGER.info("Backfilled {} dates".format(len(dates)))
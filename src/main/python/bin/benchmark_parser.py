@@ -0,0 +1,83 @@
+import argparse
+import random
+import time
+
+from alblogs import logparser
+
+# One synthetic day: 288 log files (one per 5 minutes) of 1000 lines each
+DEFAULT_LINE_COUNT = 288 * 1000
+
+REQUEST_TYPES = ["http", "https", "h2"]
+STATUS_CODES = ["200", "200", "200", "200", "301", "404", "500", "502"]
+USER_AGENTS = ["Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/67.0.3396.99 Safari/537.36",
+               "Mozilla/5.0 (iPhone; CPU iPhone OS 11_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/11.0 Mobile/15E148 Safari/604.1",
+               "curl/7.46.0",
+               "-"]
+
+
+def read_arguments():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("-n", "--lines", action='store', default=DEFAULT_LINE_COUNT, metavar="LINES", type=int, help="Number of synthetic log lines to parse (default is one day of 288 x 1000 lines)")
+    argparser.add_argument("-s", "--seed", action='store', default=0, metavar="SEED", type=int, help="Seed for the random generator")
+
+    return argparser.parse_args()
+
+
+def generate_line(rnd, index, line_count):
+    seconds = (index * 86400) // line_count
+    timestamp = "2018-07-24T{:02d}:{:02d}:{:02d}.{:06d}Z".format(seconds // 3600, (seconds // 60) % 60, seconds % 60, rnd.randint(0, 999999))
+    status_code = rnd.choice(STATUS_CODES)
+    query = ""
+    if rnd.random() < 0.5:
+        query = "?id={}&page={}".format(rnd.randint(1, 1000), rnd.randint(1, 10))
+
+    line = ""
+    line += "{} {} app/my-loadbalancer/50dc6c495c0c9188 ".format(rnd.choice(REQUEST_TYPES), timestamp)
+    line += "192.168.{}.{}:{} 10.0.0.{}:80 ".format(rnd.randint(0, 255), rnd.randint(0, 255), rnd.randint(1024, 65535), rnd.randint(1, 4))
+    line += "0.000 {:.3f} 0.000 {} {} {} {} ".format(rnd.random() * 2, status_code, status_code, rnd.randint(100, 1000), rnd.randint(100, 100000))
+    line += "\"GET https://www.example.com:443/api/item/{}{} HTTP/1.1\" \"{}\" ".format(rnd.randint(1, 100), query, rnd.choice(USER_AGENTS))
+    line += "ECDHE-RSA-AES128-GCM-SHA256 TLSv1.2 arn:aws:elasticloadbalancing:us-east-2:123456789012:targetgroup/my-targets/73e2d6bc24d8a067 "
+    line += "\"Root=1-58337281-{:024x}\" \"www.example.com\" \"arn:aws:acm:us-east-2:123456789012:certificate/12345678-1234-1234-1234-123456789012\" ".format(rnd.getrandbits(96))
+    line += "0 {} \"forward\" \"-\" \"-\"".format(timestamp)
+
+    return line
+
+
+def parse_line_regex(line):
+    # Parses every line with the LOG_ENTRY_RE fallback, as parse_line did before the tokenizer
+    fields = logparser.match_line(line)
+    if fields is None:
+        return None
+
+    return logparser.build_record(fields)
+
+
+def run_benchmark(name, parse_function, lines):
+    start = time.perf_counter()
+    matched = 0
+    for line in lines:
+        if parse_function(line):
+            matched += 1
+
+    duration = time.perf_counter() - start
+    lines_per_sec = len(lines) / duration
+    print("{:<10} {:>10,d} lines in {:7.3f} sec, {:>10,.0f} lines/sec ({:,d} matched)".format(name, len(lines), duration, lines_per_sec, matched))
+
+    return lines_per_sec
+
+# ------------------------------ MAIN PROGRAM ------------------------------
+
+
+args = read_arguments()
+
+rnd = random.Random(args.seed)
+lines = [generate_line(rnd, index, args.lines) for index in range(args.lines)]
+
+for line in lines[:1000]:
+    if logparser.parse_line(line) != parse_line_regex(line):
+        raise RuntimeError("Tokenizer and regular expression results differ for line: {}".format(line))
+
+regex_rate = run_benchmark("regex", parse_line_regex, lines)
+tokenizer_rate = run_benchmark("tokenizer", logparser.parse_line, lines)
+
+print("Speedup: {:.1f}x".format(tokenizer_rate / regex_rate))
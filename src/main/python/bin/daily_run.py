@@ -1,7 +1,9 @@
 import alblogs
 import logging
 import datetime
-import subprocess
+import boto3
+
+from alblogs import jobs, report, trendreport
 
 
 def read_arguments():
@@ -10,6 +12,9 @@ def read_arguments():
     argparser.add_argument("--skipdownload", "-s", action="store_true", help="When this option is provided the downloading of logs is skipped")
     argparser.add_argument("--trendfromdate", "-t", action="store", default=None, help="Start date for trend report")
     argparser.add_argument("--force", "-f", action="store_true", help="Force execution even if calculated run day is today")
+    argparser.add_argument("--aggregate", "-a", action="store_true", help="Aggregate the stats while parsing the logs instead of writing and re-reading the logs database")
+    argparser.add_argument("--stream", "-p", action="store_true", help="Parse the logs while they are downloaded instead of downloading them first, the log files are still saved")
+    argparser.add_argument("--nologsdb", "-n", action="store_true", help="Do not write the parsed logs to the logs database (requires --aggregate)")
 
     args = argparser.parse_args()
 
@@ -17,6 +22,9 @@ def read_arguments():
     if args.date:
         datetime.datetime.strptime(args.date, '%Y-%m-%d')
 
+    if args.nologsdb and not args.aggregate:
+        argparser.error("--nologsdb requires --aggregate, otherwise the parsed logs are not stored at all")
+
     return args
 
 
@@ -27,83 +35,15 @@ def find_next_date(statsdb):
     return next_date.strftime("%Y-%m-%d")
 
 
-def execute(params):
-    LOGGER.debug("Execute: {}".format(params))
-
-    result = subprocess.run(params)
-    if result.returncode == 0:
-        LOGGER.info("Process '{}' completed without errors".format(params[1]))
-    else:
-        LOGGER.error("Processes '{}' returned error, aborting execution".format(params[1]))
-        raise RuntimeError("Process '{}' returned error, aborting execution".format(params[1]))
-
-
-def execute_create_report(args):
-    params = []
-    params.append("python")
-    params.append("create_report.py")
-    if args.config:
-        params.append("--config={}".format(args.config))
-
-    params.append(run_date)
-    execute(params)
-
-
-def execute_parse_logs(args):
-    params = []
-    params.append("python")
-    params.append("parse_logs.py")
-    if args.config:
-        params.append("--config={}".format(args.config))
-
-    params.append(run_date)
-    execute(params)
-
-
-def execute_update_stats(args):
-    params = []
-    params.append("python")
-    params.append("update_stats.py")
-    if args.config:
-        params.append("--config={}".format(args.config))
-
-    params.append(run_date)
-    execute(params)
-
-
-def execute_download_logs(args):
-    params = []
-    params.append("python")
-    params.append("download_logs.py")
-    if args.config:
-        params.append("--config={}".format(args.config))
-
-    params.append(run_date)
-    execute(params)
-
-
-def execute_create_trend_report(args):
-    params = []
-    params.append("python")
-    params.append("create_trend_report.py")
-    if args.config:
-        params.append("--config={}".format(args.config))
-
-    if args.trendfromdate:
-        params.append("--fromdate={}".format(args.trendfromdate))
-
-    execute(params)
-
-
-def execute_archive(args):
-    params = []
-    params.append("python")
-    params.append("archive.py")
-    if args.config:
-        params.append("--config={}".format(args.config))
+def log_missing_dates(statsdb):
+    min_date = statsdb.query_min_date()
+    max_date = statsdb.query_max_date()
+    if min_date is None:
+        return
 
-    params.append(run_date)
-    execute(params)
+    missing_dates = statsdb.query_missing_dates(min_date, max_date)
+    if len(missing_dates) > 0:
+        LOGGER.warning("No stats loaded for {} dates between {} and {}: {}".format(len(missing_dates), min_date, max_date, ", ".join(missing_dates)))
 
 
 # ------------------------------ MAIN PROGRAM ------------------------------
@@ -116,10 +56,10 @@ alblogs.initialize(args)
 LOGGER = logging.getLogger(__name__)
 
 config = alblogs.get_configuration()
-statsdb_file = "{}/stats.db".format(config.get_data_dir(), args.date)
+statsdb_file = "{}/stats.db".format(config.get_data_dir())
 statsdb = alblogs.open_statsdb(statsdb_file, create=False)
 
-LOGGER.info("Starting download_logs.py")
+LOGGER.info("Starting daily_run.py")
 if args.date is None:
     run_date = find_next_date(statsdb)
     LOGGER.info("No date provided, next date selected from database: {}".format(run_date))
@@ -127,21 +67,38 @@ else:
     run_date = args.date
     LOGGER.info("Date provided in commandline options: {}".format(run_date))
 
+log_missing_dates(statsdb)
+
 today = datetime.datetime.now().strftime("%Y-%m-%d")
 if today == run_date and not args.force:
     raise RuntimeError("Run date is today and --force flag not specified")
 
-if args.skipdownload:
-    LOGGER.info("Skipping call to download.py because skipdownload is enabled")
+# all steps run in this process and share the configuration and the stats database
+if args.stream and not args.skipdownload:
+    LOGGER.info("Streaming and parsing logs for {}".format(run_date))
+    jobs.stream_logs(config, boto3.client('s3'), run_date, statsdb if args.aggregate else None, nologsdb=args.nologsdb, tee=True)
 else:
-    execute_download_logs(args)
+    if args.skipdownload:
+        LOGGER.info("Skipping download of logs because skipdownload is enabled")
+    else:
+        LOGGER.info("Downloading logs for {}".format(run_date))
+        jobs.download_logs(config, boto3.client('s3'), run_date)
+
+    LOGGER.info("Parsing logs for {}".format(run_date))
+    jobs.parse_logs(config, run_date, statsdb if args.aggregate else None, nologsdb=args.nologsdb)
 
-execute_parse_logs(args)
+if args.aggregate:
+    LOGGER.info("Skipping update of the stats because the stats were aggregated while parsing")
+else:
+    LOGGER.info("Updating stats for {}".format(run_date))
+    jobs.update_stats(config, statsdb, run_date)
 
-execute_update_stats(args)
+report.create_report(config, statsdb, run_date)
 
-execute_create_report(args)
+LOGGER.info("Creating trend report")
+trendreport.create_trend_report(config, statsdb, args.trendfromdate)
 
-execute_create_trend_report(args)
+LOGGER.info("Archiving logs")
+jobs.archive_logs(config, run_date)
 
-execute_archive(args)
\ No newline at end of file
+statsdb.close()
@@ -0,0 +1,103 @@
+import alblogs
+import logging
+import os.path
+import datetime
+
+from alblogs import archive, logsdb
+
+LOGGER = None
+
+LOGSDB_SUFFIX = "-alblogs.db"
+
+
+def read_arguments():
+    argparser = alblogs.get_default_argparser()
+    argparser.add_argument("traceid", metavar="TRACE_ID", type=str, help="Trace id (X-Amzn-Trace-Id) to look up")
+    argparser.add_argument("-i", "--client", action='store', default=None, metavar="ADDRESS", help="Only return entries of this client address")
+    argparser.add_argument("-f", "--fromdate", action='store', default=None, metavar="DATE", help="First date to search (yyyy-mm-dd)")
+    argparser.add_argument("-t", "--todate", action='store', default=None, metavar="DATE", help="Last date to search (yyyy-mm-dd)")
+
+    args = argparser.parse_args()
+
+    # try to convert the dates to check if they are valid dates
+    if args.fromdate:
+        datetime.datetime.strptime(args.fromdate, '%Y-%m-%d')
+    if args.todate:
+        datetime.datetime.strptime(args.todate, '%Y-%m-%d')
+
+    return args
+
+
+def in_date_range(datestr):
+    if args.fromdate and datestr < args.fromdate:
+        return False
+    if args.todate and datestr > args.todate:
+        return False
+    return True
+
+
+def find_logsdb_dates(directory, suffixes):
+    # Dates of the logs databases in directory, with one of the suffixes after the database name
+    result = set()
+    if directory is None or not os.path.exists(directory):
+        return result
+
+    with os.scandir(directory) as it:
+        for entry in it:
+            for suffix in suffixes:
+                if entry.is_file() and entry.name.endswith(LOGSDB_SUFFIX + suffix) and in_date_range(entry.name[:10]):
+                    result.add(entry.name[:10])
+
+    return result
+
+
+def find_candidates(data_dir, arch_dir):
+    # Logs databases in the data directory are always searched, archived days only when their
+    # filters might contain the trace id (and client address)
+    candidates = []
+    for datestr in sorted(find_logsdb_dates(data_dir, [""])):
+        candidates.append((datestr, os.path.join(data_dir, datestr + LOGSDB_SUFFIX)))
+
+    archive_suffixes = [".{}".format(extension) for extension in archive.FORMAT_EXTENSIONS.values()]
+    archived_dates = find_logsdb_dates(arch_dir, archive_suffixes) - set(datestr for datestr, filename in candidates)
+
+    skipped = 0
+    for datestr in sorted(archived_dates):
+        filename = os.path.join(data_dir, datestr + LOGSDB_SUFFIX)
+        if not archive.filter_might_contain(arch_dir, filename, "trace", args.traceid):
+            skipped += 1
+        elif args.client is not None and not archive.filter_might_contain(arch_dir, filename, "client", args.client):
+            skipped += 1
+        else:
+            candidates.append((datestr, filename))
+
+    LOGGER.info("Searching {} days, {} archived days skipped by their filters".format(len(candidates), skipped))
+
+    return candidates
+
+# ------------------------------ MAIN PROGRAM ------------------------------
+
+
+args = read_arguments()
+
+alblogs.initialize(args)
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.info("Starting lookup_trace.py")
+
+config = alblogs.get_configuration()
+
+found = 0
+for datestr, filename in find_candidates(config.get_data_dir(), config.get_archive_dir()):
+    LOGGER.info("Searching {}".format(datestr))
+
+    # an archived logs database is read from the archive cache
+    for row in logsdb.query_entries_by_trace_id(alblogs.get_logsdb_path(filename), args.traceid, args.client):
+        found += 1
+        print("{} {}:{} {} {}{} -> {}:{} {}/{} {}/{}/{} sec".format(
+            row["timestamp"], row["client_address"], row["client_port"], row["reqtype"], row["url"],
+            "?" + row["request_query"] if row["request_query"] else "",
+            row["target_address"], row["target_port"], row["elb_status_code"], row["target_status_code"],
+            row["request_processing_time_sec"], row["target_processing_time_sec"], row["response_processing_time_sec"]))
+
+LOGGER.info("Found {} log entries for trace id {}".format(found, args.traceid))
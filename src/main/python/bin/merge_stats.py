@@ -0,0 +1,49 @@
+import alblogs
+import logging
+import os.path
+
+LOGGER = None
+
+
+def read_arguments():
+    argparser = alblogs.get_default_argparser()
+    argparser.add_argument("databases", metavar="DATABASE", type=str, nargs="+", help="Partial stats databases to merge, in order")
+    argparser.add_argument("-o", "--output", action='store', default=None, metavar="FILE", help="Stats database to merge into (default stats.db in the data directory)")
+    argparser.add_argument("-a", "--append", action="store_true", help="Add the stats of dates that are already loaded instead of replacing them (e.g. stats of other load balancers)")
+
+    args = argparser.parse_args()
+
+    return args
+
+# ------------------------------ MAIN PROGRAM ------------------------------
+
+
+args = read_arguments()
+
+alblogs.initialize(args)
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.info("Starting merge_stats.py")
+
+config = alblogs.get_configuration()
+
+if args.output:
+    statsdb_file = args.output
+else:
+    statsdb_file = "{}/stats.db".format(config.get_data_dir())
+
+for partial_file in args.databases:
+    if os.path.abspath(partial_file) == os.path.abspath(statsdb_file):
+        raise RuntimeError("Database '{}' can not be merged into itself".format(partial_file))
+
+statsdb = alblogs.open_statsdb(statsdb_file, create=True)
+
+for partial_file in args.databases:
+    # opening the partial database migrates it to the current schema version
+    partial = alblogs.open_statsdb(partial_file, create=False)
+    partial.close()
+
+    # when partial databases contain the same date, the last one wins unless appending
+    statsdb.merge_database(partial_file, append=args.append)
+
+statsdb.log_cache_stats()
@@ -0,0 +1,51 @@
+import alblogs
+import logging
+import datetime
+import boto3
+
+from alblogs import jobs, logsdb
+
+LOGGER = None
+
+
+def read_arguments():
+    argparser = alblogs.get_default_argparser()
+    argparser.add_argument("date", metavar="DATE", type=str, help="Date for which to download and process ALB logs (yyyy-mm-dd)")
+    argparser.add_argument("-b", "--batchsize", action='store', default=logsdb.DEFAULT_BATCH_SIZE, metavar="SIZE", type=int, help="Number of log entries written to the database per batch (default {})".format(logsdb.DEFAULT_BATCH_SIZE))
+    argparser.add_argument("-a", "--aggregate", action="store_true", help="Aggregate the parsed logs while parsing and write the stats to the stats database")
+    argparser.add_argument("-n", "--nologsdb", action="store_true", help="Do not write the parsed logs to the logs database (requires --aggregate)")
+    argparser.add_argument("-t", "--tee", action="store_true", help="Also save the downloaded log files in the source logs directory")
+
+    args = argparser.parse_args()
+
+    # try to convert args.date to check if it is a valid date
+    datetime.datetime.strptime(args.date, '%Y-%m-%d')
+
+    if args.batchsize < 1:
+        argparser.error("Batch size must be at least 1")
+
+    if args.nologsdb and not args.aggregate:
+        argparser.error("--nologsdb requires --aggregate, otherwise the parsed logs are not stored at all")
+
+    return args
+
+# ------------------------------ MAIN PROGRAM ------------------------------
+
+
+args = read_arguments()
+
+alblogs.initialize(args)
+
+LOGGER = logging.getLogger(__name__)
+
+config = alblogs.get_configuration()
+
+LOGGER.info("Starting stream_logs.py")
+
+if args.aggregate:
+    statsdb_file = "{}/stats.db".format(config.get_data_dir())
+    statsdb = alblogs.open_statsdb(statsdb_file, create=True)
+else:
+    statsdb = None
+
+jobs.stream_logs(config, boto3.client('s3'), args.date, statsdb, batch_size=args.batchsize, nologsdb=args.nologsdb, tee=args.tee)
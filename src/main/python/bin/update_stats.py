@@ -2,6 +2,8 @@ import alblogs
 import logging
 import datetime
 
+from alblogs import jobs
+
 LOGGER = None
 
 
@@ -16,37 +18,6 @@ def read_arguments():
 
     return args
 
-
-def load_url_stats(logsdb, statsdb):
-    LOGGER.info("Processing URL stats")
-    rows = logsdb.query_url_stats()
-
-    for row in rows:
-        statsdb.save_url_stats(row)
-
-    statsdb.commit()
-
-
-def load_target_address_stats(logsdb, statsdb):
-    LOGGER.info("Processing TARGET ADDRESS stats")
-    rows = logsdb.query_target_address_stats()
-
-    for row in rows:
-        statsdb.save_target_address_stats(row)
-
-    statsdb.commit()
-
-
-def load_status_code_stats(logsdb, statsdb):
-    LOGGER.info("Processing STATUS CODE stats")
-    rows = logsdb.query_status_code_stats()
-
-    for row in rows:
-        statsdb.save_status_code_stats(row)
-
-    statsdb.commit()
-
-
 # ------------------------------ MAIN PROGRAM ------------------------------
 
 
@@ -59,12 +30,7 @@ LOGGER.info("Starting update_stats.py")
 
 config = alblogs.get_configuration()
 
-logsdb_file = "{}/{}-alblogs.db".format(config.get_data_dir(), args.date)
-statsdb_file = "{}/stats.db".format(config.get_data_dir(), args.date)
-
-logsdb = alblogs.open_logsdb(logsdb_file, create=False)
+statsdb_file = "{}/stats.db".format(config.get_data_dir())
 statsdb = alblogs.open_statsdb(statsdb_file, create=True)
 
-load_url_stats(logsdb, statsdb)
-load_target_address_stats(logsdb, statsdb)
-load_status_code_stats(logsdb, statsdb)
+jobs.update_stats(config, statsdb, args.date)
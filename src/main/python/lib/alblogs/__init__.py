@@ -2,7 +2,7 @@ import argparse
 import os
 import logging.config
 
-from alblogs import config, logsdb, statsdb
+from alblogs import archive, config, logsdb, statsdb
 
 CONFIGURATION = None
 LOGGER = None
@@ -64,9 +64,57 @@ def get_configuration():
     return CONFIGURATION
 
 
-def open_logsdb(filename, create=False):
-    db = logsdb.Database(filename, create)
+def _find_archived_logsdb(filename):
+    if CONFIGURATION is None or CONFIGURATION.get_archive_dir() is None:
+        return None
+
+    return archive.find_archive(CONFIGURATION.get_archive_dir(), filename)
+
+
+def _get_archive_cache():
+    return archive.ArchiveCache(CONFIGURATION.archive.get_cache_dir(), CONFIGURATION.archive.get_cache_size_mb())
+
+
+def get_logsdb_path(filename):
+    # Returns the path of a logs database that can be opened, for an archived logs database this
+    # is its decompressed copy in the archive cache
+    if os.path.exists(filename):
+        return filename
+
+    archive_path = _find_archived_logsdb(filename)
+    if archive_path is None:
+        raise RuntimeError("Database at path '{}' does not exist and is not archived".format(filename))
+
+    return _get_archive_cache().get(archive_path)
+
+
+def open_logsdb(filename, create=False, batch_size=logsdb.DEFAULT_BATCH_SIZE, in_memory=False, bulk_load=False):
+    # Logs databases that have been archived are opened from the archive cache, with in_memory
+    # small databases are decompressed into memory instead (unless they are already cached). With
+    # bulk_load a database that is not archived is opened for a bulk load.
+    archive_path = None
+    if not create and not os.path.exists(filename):
+        archive_path = _find_archived_logsdb(filename)
+
+    if archive_path is None:
+        db = logsdb.Database(filename, create, batch_size)
+        db.open(bulk_load)
+        return db
+
+    cache = _get_archive_cache()
+    if in_memory and not os.path.exists(cache.get_cached_filename(archive_path)):
+        data = archive.read_archive(archive_path, CONFIGURATION.archive.get_memory_limit_mb() * 1024 * 1024)
+        if data is not None:
+            db = logsdb.Database(filename, create, batch_size)
+            db.open_serialized(data)
+            db.ensure_secondary_indexes()
+            return db
+
+        logging.getLogger(__name__).info("Archive {} is too large to open in memory, using the archive cache".format(archive_path))
+
+    db = logsdb.Database(cache.get(archive_path), create, batch_size)
     db.open()
+    db.ensure_secondary_indexes()
     return db
 
 
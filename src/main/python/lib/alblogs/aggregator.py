@@ -0,0 +1,168 @@
+import logging
+
+from alblogs import logparser
+
+LOGGER = None
+
+# Aggregated stats columns, each one has a sum, min and max value in the stats tables
+MEASURE_COLUMNS = ["request_processing_time_sec",
+                   "target_processing_time_sec",
+                   "response_processing_time_sec",
+                   "received_bytes",
+                   "sent_bytes"]
+
+
+def get_log():
+    global LOGGER
+    if LOGGER is None:
+        LOGGER = logging.getLogger(__name__)
+    return LOGGER
+
+
+def to_int(value):
+    # Mimics the INTEGER column affinity of the logs database: numeric text becomes an int,
+    # anything else (like '-' for a missing status code) is kept as is
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _sqlite_order(value):
+    # Sort key in the order of SQLite: NULL, then numbers, then text
+    if value is None:
+        return (0, 0)
+    if isinstance(value, str):
+        return (2, value)
+    return (1, value)
+
+
+def _sqlite_max(value, other):
+    if _sqlite_order(other) > _sqlite_order(value):
+        return other
+    return value
+
+
+def _new_accumulator(values):
+    accumulator = [1]
+    for value in values:
+        accumulator.extend((value, value, value))
+
+    return accumulator
+
+
+def _add_to_accumulator(accumulator, values):
+    accumulator[0] += 1
+    index = 1
+    for value in values:
+        accumulator[index] += value
+        if value < accumulator[index + 1]:
+            accumulator[index + 1] = value
+        if value > accumulator[index + 2]:
+            accumulator[index + 2] = value
+        index += 3
+
+
+def _merge_accumulator(accumulator, other):
+    accumulator[0] += other[0]
+    for index in range(1, len(accumulator), 3):
+        accumulator[index] += other[index]
+        accumulator[index + 1] = min(accumulator[index + 1], other[index + 1])
+        accumulator[index + 2] = max(accumulator[index + 2], other[index + 2])
+
+
+def _accumulator_to_row(row, accumulator):
+    row["request_count"] = accumulator[0]
+    index = 1
+    for column in MEASURE_COLUMNS:
+        row["sum_{}".format(column)] = accumulator[index]
+        row["min_{}".format(column)] = accumulator[index + 1]
+        row["max_{}".format(column)] = accumulator[index + 2]
+        index += 3
+
+    return row
+
+
+class StatsAggregator(object):
+    # Folds parsed log records into the hourly url, target address and status code groupings of
+    # the stats database, producing the same rows as the logsdb query_*_stats methods
+    def __init__(self):
+        self._url_stats = {}
+        # the url stats are not grouped on the elb status code, like the SQL path they get the
+        # highest elb status code of the url and hour
+        self._url_elb_status_codes = {}
+        self._target_address_stats = {}
+        self._status_code_stats = {}
+        self._record_count = 0
+
+    def get_record_count(self):
+        return self._record_count
+
+    def add_record(self, record):
+        self._record_count += 1
+
+        date = record["datepart"]
+        hour = int(record["hourpart"])
+        elb_status_code = to_int(record["elb_status_code"])
+        # in the order of MEASURE_COLUMNS
+        values = (record["request_processing_time"],
+                  record["target_processing_time"],
+                  record["response_processing_time"],
+                  int(record["received_bytes"]),
+                  int(record["sent_bytes"]))
+
+        url_key = (record["request_url"], record["type"], date, hour)
+        self._url_elb_status_codes[url_key] = _sqlite_max(self._url_elb_status_codes.get(url_key, elb_status_code), elb_status_code)
+
+        for (stats, key) in ((self._url_stats, url_key),
+                             (self._target_address_stats, (record["target_ip"], to_int(record["target_port"]), date, hour)),
+                             (self._status_code_stats, (to_int(record["target_status_code"]), elb_status_code, date, hour))):
+            accumulator = stats.get(key)
+            if accumulator is None:
+                stats[key] = _new_accumulator(values)
+            else:
+                _add_to_accumulator(accumulator, values)
+
+    def merge(self, other):
+        self._record_count += other._record_count
+
+        for (own, others) in ((self._url_stats, other._url_stats),
+                              (self._target_address_stats, other._target_address_stats),
+                              (self._status_code_stats, other._status_code_stats)):
+            for key, accumulator in others.items():
+                own_accumulator = own.get(key)
+                if own_accumulator is None:
+                    own[key] = accumulator
+                else:
+                    _merge_accumulator(own_accumulator, accumulator)
+
+        for key, elb_status_code in other._url_elb_status_codes.items():
+            self._url_elb_status_codes[key] = _sqlite_max(self._url_elb_status_codes.get(key, elb_status_code), elb_status_code)
+
+    def get_url_stats(self):
+        for (url, reqtype, date, hour), accumulator in self._url_stats.items():
+            row = {"url": url, "reqtype": reqtype, "date": date, "hour": hour, "elb_status_code": self._url_elb_status_codes[(url, reqtype, date, hour)]}
+            yield _accumulator_to_row(row, accumulator)
+
+    def get_target_address_stats(self):
+        for (target_address, target_port, date, hour), accumulator in self._target_address_stats.items():
+            row = {"target_address": target_address, "target_port": target_port, "date": date, "hour": hour}
+            yield _accumulator_to_row(row, accumulator)
+
+    def get_status_code_stats(self):
+        for (target_status_code, elb_status_code, date, hour), accumulator in self._status_code_stats.items():
+            row = {"target_status_code": target_status_code, "elb_status_code": elb_status_code, "date": date, "hour": hour}
+            yield _accumulator_to_row(row, accumulator)
+
+
+def aggregate_file(logname):
+    # Parses and aggregates a complete log file, used as the unit of work for worker processes
+    # when no logs database is written. Only the (small) aggregated result is sent back.
+    get_log().info("Aggregating: '{}'".format(logname))
+
+    aggregator = StatsAggregator()
+    with logparser.open_logfile(logname) as fhandle:
+        for record in logparser.parse_lines(fhandle):
+            aggregator.add_record(record)
+
+    return logname, aggregator
@@ -0,0 +1,178 @@
+import os
+import gzip
+import lzma
+import logging
+
+from alblogs import bloom
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+LOGGER = None
+
+# Archive formats and the extension of the archived files
+FORMAT_EXTENSIONS = {"gz": "gz", "xz": "xz", "zstd": "zst"}
+
+# Defaults for the optional settings of the archive configuration section
+DEFAULT_CACHE_SIZE_MB = 10240
+DEFAULT_MEMORY_LIMIT_MB = 256
+
+# 10 MB buffer for decompressing
+BUFFER_SIZE = 10 * 1024 * 1024
+
+
+def get_log():
+    global LOGGER
+    if LOGGER is None:
+        LOGGER = logging.getLogger(__name__)
+    return LOGGER
+
+
+def is_format_available(archive_format):
+    if archive_format == "zstd":
+        return zstandard is not None
+
+    return archive_format in FORMAT_EXTENSIONS
+
+
+def get_archive_filename(filename, archive_format):
+    return "{}.{}".format(filename, FORMAT_EXTENSIONS[archive_format])
+
+
+def open_writer(filename, archive_format):
+    # Streaming writer that compresses everything into a single gzip member, xz stream or zstd frame
+    if archive_format == "xz":
+        return lzma.open(filename, "wb")
+    if archive_format == "zstd":
+        return zstandard.ZstdCompressor().stream_writer(open(filename, "wb"))
+
+    return gzip.open(filename, "wb")
+
+
+def compress_block(archive_format, buffer):
+    # Compresses a block into a complete gzip member, xz stream or zstd frame. Concatenated they form
+    # a valid file of the format, that decompresses with the standard tools. Used as the unit of work
+    # for worker processes, so it must be a module level function.
+    if archive_format == "xz":
+        return lzma.compress(buffer)
+    if archive_format == "zstd":
+        return zstandard.ZstdCompressor().compress(buffer)
+
+    return gzip.compress(buffer)
+
+
+def get_filter_filename(arch_dir, filename, kind):
+    # Bloom filters are stored next to the archive, named after the archived file
+    return "{}.{}.bloom".format(os.path.join(arch_dir, os.path.basename(filename)), kind)
+
+
+def filter_might_contain(arch_dir, filename, kind, value):
+    # Days without a filter (archived before filters were written) might contain anything
+    filter_filename = get_filter_filename(arch_dir, filename, kind)
+    if not os.path.exists(filter_filename):
+        return True
+
+    return bloom.file_might_contain(filter_filename, value)
+
+
+def find_archive(arch_dir, filename):
+    # Returns the path of the archived version of filename (in any available format) or None
+    for archive_format in sorted(FORMAT_EXTENSIONS.keys()):
+        if not is_format_available(archive_format):
+            continue
+
+        archive_path = get_archive_filename(os.path.join(arch_dir, os.path.basename(filename)), archive_format)
+        if os.path.exists(archive_path):
+            return archive_path
+
+    return None
+
+
+def open_reader(archive_path):
+    # Reads concatenated gzip members, xz streams and zstd frames as well
+    if archive_path.endswith(".xz"):
+        return lzma.open(archive_path, "rb")
+    if archive_path.endswith(".zst"):
+        return zstandard.ZstdDecompressor().stream_reader(open(archive_path, "rb"), read_across_frames=True, closefd=True)
+
+    return gzip.open(archive_path, "rb")
+
+
+def read_archive(archive_path, limit):
+    # Returns the decompressed content of an archive, or None when it is larger than limit bytes
+    blocks = []
+    size = 0
+    with open_reader(archive_path) as reader:
+        block = reader.read(BUFFER_SIZE)
+        while block:
+            size += len(block)
+            if size > limit:
+                return None
+
+            blocks.append(block)
+            block = reader.read(BUFFER_SIZE)
+
+    return b"".join(blocks)
+
+
+class ArchiveCache(object):
+    # Directory with decompressed archives, limited in size. When the cache is full the least recently
+    # used files are removed, the modification time of a file is updated every time it is used.
+    def __init__(self, cache_dir, max_size_mb=DEFAULT_CACHE_SIZE_MB):
+        self._cache_dir = cache_dir
+        self._max_size = max_size_mb * 1024 * 1024
+
+    def get_cached_filename(self, archive_path):
+        name = os.path.basename(archive_path)
+        return os.path.join(self._cache_dir, name[:name.rindex(".")])
+
+    def get(self, archive_path):
+        # Returns the path of the decompressed archive, decompresses it when it is not cached (or
+        # when the archive is newer than the cached file)
+        cached_filename = self.get_cached_filename(archive_path)
+        if os.path.exists(cached_filename) and os.path.getmtime(cached_filename) >= os.path.getmtime(archive_path):
+            get_log().info("Using cached {} for {}".format(cached_filename, archive_path))
+            os.utime(cached_filename)
+            return cached_filename
+
+        if not os.path.exists(self._cache_dir):
+            os.makedirs(self._cache_dir)
+
+        get_log().info("Decompressing {} to {}".format(archive_path, cached_filename))
+
+        # decompressed to a (dot) part file first, the cache never contains a partial file
+        part_filename = os.path.join(self._cache_dir, ".{}.part".format(os.path.basename(cached_filename)))
+        with open_reader(archive_path) as reader:
+            with open(part_filename, "wb") as writer:
+                block = reader.read(BUFFER_SIZE)
+                while block:
+                    writer.write(block)
+                    block = reader.read(BUFFER_SIZE)
+
+        os.replace(part_filename, cached_filename)
+        self.evict(keep=cached_filename)
+
+        return cached_filename
+
+    def evict(self, keep=None):
+        entries = []
+        total_size = 0
+        with os.scandir(self._cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith("."):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+                    total_size += stat.st_size
+
+        # least recently used first
+        for mtime, path, size in sorted(entries):
+            if total_size <= self._max_size:
+                break
+            if path == keep:
+                continue
+
+            get_log().info("Removing {} from the archive cache".format(path))
+            os.remove(path)
+            total_size -= size
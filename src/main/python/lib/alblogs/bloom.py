@@ -0,0 +1,111 @@
+import math
+import struct
+import hashlib
+import logging
+
+LOGGER = None
+
+# Default false positive rate, a lookup opens about this fraction of the days that do not match
+DEFAULT_FALSE_POSITIVE_RATE = 0.001
+
+# File header: magic, format version, number of bits, number of hashes, number of values
+FILE_MAGIC = b"ALBBLOOM"
+FILE_VERSION = 1
+HEADER_FORMAT = "<8sIQII"
+
+
+def get_log():
+    global LOGGER
+    if LOGGER is None:
+        LOGGER = logging.getLogger(__name__)
+    return LOGGER
+
+
+class BloomFilter(object):
+    # Set membership with false positives but without false negatives, in a fixed number of bits.
+    # The bit positions of a value are derived from a single blake2b digest (double hashing).
+    def __init__(self, num_bits, num_hashes, bits=None, count=0):
+        self._num_bits = num_bits
+        self._num_hashes = num_hashes
+        if bits is None:
+            bits = bytearray((num_bits + 7) // 8)
+        self._bits = bits
+        self._count = count
+
+    @classmethod
+    def for_capacity(cls, capacity, false_positive_rate=DEFAULT_FALSE_POSITIVE_RATE):
+        capacity = max(1, capacity)
+        num_bits = int(math.ceil(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        num_hashes = max(1, int(round(num_bits / capacity * math.log(2))))
+        return cls(num_bits, num_hashes)
+
+    def get_count(self):
+        return self._count
+
+    def add(self, value):
+        for position in get_positions(value, self._num_bits, self._num_hashes):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self._count += 1
+
+    def might_contain(self, value):
+        for position in get_positions(value, self._num_bits, self._num_hashes):
+            if not self._bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def save(self, filename):
+        with open(filename, "wb") as fhandle:
+            fhandle.write(struct.pack(HEADER_FORMAT, FILE_MAGIC, FILE_VERSION, self._num_bits, self._num_hashes, self._count))
+            fhandle.write(self._bits)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, "rb") as fhandle:
+            header = fhandle.read(struct.calcsize(HEADER_FORMAT))
+            magic, version, num_bits, num_hashes, count = struct.unpack(HEADER_FORMAT, header)
+            if magic != FILE_MAGIC or version != FILE_VERSION:
+                raise RuntimeError("File '{}' is not a bloom filter of version {}".format(filename, FILE_VERSION))
+
+            bits = bytearray(fhandle.read())
+
+        if len(bits) != (num_bits + 7) // 8:
+            raise RuntimeError("Bloom filter '{}' is truncated".format(filename))
+
+        return cls(num_bits, num_hashes, bits, count)
+
+
+def get_positions(value, num_bits, num_hashes):
+    digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+    h1, h2 = struct.unpack("<QQ", digest)
+    for i in range(num_hashes):
+        yield (h1 + i * h2) % num_bits
+
+
+def file_might_contain(filename, value):
+    # Tests a value against a saved filter by reading only the bytes of its bit positions, so a
+    # lookup over many (large) filters stays cheap
+    header_size = struct.calcsize(HEADER_FORMAT)
+    with open(filename, "rb") as fhandle:
+        magic, version, num_bits, num_hashes, count = struct.unpack(HEADER_FORMAT, fhandle.read(header_size))
+        if magic != FILE_MAGIC or version != FILE_VERSION:
+            raise RuntimeError("File '{}' is not a bloom filter of version {}".format(filename, FILE_VERSION))
+
+        for position in get_positions(value, num_bits, num_hashes):
+            fhandle.seek(header_size + (position >> 3))
+            byte = fhandle.read(1)
+            if len(byte) != 1:
+                raise RuntimeError("Bloom filter '{}' is truncated".format(filename))
+            if not byte[0] & (1 << (position & 7)):
+                return False
+
+    return True
+
+
+def build_filter(values, count, false_positive_rate=DEFAULT_FALSE_POSITIVE_RATE):
+    # values is an iterable of (at most) count values, None values are skipped
+    bloom_filter = BloomFilter.for_capacity(count, false_positive_rate)
+    for value in values:
+        if value is not None:
+            bloom_filter.add(value)
+
+    return bloom_filter
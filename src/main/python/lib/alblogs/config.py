@@ -3,6 +3,8 @@ import os.path
 import re
 import logging
 
+from alblogs import archive, download
+
 EXPAND_RE = re.compile("(.*?)(\$\{.*?\})(.*)")
 LOGGER = None
 
@@ -19,8 +21,8 @@ class ConfigurationSection(object):
         self._parent = parent
         self._section = section
 
-    def get_value(self, key):
-        return self._parent.get_value("{0}.{1}".format(self._section, key))
+    def get_value(self, key, default=None):
+        return self._parent.get_value("{0}.{1}".format(self._section, key), default)
 
 
 class AwsSection(ConfigurationSection):
@@ -33,6 +35,29 @@ class AwsSection(ConfigurationSection):
     def get_base_dir(self):
         return self.get_value("base_dir")
 
+    def get_concurrency(self):
+        return int(self.get_value("concurrency", download.DEFAULT_CONCURRENCY))
+
+    def get_retries(self):
+        return int(self.get_value("retries", download.DEFAULT_RETRIES))
+
+    def get_backoff_sec(self):
+        return float(self.get_value("backoff_sec", download.DEFAULT_BACKOFF_SEC))
+
+
+class ArchiveSection(ConfigurationSection):
+    def __init__(self, parent):
+        super(ArchiveSection, self).__init__(parent, "archive")
+
+    def get_cache_dir(self):
+        return self.get_value("cache_dir", os.path.join(self._parent.get_temp_dir(), "archive-cache"))
+
+    def get_cache_size_mb(self):
+        return int(self.get_value("cache_size_mb", archive.DEFAULT_CACHE_SIZE_MB))
+
+    def get_memory_limit_mb(self):
+        return int(self.get_value("memory_limit_mb", archive.DEFAULT_MEMORY_LIMIT_MB))
+
 
 class TrendReportSection(ConfigurationSection):
     def __init__(self, parent):
@@ -54,6 +79,7 @@ class Configuration(object):
         self._data = None
         self._init()
         self.aws = AwsSection(self)
+        self.archive = ArchiveSection(self)
         self.reports = ReportsSection(self)
 
     def _init(self):
@@ -79,14 +105,16 @@ class Configuration(object):
 
         return result
 
-    def get_value(self, key):
+    def get_value(self, key, default=None):
         keys = key.split('.')
         value = self._data
         for enum_key in keys:
             value = value.get(enum_key)
             if value is None:
-                get_log().warn("Key {0} not found in configuration data (subkey {1})".format(key, enum_key))
-                return None
+                # optional keys (with a default) are not reported
+                if default is None:
+                    get_log().warn("Key {0} not found in configuration data (subkey {1})".format(key, enum_key))
+                return default
 
         if isinstance(value, str):
             value = self._expand_value(value)
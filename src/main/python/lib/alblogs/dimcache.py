@@ -0,0 +1,42 @@
+import collections
+
+
+class DimensionCache(object):
+    # Maps dimension values to their id. When max_size is set the least recently used values
+    # are evicted once the cache is full, otherwise the cache grows without limit.
+    def __init__(self, max_size=None):
+        self._max_size = max_size
+        self._values = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    def get_max_size(self):
+        return self._max_size
+
+    def get(self, value):
+        id = self._values.get(value)
+        if id is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if self._max_size is not None:
+            self._values.move_to_end(value)
+
+        return id
+
+    def put(self, value, id):
+        self._values[value] = id
+        if self._max_size is not None:
+            self._values.move_to_end(value)
+            while len(self._values) > self._max_size:
+                self._values.popitem(last=False)
+
+    def clear(self):
+        self._values.clear()
+
+    def get_stats(self):
+        return {"size": len(self._values), "max_size": self._max_size, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,469 @@
+import io
+import os.path
+import gzip
+import time
+import json
+import queue
+import hashlib
+import logging
+import threading
+import collections
+import concurrent.futures
+
+from alblogs import logparser
+
+LOGGER = None
+
+# Defaults for the optional download settings of the aws configuration section
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_SEC = 1.0
+
+# Name of the manifest in a download directory, a dot file so it is not taken for a log file
+MANIFEST_NAME = ".download-manifest.json"
+
+# 1 MB buffer for calculating checksums, also the size of the blocks in which objects are streamed
+BUFFER_SIZE = 1024 * 1024
+
+# Number of blocks of a streamed object that are kept in memory until they are parsed
+STREAM_QUEUE_BLOCKS = 8
+
+
+def get_log():
+    global LOGGER
+    if LOGGER is None:
+        LOGGER = logging.getLogger(__name__)
+    return LOGGER
+
+
+class DownloadProgress(object):
+    # Counters shared by the download threads
+    def __init__(self, total_files, total_bytes, skipped_files=0):
+        self._lock = threading.Lock()
+        self._total_files = total_files
+        self._total_bytes = total_bytes
+        self._downloaded_files = 0
+        self._downloaded_bytes = 0
+        self._failed_files = 0
+        self._skipped_files = skipped_files
+        self._retries = 0
+        self._start_time = time.monotonic()
+        self._next_report = 0
+
+    def add_retry(self):
+        with self._lock:
+            self._retries += 1
+
+    def add_failed(self):
+        with self._lock:
+            self._failed_files += 1
+
+    def add_downloaded(self, size):
+        with self._lock:
+            self._downloaded_files += 1
+            self._downloaded_bytes += size
+
+            # report about every 10 percent of the files
+            if self._downloaded_files >= self._next_report:
+                self._log()
+                self._next_report = self._downloaded_files + max(1, self._total_files // 10)
+
+    def get_downloaded_files(self):
+        return self._downloaded_files
+
+    def get_skipped_files(self):
+        return self._skipped_files
+
+    def get_failed_files(self):
+        return self._failed_files
+
+    def get_retries(self):
+        return self._retries
+
+    def _log(self):
+        elapsed = time.monotonic() - self._start_time
+        get_log().info("Downloaded {}/{} files, {:,d}/{:,d} bytes in {:.1f} sec".format(self._downloaded_files, self._total_files, self._downloaded_bytes, self._total_bytes, elapsed))
+
+    def log(self):
+        with self._lock:
+            self._log()
+            get_log().info("Skipped files: {}, failed files: {}, retries: {}".format(self._skipped_files, self._failed_files, self._retries))
+
+
+class Manifest(object):
+    # Records the files of a download directory that were downloaded completely, with the size and
+    # ETag of their S3 object. Saved after every completed file, so an interrupted download can
+    # be resumed.
+    def __init__(self, directory):
+        self._filename = os.path.join(directory, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def load(self):
+        if os.path.exists(self._filename):
+            with open(self._filename, "r") as fhandle:
+                self._entries = json.load(fhandle)
+
+    def _save(self):
+        # written to a temporary file first, the manifest is never left half written
+        temp_filename = "{}.tmp".format(self._filename)
+        with open(temp_filename, "w") as fhandle:
+            json.dump(self._entries, fhandle, indent=1, sort_keys=True)
+        os.replace(temp_filename, self._filename)
+
+    def get_entry(self, name):
+        with self._lock:
+            return self._entries.get(name)
+
+    def set_entry(self, name, size, etag):
+        with self._lock:
+            self._entries[name] = {"size": size, "etag": etag}
+            self._save()
+
+    def remove_entry(self, name):
+        with self._lock:
+            if self._entries.pop(name, None) is not None:
+                self._save()
+
+
+def calculate_md5(filename):
+    md5 = hashlib.md5()
+    with open(filename, "rb") as fhandle:
+        buffer = fhandle.read(BUFFER_SIZE)
+        while buffer:
+            md5.update(buffer)
+            buffer = fhandle.read(BUFFER_SIZE)
+
+    return md5.hexdigest()
+
+
+def is_downloaded(manifest, name, target_file, size, etag):
+    # A file is complete when it has the size of the object and the manifest has the ETag of the
+    # object. Files without manifest entry are checked against the ETag when it is the MD5 of the
+    # content (single part uploads), otherwise they are downloaded again.
+    if not os.path.exists(target_file) or os.path.getsize(target_file) != size:
+        return False
+
+    entry = manifest.get_entry(name)
+    if entry is not None:
+        return entry["etag"] == etag and entry["size"] == size
+
+    if "-" in etag:
+        return False
+
+    if calculate_md5(target_file) != etag:
+        return False
+
+    manifest.set_entry(name, size, etag)
+    return True
+
+
+def list_logs(client, bucket_name, prefix):
+    # Returns (key, size, etag) of all objects below prefix, client is a boto3 S3 client (or a
+    # stand-in with the same get_paginator method)
+    result = []
+    paginator = client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for item in page.get("Contents", []):
+            result.append((item["Key"], item["Size"], item["ETag"].strip('"')))
+
+    return result
+
+
+def download_file(client, bucket_name, key, target_file, retries, backoff_sec, progress):
+    # Downloads to a (dot) part file that is renamed when complete, an interrupted download never
+    # leaves a truncated log file behind
+    part_file = os.path.join(os.path.dirname(target_file), ".{}.part".format(os.path.basename(target_file)))
+
+    attempt = 0
+    while True:
+        try:
+            get_log().debug("Downloading {} to {}".format(key, target_file))
+            client.download_file(bucket_name, key, part_file)
+            os.replace(part_file, target_file)
+            return
+
+        except Exception as e:
+            if attempt >= retries:
+                get_log().error("Download of {} failed after {} attempts: {}".format(key, attempt + 1, e))
+                raise
+
+            # exponential backoff: backoff_sec, 2 * backoff_sec, 4 * backoff_sec, ...
+            delay = backoff_sec * (2 ** attempt)
+            get_log().warning("Download of {} failed ({}), retrying in {:.1f} sec".format(key, e, delay))
+            progress.add_retry()
+            time.sleep(delay)
+            attempt += 1
+
+
+def download_logs(client, bucket_name, prefix, target_dir, concurrency=DEFAULT_CONCURRENCY, retries=DEFAULT_RETRIES, backoff_sec=DEFAULT_BACKOFF_SEC):
+    # Downloads all log files below prefix to target_dir using a pool of concurrency threads. The
+    # boto3 client is shared by the threads, boto3 clients (unlike resources) are thread safe.
+    # Files that were downloaded completely before are skipped, so a rerun only downloads the
+    # files that are missing or changed.
+    if not prefix.endswith("/"):
+        prefix += "/"
+
+    manifest = Manifest(target_dir)
+    manifest.load()
+
+    logs = list_logs(client, bucket_name, prefix)
+
+    skipped_files = 0
+    downloads = []
+    for key, size, etag in logs:
+        name = key[len(prefix):]
+        target_file = os.path.join(target_dir, name)
+        if is_downloaded(manifest, name, target_file, size, etag):
+            get_log().debug("File {} is already downloaded, skipping it".format(target_file))
+            skipped_files += 1
+            continue
+
+        if os.path.exists(target_file):
+            get_log().info("File {} does not match {}, downloading it again".format(target_file, key))
+            manifest.remove_entry(name)
+
+        downloads.append((key, name, size, etag, target_file))
+
+    get_log().info("Downloading {} files using {} threads, {} files already downloaded".format(len(downloads), concurrency, skipped_files))
+
+    progress = DownloadProgress(len(downloads), sum(download[2] for download in downloads), skipped_files)
+
+    failed_keys = []
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {}
+        for key, name, size, etag, target_file in downloads:
+            future = executor.submit(download_file, client, bucket_name, key, target_file, retries, backoff_sec, progress)
+            futures[future] = (key, name, size, etag)
+
+        for future in concurrent.futures.as_completed(futures):
+            key, name, size, etag = futures[future]
+            try:
+                future.result()
+                manifest.set_entry(name, size, etag)
+                progress.add_downloaded(size)
+            except Exception:
+                progress.add_failed()
+                failed_keys.append(key)
+
+    progress.log()
+
+    if len(failed_keys) > 0:
+        raise RuntimeError("Download failed for {} files: {}".format(len(failed_keys), ", ".join(sorted(failed_keys))))
+
+    return progress
+
+
+class BlockReader(io.RawIOBase):
+    # File object over the blocks of an object that a download thread puts in a queue, the thread
+    # puts None when the object is complete or the exception when it failed
+    def __init__(self, blocks):
+        self._blocks = blocks
+        self._block = memoryview(b"")
+        self._offset = 0
+        self._complete = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self._offset >= len(self._block):
+            if self._complete:
+                return 0
+
+            block = self._blocks.get()
+            if block is None:
+                self._complete = True
+                return 0
+            if isinstance(block, Exception):
+                raise block
+
+            self._block = memoryview(block)
+            self._offset = 0
+
+        count = min(len(buffer), len(self._block) - self._offset)
+        buffer[:count] = self._block[self._offset:self._offset + count]
+        self._offset += count
+        return count
+
+
+def put_block(blocks, block, stopped):
+    # Waits for room in the queue, returns False when the stream was stopped in the meantime
+    while not stopped.is_set():
+        try:
+            blocks.put(block, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+
+    return False
+
+
+def stream_object(client, bucket_name, key, tee_file, retries, backoff_sec, progress, blocks, stopped):
+    # Reads the (compressed) body of a log object in blocks into the blocks queue, with tee_file every
+    # block is also written to disk (via a part file). A failed read is retried from the offset
+    # reached (a range request), so the reader never gets a block twice. At most the size of the
+    # queue is kept in memory, the thread waits until the reader has taken the blocks.
+    part_file = None
+    teehandle = None
+    if tee_file is not None:
+        part_file = os.path.join(os.path.dirname(tee_file), ".{}.part".format(os.path.basename(tee_file)))
+        teehandle = open(part_file, "wb")
+
+    try:
+        offset = 0
+        attempt = 0
+        while True:
+            try:
+                get_log().debug("Streaming {} from offset {}".format(key, offset))
+                if offset == 0:
+                    body = client.get_object(Bucket=bucket_name, Key=key)["Body"]
+                else:
+                    body = client.get_object(Bucket=bucket_name, Key=key, Range="bytes={}-".format(offset))["Body"]
+
+                block = body.read(BUFFER_SIZE)
+                while block:
+                    if teehandle is not None:
+                        teehandle.write(block)
+                    offset += len(block)
+                    if not put_block(blocks, block, stopped):
+                        return
+                    block = body.read(BUFFER_SIZE)
+                break
+
+            except Exception as e:
+                if attempt >= retries:
+                    get_log().error("Streaming of {} failed after {} attempts: {}".format(key, attempt + 1, e))
+                    raise
+
+                delay = backoff_sec * (2 ** attempt)
+                get_log().warning("Streaming of {} failed ({}), retrying in {:.1f} sec".format(key, e, delay))
+                progress.add_retry()
+                time.sleep(delay)
+                attempt += 1
+
+        if teehandle is not None:
+            teehandle.close()
+            os.replace(part_file, tee_file)
+
+        put_block(blocks, None, stopped)
+
+    except Exception as e:
+        put_block(blocks, e, stopped)
+        raise
+
+    finally:
+        if teehandle is not None and not teehandle.closed:
+            teehandle.close()
+            os.remove(part_file)
+
+
+def parse_stream(fileobj):
+    # ALB log files are always gzip compressed, lines are parsed as the compressed data comes in
+    with gzip.GzipFile(fileobj=fileobj, mode="rb") as gzhandle:
+        with io.TextIOWrapper(gzhandle, encoding="latin-1") as fhandle:
+            for record in logparser.parse_lines(fhandle):
+                yield record
+
+
+def parse_streamed_object(key, blocks, progress):
+    try:
+        for record in parse_stream(BlockReader(blocks)):
+            yield record
+    except Exception as e:
+        progress.add_failed()
+        raise RuntimeError("Streaming of {} failed: {}".format(key, e))
+
+
+def parse_downloaded_file(filename):
+    with open(filename, "rb") as fhandle:
+        for record in parse_stream(fhandle):
+            yield record
+
+
+def stream_logs(client, bucket_name, prefix, tee_dir=None, concurrency=DEFAULT_CONCURRENCY, retries=DEFAULT_RETRIES, backoff_sec=DEFAULT_BACKOFF_SEC):
+    # Generator that yields (name, records) for every log object below prefix, in the order of the
+    # listing. records is a generator that decompresses and parses the object while a pool thread is
+    # still downloading it, it must be consumed before the next object is taken. The threads read
+    # ahead up to 2 * concurrency objects, every object keeps at most STREAM_QUEUE_BLOCKS blocks in
+    # memory. With tee_dir the log files are also saved (like download_logs, including the manifest),
+    # files that were downloaded completely before are read from tee_dir instead of fetched again.
+    # Parsing is not done by the pool threads, threads holding the GIL would slow down the
+    # downloads. A file that can not be fetched stops the stream with a RuntimeError, its records
+    # may have been partly processed by then.
+    if not prefix.endswith("/"):
+        prefix += "/"
+
+    manifest = None
+    if tee_dir is not None:
+        manifest = Manifest(tee_dir)
+        manifest.load()
+
+    logs = list_logs(client, bucket_name, prefix)
+
+    skipped_files = 0
+    streams = []
+    for key, size, etag in logs:
+        name = key[len(prefix):]
+        tee_file = None
+        downloaded = False
+        if tee_dir is not None:
+            tee_file = os.path.join(tee_dir, name)
+            downloaded = is_downloaded(manifest, name, tee_file, size, etag)
+            if downloaded:
+                get_log().debug("File {} is already downloaded, reading it".format(tee_file))
+                skipped_files += 1
+            elif os.path.exists(tee_file):
+                get_log().info("File {} does not match {}, fetching it again".format(tee_file, key))
+                manifest.remove_entry(name)
+
+        streams.append((key, name, size, etag, tee_file, downloaded))
+
+    get_log().info("Streaming {} files using {} threads, {} files already downloaded".format(len(streams), concurrency, skipped_files))
+
+    progress = DownloadProgress(len(streams) - skipped_files, sum(stream[2] for stream in streams if not stream[5]), skipped_files)
+    pending = collections.deque()
+    remaining = iter(streams)
+    stopped = threading.Event()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+
+    def submit_next():
+        for key, name, size, etag, tee_file, downloaded in remaining:
+            blocks = None
+            future = None
+            if not downloaded:
+                blocks = queue.Queue(maxsize=STREAM_QUEUE_BLOCKS)
+                future = executor.submit(stream_object, client, bucket_name, key, tee_file, retries, backoff_sec, progress, blocks, stopped)
+            pending.append((key, name, size, etag, tee_file, blocks, future))
+            return
+
+    try:
+        for i in range(2 * concurrency):
+            submit_next()
+
+        while len(pending) > 0:
+            key, name, size, etag, tee_file, blocks, future = pending.popleft()
+            submit_next()
+
+            if future is None:
+                yield name, parse_downloaded_file(tee_file)
+                continue
+
+            records = parse_streamed_object(key, blocks, progress)
+            yield name, records
+
+            # the records the caller did not take are read anyway, the object must be complete
+            collections.deque(records, maxlen=0)
+            future.result()
+
+            if manifest is not None:
+                manifest.set_entry(name, size, etag)
+            progress.add_downloaded(size)
+
+    finally:
+        # threads waiting for room in a queue stop, objects that were not started are cancelled
+        stopped.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    progress.log()
@@ -0,0 +1,454 @@
+import os
+import logging
+import datetime
+import functools
+import collections
+import multiprocessing
+
+import alblogs
+
+from alblogs import archive, download, logparser, logsdb
+from alblogs import aggregator as aggregator_module
+
+# The steps of the daily processing, called by the scripts in bin and by daily_run.py. They take the
+# configuration and the (shared) S3 client and stats database as arguments, so one process can run
+# all steps without opening them again.
+
+LOGGER = None
+
+# 10 MB buffer for reading/writing, also the size of the blocks that are compressed in parallel
+BUFFER_SIZE = 10 * 1024 * 1024
+
+DEFAULT_ARCHIVE_AGE = 7
+
+
+def get_log():
+    global LOGGER
+    if LOGGER is None:
+        LOGGER = logging.getLogger(__name__)
+    return LOGGER
+
+
+def get_srclogs_dir(config, datestr, create=False):
+    srclogs_dir = os.path.join(config.get_srclogs_dir(), datestr)
+    if create:
+        if os.path.exists(srclogs_dir):
+            if not os.path.isdir(srclogs_dir):
+                raise RuntimeError("Path '{}' is not a directory".format(srclogs_dir))
+        else:
+            os.makedirs(srclogs_dir)
+
+    return srclogs_dir
+
+
+def get_logsdb_filename(config, datestr):
+    return "{}/{}-alblogs.db".format(config.get_data_dir(), datestr)
+
+
+def get_filter_prefix(config, datestr):
+    aws_base_dir = config.aws.get_base_dir()
+    if not aws_base_dir.endswith("/"):
+        aws_base_dir += "/"
+
+    filter_prefix = "{}{}".format(aws_base_dir, datestr.replace("-", "/"))
+    get_log().debug("Filter prefix: {}".format(filter_prefix))
+
+    return filter_prefix
+
+
+def log_aws_settings(config):
+    get_log().info("S3 bucket: {}".format(config.aws.get_bucket_name()))
+    get_log().info("base dir : {}".format(config.aws.get_base_dir()))
+    get_log().info("threads  : {}".format(config.aws.get_concurrency()))
+
+
+def create_logsdb(config, datestr, nologsdb, batch_size):
+    if nologsdb:
+        get_log().info("Not writing logs database because nologsdb is enabled")
+        return None
+
+    dbfile = get_logsdb_filename(config, datestr)
+    if os.path.exists(dbfile):
+        raise RuntimeError("Database '{}' already exists".format(dbfile))
+
+    # a new database opened for a bulk load gets its secondary indexes when the load is finished
+    return alblogs.open_logsdb(dbfile, create=True, batch_size=batch_size, bulk_load=True)
+
+
+def log_replaced_date(statsdb, datestr):
+    # The catalog and the replace logic both work on the source date, the stats loaded from the logs
+    # of datestr are replaced, including their rows of other dates (around midnight)
+    loaded_date = statsdb.query_loaded_date(datestr)
+    if loaded_date is not None:
+        get_log().info("Stats loaded from the logs of {} at {} ({} requests) are replaced".format(datestr, loaded_date["loaded_at"], loaded_date["request_count"]))
+
+
+def save_aggregated_stats(statsdb, datestr, aggregator):
+    get_log().info("Saving aggregated stats for {} records".format(aggregator.get_record_count()))
+
+    log_replaced_date(statsdb, datestr)
+
+    # replaces the stats of the date together with the rollups and the loaded dates catalog
+    statsdb.replace_date(datestr, aggregator.get_url_stats(), aggregator.get_target_address_stats(), aggregator.get_status_code_stats())
+    statsdb.log_cache_stats()
+
+
+def finish_parsing(db, statsdb, datestr, aggregator):
+    if db is not None:
+        db.end_bulk_load()
+        db.log_cache_stats()
+        db.close()
+
+    if aggregator is not None:
+        save_aggregated_stats(statsdb, datestr, aggregator)
+
+
+# ---- download_logs ----
+
+
+def download_logs(config, s3, datestr):
+    log_aws_settings(config)
+
+    # boto3 clients can be shared by the download threads, resources can not
+    download.download_logs(s3, config.aws.get_bucket_name(), get_filter_prefix(config, datestr),
+                           get_srclogs_dir(config, datestr, create=True),
+                           concurrency=config.aws.get_concurrency(),
+                           retries=config.aws.get_retries(),
+                           backoff_sec=config.aws.get_backoff_sec())
+
+
+# ---- stream_logs ----
+
+
+def save_streamed_records(db, aggregator, logname, records):
+    # records are parsed while the log file is still being downloaded
+    get_log().info("Saving records from '{}'".format(logname))
+
+    if db is not None:
+        log_source_id = db.add_source(logname)
+
+    count = 0
+    for record in records:
+        count += 1
+        if db is not None:
+            db.save_record(log_source_id, record)
+        if aggregator is not None:
+            aggregator.add_record(record)
+
+    if db is not None:
+        db.commit()
+
+    get_log().info("Saved {} records from '{}'".format(count, logname))
+
+
+def stream_logs(config, s3, datestr, statsdb=None, batch_size=logsdb.DEFAULT_BATCH_SIZE, nologsdb=False, tee=False):
+    # With a stats database the parsed logs are aggregated and the stats of the date are replaced
+    if nologsdb and statsdb is None:
+        raise RuntimeError("Without logs database the stats must be aggregated, otherwise the parsed logs are not stored at all")
+
+    log_aws_settings(config)
+
+    srclogs_dir = get_srclogs_dir(config, datestr, create=tee)
+    tee_dir = srclogs_dir if tee else None
+
+    db = create_logsdb(config, datestr, nologsdb, batch_size)
+    aggregator = aggregator_module.StatsAggregator() if statsdb is not None else None
+
+    # the log files are fetched by the download threads and parsed by this thread while they are
+    # downloaded, the sources are named like the files parse_logs would read
+    for name, records in download.stream_logs(s3, config.aws.get_bucket_name(), get_filter_prefix(config, datestr), tee_dir=tee_dir,
+                                              concurrency=config.aws.get_concurrency(),
+                                              retries=config.aws.get_retries(),
+                                              backoff_sec=config.aws.get_backoff_sec()):
+        save_streamed_records(db, aggregator, os.path.join(srclogs_dir, name), records)
+
+    finish_parsing(db, statsdb, datestr, aggregator)
+
+
+# ---- parse_logs ----
+
+
+def find_logs(current_path, logfiles):
+    with os.scandir(current_path) as it:
+        for entry in it:
+            # dot files are not logs (the download manifest and partially downloaded files)
+            if entry.name.startswith("."):
+                continue
+
+            log_path = os.path.join(current_path, entry.name)
+            if entry.is_file():
+                logfiles.append(log_path)
+                get_log().debug("Found log file '{}'".format(log_path))
+            elif entry.is_dir():
+                find_logs(log_path, logfiles)
+
+
+def parse_logfile(db, aggregator, logname):
+    get_log().info("Processing: '{}'".format(logname))
+
+    if db is not None:
+        log_source_id = db.add_source(logname)
+
+    with logparser.open_logfile(logname) as fhandle:
+        for record in logparser.parse_lines(fhandle):
+            if db is not None:
+                db.save_record(log_source_id, record)
+            if aggregator is not None:
+                aggregator.add_record(record)
+
+    if db is not None:
+        db.commit()
+
+
+def prepare_logfile(logname, aggregate):
+    # Unit of work for the worker processes when a logs database is written: the file is parsed into
+    # an entry batch (with its query parameters and distinct dimension values) and aggregated, only
+    # the dimension ids and the inserts are left to the process writing the database
+    get_log().info("Preparing: '{}'".format(logname))
+
+    batch = logsdb.EntryBatch()
+    aggregator = aggregator_module.StatsAggregator() if aggregate else None
+    with logparser.open_logfile(logname) as fhandle:
+        for record in logparser.parse_lines(fhandle):
+            batch.add_record(record)
+            if aggregator is not None:
+                aggregator.add_record(record)
+
+    return logname, batch, aggregator
+
+
+def save_entry_batch(db, aggregator, logname, batch, file_aggregator):
+    get_log().info("Saving {} records from '{}'".format(len(batch), logname))
+
+    log_source_id = db.add_source(logname)
+    db.save_entry_batch(log_source_id, batch)
+    if aggregator is not None:
+        aggregator.merge(file_aggregator)
+
+    db.commit()
+
+
+def parse_logfiles_parallel(db, aggregator, logfiles, workers):
+    # Worker processes parse, aggregate and prepare the log files, this process is the single writer
+    # that owns the database connection. imap keeps the order of the log files, so the
+    # log_source rows (and all ids) are added in the same order as in serial mode.
+    get_log().info("Parsing {} log files using {} worker processes".format(len(logfiles), workers))
+
+    with multiprocessing.Pool(processes=workers) as pool:
+        if db is None:
+            # Without a logs database the workers aggregate the files themselves, only the
+            # aggregated stats are sent back and merged
+            for logname, file_aggregator in pool.imap(aggregator_module.aggregate_file, logfiles):
+                get_log().info("Merging {} aggregated records from '{}'".format(file_aggregator.get_record_count(), logname))
+                aggregator.merge(file_aggregator)
+        else:
+            for logname, batch, file_aggregator in pool.imap(functools.partial(prepare_logfile, aggregate=aggregator is not None), logfiles):
+                save_entry_batch(db, aggregator, logname, batch, file_aggregator)
+
+
+def parse_logs(config, datestr, statsdb=None, workers=1, batch_size=logsdb.DEFAULT_BATCH_SIZE, nologsdb=False):
+    # With a stats database the parsed logs are aggregated and the stats of the date are replaced
+    if nologsdb and statsdb is None:
+        raise RuntimeError("Without logs database the stats must be aggregated, otherwise the parsed logs are not stored at all")
+
+    source_dir = get_srclogs_dir(config, datestr)
+    if not os.path.exists(source_dir):
+        raise RuntimeError("ALB log source directory '{}' does not exist".format(source_dir))
+
+    db = create_logsdb(config, datestr, nologsdb, batch_size)
+    aggregator = aggregator_module.StatsAggregator() if statsdb is not None else None
+
+    logfiles = []
+    find_logs(source_dir, logfiles)
+
+    if workers > 1:
+        get_log().warning("Parsing with {} worker processes is experimental, the default of 1 worker is the supported mode".format(workers))
+        parse_logfiles_parallel(db, aggregator, logfiles, workers)
+    else:
+        for logfile in logfiles:
+            parse_logfile(db, aggregator, logfile)
+
+    finish_parsing(db, statsdb, datestr, aggregator)
+
+
+# ---- update_stats ----
+
+
+def update_stats(config, statsdb, datestr):
+    # an archived logs database is read from the archive cache
+    logsdb_file = alblogs.get_logsdb_path(get_logsdb_filename(config, datestr))
+
+    log_replaced_date(statsdb, datestr)
+
+    # replaces the stats of the date together with the rollups and the loaded dates catalog, the
+    # stats are copied from the logs database by SQLite itself
+    statsdb.transfer_date(datestr, logsdb_file)
+
+    statsdb.log_cache_stats()
+
+
+# ---- archive ----
+
+
+def compress_serial(infile, target_zip, archive_format):
+    with archive.open_writer(target_zip, archive_format) as outfile:
+        buffer = infile.read(BUFFER_SIZE)
+        processed = 0
+        while buffer:
+            outfile.write(buffer)
+            processed += len(buffer)
+
+            if processed % (5 * BUFFER_SIZE) == 0:
+                get_log().debug("Read {:,d} bytes".format(processed))
+
+            buffer = infile.read(BUFFER_SIZE)
+
+    return processed
+
+
+def compress_parallel(infile, target_zip, archive_format, pool, workers):
+    # Every block is compressed by a worker process into an independent gzip member (xz stream,
+    # zstd frame), the members are written in order. At most 2 blocks per worker are read ahead,
+    # so memory use does not depend on the file size.
+    with open(target_zip, 'wb') as outfile:
+        pending = collections.deque()
+        buffer = infile.read(BUFFER_SIZE)
+        processed = 0
+        while buffer or pending:
+            while buffer and len(pending) < 2 * workers:
+                pending.append(pool.apply_async(archive.compress_block, (archive_format, buffer)))
+                processed += len(buffer)
+
+                if processed % (5 * BUFFER_SIZE) == 0:
+                    get_log().debug("Read {:,d} bytes".format(processed))
+
+                buffer = infile.read(BUFFER_SIZE)
+
+            outfile.write(pending.popleft().get())
+
+    return processed
+
+
+def write_bloom_filters(filepath, arch_dir, client_filter):
+    # The filters let lookup_trace.py skip the archives that do not contain a trace id (client address).
+    # A missing filter only means the archive is searched, a partial one would skip it, so every filter
+    # is saved to a (dot) part file first and on failure all filters of the file are removed again.
+    written = []
+    try:
+        for kind, bloom_filter in logsdb.build_bloom_filters(filepath, client_filter).items():
+            filter_filename = archive.get_filter_filename(arch_dir, filepath, kind)
+            part_filename = os.path.join(arch_dir, ".{}.part".format(os.path.basename(filter_filename)))
+            get_log().info("Writing {} filter of {} values to {}".format(kind, bloom_filter.get_count(), filter_filename))
+            written.append(part_filename)
+            bloom_filter.save(part_filename)
+            os.replace(part_filename, filter_filename)
+            written.append(filter_filename)
+    except Exception:
+        for filename in written:
+            if os.path.exists(filename):
+                os.remove(filename)
+        raise
+
+
+def archive_file(filename, filepath, size, arch_dir, archive_format, pool, workers, compact_dir=None, drop_indexes=False, client_filter=False):
+    target_zip = archive.get_archive_filename(os.path.join(arch_dir, filename), archive_format)
+    if os.path.exists(target_zip):
+        raise RuntimeError("Target for archiving '{}' already exists".format(target_zip))
+
+    get_log().info("Start archiving {} to {}".format(filepath, target_zip))
+
+    # with compact_dir the verified compacted copy is archived instead of the original
+    source_path = filepath
+    # compressed to a (dot) part file first, the archive directory never contains a partial archive
+    # and a failed run leaves nothing behind that blocks the next one
+    part_zip = os.path.join(arch_dir, ".{}.part".format(os.path.basename(target_zip)))
+    try:
+        if compact_dir is not None:
+            source_path = os.path.join(compact_dir, filename)
+            logsdb.compact_database(filepath, source_path, drop_indexes)
+            size = os.path.getsize(source_path)
+
+        get_log().debug("Processing {:,d} bytes".format(size))
+
+        with open(source_path, 'rb') as infile:
+            if pool is None:
+                processed = compress_serial(infile, part_zip, archive_format)
+            else:
+                processed = compress_parallel(infile, part_zip, archive_format, pool, workers)
+
+        os.replace(part_zip, target_zip)
+    except Exception:
+        get_log().error("Archiving {} failed, removing {}".format(filepath, part_zip))
+        if os.path.exists(part_zip):
+            os.remove(part_zip)
+        if source_path != filepath and os.path.exists(source_path):
+            os.remove(source_path)
+        raise
+
+    # the filters are only written for an archive that is in place, without them the archive is removed
+    # again, the original is still there for the next run
+    try:
+        write_bloom_filters(filepath, arch_dir, client_filter)
+    except Exception:
+        get_log().error("Writing filters of {} failed, removing {}".format(filepath, target_zip))
+        os.remove(target_zip)
+        if source_path != filepath:
+            os.remove(source_path)
+        raise
+
+    get_log().debug("Read {:,d} bytes".format(processed))
+    get_log().info("Finished archiving {} to {}".format(filepath, target_zip))
+    if source_path != filepath:
+        os.remove(source_path)
+    os.remove(filepath)
+
+
+def archive_logs(config, datestr, age=DEFAULT_ARCHIVE_AGE, archive_format="gz", workers=1, compact=False, drop_indexes=False, client_filter=False):
+    if not archive.is_format_available(archive_format):
+        raise RuntimeError("Archive format {} is not available, the required package is not installed".format(archive_format))
+
+    if drop_indexes:
+        compact = True
+
+    arch_dir = config.get_archive_dir()
+    if os.path.exists(arch_dir):
+        if not os.path.isdir(arch_dir):
+            raise RuntimeError("Path '{}' is not a directory".format(arch_dir))
+    else:
+        os.makedirs(arch_dir)
+
+    get_log().info("Start date  : {}".format(datestr))
+    get_log().info("Age         : {}".format(age))
+    get_log().info("Format      : {}".format(archive_format))
+    get_log().info("Workers     : {}".format(workers))
+    get_log().info("Compact     : {}".format(compact))
+    get_log().info("Drop indexes: {}".format(drop_indexes))
+    get_log().info("Client filter: {}".format(client_filter))
+
+    age_delta = datetime.timedelta(days=age)
+
+    arch_date = (datetime.datetime.strptime(datestr, '%Y-%m-%d') - age_delta).strftime('%Y-%m-%d')
+
+    get_log().info("Archive date: {}".format(arch_date))
+
+    if compact:
+        compact_dir = config.get_temp_dir()
+        if not os.path.exists(compact_dir):
+            os.makedirs(compact_dir)
+    else:
+        compact_dir = None
+
+    archive_entries = []
+    with os.scandir(config.get_data_dir()) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.endswith("-alblogs.db") and entry.name[:10] < arch_date:
+                get_log().info("Found file to archive: {}".format(entry.path))
+                archive_entries.append((entry.name, entry.path, entry.stat().st_size))
+
+    if workers > 1:
+        with multiprocessing.Pool(processes=workers) as pool:
+            for name, path, size in archive_entries:
+                archive_file(name, path, size, arch_dir, archive_format, pool, workers, compact_dir, drop_indexes, client_filter)
+    else:
+        for name, path, size in archive_entries:
+            archive_file(name, path, size, arch_dir, archive_format, None, 1, compact_dir, drop_indexes, client_filter)
@@ -0,0 +1,186 @@
+import gzip
+import re
+import logging
+
+LOGGER = None
+
+LOG_ENTRY_RE = re.compile("(.*?) (.*?) (.*?) (.*?)\:(.*?) (.*?)\:(.*?) (.*?) (.*?) (.*?) (.*?) (.*?) (.*?) (.*?) \"(.*?) (.*?) (.*?)\" \"(.*?)\" (.*?) (.*?) (.*?) \"(.*?)\" \"(.*?)\" \"(.*?)\" (.*?) (.*?) \"(.*?)\"")
+
+# 2018-07-24T13:25:00.488400Z
+DATE_RE = re.compile("(.*?)T(\d\d)\:(\d\d)\:(\d\d)\.(\d+)Z")
+
+
+def get_log():
+    global LOGGER
+    if LOGGER is None:
+        LOGGER = logging.getLogger(__name__)
+    return LOGGER
+
+
+def fix_negative(value):
+    value = float(value)
+    if value < 0:
+        return 0
+
+    return value
+
+
+def parse_request(request):
+    url = None
+    query = None
+
+    parts = request.split("?")
+    url = parts[0]
+    if len(parts) > 1:
+        query = parts[1]
+
+    return (url, query)
+
+
+def parse_date(datestr):
+    datepart = None
+    hourpart = None
+    minutepart = None
+    secondspart = None
+    microsecondspart = None
+
+    # Fast path for the fixed width timestamps written by the ALB, other formats go through DATE_RE
+    if len(datestr) > 21 and datestr[10] == "T" and datestr[13] == ":" and datestr[16] == ":" and datestr[19] == "." and datestr[-1] == "Z":
+        return datestr[:10], datestr[11:13], datestr[14:16], datestr[17:19], datestr[20:-1]
+
+    match = DATE_RE.match(datestr)
+    if match:
+        datepart = match.group(1).strip()
+        hourpart = match.group(2).strip()
+        minutepart = match.group(3).strip()
+        secondspart = match.group(4).strip()
+        microsecondspart = match.group(5).strip()
+
+    else:
+        raise RuntimeError("DATE NOMATCH: {0}".format(datestr))
+
+    return datepart, hourpart, minutepart, secondspart, microsecondspart
+
+
+def tokenize_line(line):
+    # Splits an ALB log line into the same 27 fields as LOG_ENTRY_RE in a single left-to-right pass.
+    # Splitting on the double quotes separates the quoted fields (odd positions) from the runs of
+    # space separated fields between them (even positions). Returns None when the line does not
+    # have the expected layout, the caller then falls back to LOG_ENTRY_RE.
+    parts = line.split('"')
+    if len(parts) < 13 or parts[2] != " " or parts[6] != " " or parts[8] != " ":
+        return None
+
+    head = parts[0].split(" ")
+    request = parts[1].split(" ", 2)
+    middle = parts[4].split(" ")
+    tail = parts[10].split(" ")
+    if len(head) != 13 or len(request) != 3 or len(middle) != 5 or len(tail) != 4:
+        return None
+
+    (client_ip, sep, client_port) = head[3].partition(":")
+    if not sep:
+        return None
+
+    (target_ip, sep, target_port) = head[4].partition(":")
+    if not sep:
+        return None
+
+    return [head[0], head[1], head[2], client_ip, client_port, target_ip, target_port,
+            head[5], head[6], head[7], head[8], head[9], head[10], head[11],
+            request[0], request[1], request[2], parts[3].strip(),
+            middle[1], middle[2], middle[3], parts[5], parts[7], parts[9],
+            tail[1], tail[2], parts[11]]
+
+
+def match_line(line):
+    # Regular expression based fallback for lines that are rejected by tokenize_line
+    match = LOG_ENTRY_RE.match(line)
+    if not match:
+        return None
+
+    return [group.strip() for group in match.groups()]
+
+
+def parse_line(line):
+    fields = tokenize_line(line)
+    if fields is None:
+        fields = match_line(line)
+        if fields is None:
+            return None
+
+    return build_record(fields)
+
+
+def build_record(fields):
+    (request_type, timestamp, elb, client_ip, client_port, target_ip, target_port, request_processing_time,
+     target_processing_time, response_processing_time, elb_status_code, target_status_code, received_bytes,
+     sent_bytes, request_method, request, http_version, user_agent, ssl_cipher, ssl_protocol, target_group_arn,
+     trace_id, domain_name, chosen_cert_arn, matched_rule_priority, request_creation_time, actions_executed) = fields
+
+    (request_url, request_query) = parse_request(request)
+    (datepart, hourpart, minutepart, secondspart, microsecondspart) = parse_date(timestamp)
+
+    record = {"type": request_type
+        , "timestamp": timestamp
+        , "datepart": datepart
+        , "hourpart": hourpart
+        , "minutepart": minutepart
+        , "secondspart": secondspart
+        , "microsecondspart": microsecondspart
+        , "elb": elb
+        , "client_ip": client_ip
+        , "client_port": client_port
+        , "target_ip": target_ip
+        , "target_port": target_port
+        , "request_processing_time": fix_negative(request_processing_time)
+        , "target_processing_time": fix_negative(target_processing_time)
+        , "response_processing_time": fix_negative(response_processing_time)
+        , "elb_status_code": elb_status_code
+        , "target_status_code": target_status_code
+        , "received_bytes": received_bytes
+        , "sent_bytes": sent_bytes
+        , "request_method": request_method
+        , "request_url": request_url
+        , "request_query": request_query
+        , "http_version": http_version
+        , "user_agent": user_agent
+        , "ssl_cipher": ssl_cipher
+        , "ssl_protocol": ssl_protocol
+        , "target_group_arn": target_group_arn
+        , "trace_id": trace_id
+        , "domain_name": domain_name
+        , "chosen_cert_arn": chosen_cert_arn
+        , "matched_rule_priority": matched_rule_priority
+        , "request_creation_time": request_creation_time
+        , "actions_executed": actions_executed
+              }
+
+    return record
+
+
+def open_logfile(logname):
+    if logname.endswith(".gz"):
+        get_log().debug("Log file is a gzip file")
+        return gzip.open(logname, "rt", encoding="latin-1")
+
+    get_log().debug("Log file is a normal text file file")
+    return open(logname, "r", encoding="latin-1")
+
+
+def parse_lines(fhandle):
+    # Generator that yields a parsed record for every line that matches the ALB log format
+    count = 0
+    for line in fhandle:
+        count += 1
+        if count % 1000 == 0:
+            get_log().debug("Processed {} lines".format(count))
+
+        line = line.rstrip()
+        record = parse_line(line)
+        if record:
+            yield record
+        else:
+            get_log().warning("NOMATCH: {}".format(line))
+
+    get_log().info("Processed {} lines".format(count))
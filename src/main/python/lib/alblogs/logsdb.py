@@ -3,11 +3,69 @@ import sqlite3
 import logging
 from urllib.parse import parse_qs
 
+from alblogs import bloom
+from alblogs.dimcache import DimensionCache
+
 LOGGER = None
 
+# Number of log entries that are buffered before they are written with executemany
+DEFAULT_BATCH_SIZE = 10000
+
+# Dimension tables (table name, value column) that are cached in memory by the Database
+DIMENSION_TABLES = [("log_reqtype", "reqtype"),
+                    ("log_date", "date"),
+                    ("log_hour", "hour"),
+                    ("log_minute", "minute"),
+                    ("log_elb", "elb"),
+                    ("log_method", "method"),
+                    ("log_url", "url"),
+                    ("log_http_version", "http_version"),
+                    ("log_user_agent", "user_agent"),
+                    ("log_target_group", "target_group"),
+                    ("log_domain", "domain"),
+                    ("log_target_address", "target_address"),
+                    ("log_client_address", "client_address"),
+                    ("log_query_param", "query_param")]
+
+# Dimension tables with an INTEGER value column, their values are cached as int so the values read
+# from the database and the strings of the parsed logs map to the same cache entry
+INTEGER_DIMENSION_TABLES = ["log_hour", "log_minute"]
+
+# Maximum number of cached values for high cardinality dimensions, least recently used values are
+# evicted when the cache is full. Dimensions that are not listed are cached without a limit.
+DIMENSION_CACHE_SIZES = {"log_user_agent": 100000,
+                         "log_client_address": 100000}
+
+# Page size of new databases, larger pages mean fewer pages to write for the wide log_entry rows
+PAGE_SIZE = 16384
+
+# Pragmas used during a bulk load. A logs database is built once from the source logs and is simply
+# rebuilt when the load fails, so durability is traded for speed until the load is finished.
+BULK_LOAD_PRAGMAS = ["PRAGMA journal_mode = OFF",
+                     "PRAGMA synchronous = OFF",
+                     "PRAGMA cache_size = -262144",
+                     "PRAGMA temp_store = MEMORY"]
+
+# Restores the sqlite defaults after a bulk load
+DEFAULT_PRAGMAS = ["PRAGMA journal_mode = DELETE",
+                   "PRAGMA synchronous = FULL",
+                   "PRAGMA cache_size = -2000",
+                   "PRAGMA temp_store = DEFAULT"]
+
+# Indexes that are not needed while loading, they are dropped during a bulk load and created in
+# one go when the load is finished. The unique indexes of the dimension tables are always kept
+# because the dimension lookups depend on them.
+SECONDARY_INDEXES = [("ux_log_query_param_value_entry_query_param", "CREATE UNIQUE INDEX IF NOT EXISTS `ux_log_query_param_value_entry_query_param` ON `log_query_param_value`(`log_entry_id`, `log_query_param_id`);"),
+                     ("ix_log_entry_date_hour", "CREATE INDEX IF NOT EXISTS `ix_log_entry_date_hour` ON `log_entry`(`log_date_id`, `log_hour_id`);"),
+                     ("ix_log_entry_url", "CREATE INDEX IF NOT EXISTS `ix_log_entry_url` ON `log_entry`(`log_url_id`);"),
+                     ("ix_log_entry_target_address", "CREATE INDEX IF NOT EXISTS `ix_log_entry_target_address` ON `log_entry`(`log_target_address_id`);"),
+                     ("ix_log_entry_client_address", "CREATE INDEX IF NOT EXISTS `ix_log_entry_client_address` ON `log_entry`(`log_client_address_id`);"),
+                     ("ix_log_entry_source", "CREATE INDEX IF NOT EXISTS `ix_log_entry_source` ON `log_entry`(`log_source_id`);")]
+
 sql = ""
 sql += "INSERT INTO `log_entry`  "
-sql += "(                         `log_source_id` "
+sql += "(                         `id` "
+sql += ",                         `log_source_id` "
 sql += ",                         `log_reqtype_id` "
 sql += ",                         `log_date_id` "
 sql += ",                         `log_hour_id` "
@@ -38,7 +96,8 @@ sql += ",                         `sent_bytes` "
 sql += ",                         `request_query` "
 sql += ",                         `request_creation_time` "
 sql += ",                         `actions_executed` "
-sql += ") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);"
+sql += ",                         `trace_id` "
+sql += ") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);"
 
 ENTRY_INSERT_SQL = sql
 
@@ -51,6 +110,70 @@ sql += ") VALUES (?, ?, ?);"
 
 QUERY_PARAM_VALUE_INSERT_SQL = sql
 
+# Dimensions of a log entry (table name, value column, record field), in the order of their
+# columns in ENTRY_INSERT_SQL
+ENTRY_DIMENSIONS = [("log_reqtype", "reqtype", "type"),
+                    ("log_date", "date", "datepart"),
+                    ("log_hour", "hour", "hourpart"),
+                    ("log_minute", "minute", "minutepart"),
+                    ("log_elb", "elb", "elb"),
+                    ("log_method", "method", "request_method"),
+                    ("log_url", "url", "request_url"),
+                    ("log_http_version", "http_version", "http_version"),
+                    ("log_user_agent", "user_agent", "user_agent"),
+                    ("log_target_group", "target_group", "target_group_arn"),
+                    ("log_domain", "domain", "domain_name"),
+                    ("log_target_address", "target_address", "target_ip"),
+                    ("log_client_address", "client_address", "client_ip")]
+
+# Record fields of the log_entry columns that follow the dimension ids in ENTRY_INSERT_SQL
+ENTRY_FIELDS = ["secondspart", "microsecondspart", "timestamp", "type", "elb", "client_port", "target_port",
+                "request_processing_time", "target_processing_time", "response_processing_time",
+                "elb_status_code", "target_status_code", "received_bytes", "sent_bytes", "request_query",
+                "request_creation_time", "actions_executed", "trace_id"]
+
+
+def build_stats_base_sql(schema="main"):
+    # Query that pre-aggregates the log entries of a logs database on all columns used by the stats
+    # tables. schema is the name of the logs database on the connection, it differs from main when
+    # the logs database is attached to another database.
+    sql = """SELECT   `ety`.`log_date_id` `log_date_id`
+             ,        `ety`.`log_hour_id` `log_hour_id`
+             ,        `ety`.`log_url_id` `log_url_id`
+             ,        `ety`.`log_reqtype_id` `log_reqtype_id`
+             ,        `ety`.`log_target_address_id` `log_target_address_id`
+             ,        `ety`.`target_port` `target_port`
+             ,        `ety`.`target_status_code` `target_status_code`
+             ,        `ety`.`elb_status_code` `elb_status_code`
+             ,        COUNT(*)     `request_count`
+             ,        SUM(`request_processing_time_sec`) `sum_request_processing_time_sec`
+             ,        MIN(`request_processing_time_sec`) `min_request_processing_time_sec`
+             ,        MAX(`request_processing_time_sec`) `max_request_processing_time_sec`
+             ,        SUM(`target_processing_time_sec`) `sum_target_processing_time_sec`
+             ,        MIN(`target_processing_time_sec`) `min_target_processing_time_sec`
+             ,        MAX(`target_processing_time_sec`) `max_target_processing_time_sec`
+             ,        SUM(`response_processing_time_sec`) `sum_response_processing_time_sec`
+             ,        MIN(`response_processing_time_sec`) `min_response_processing_time_sec`
+             ,        MAX(`response_processing_time_sec`) `max_response_processing_time_sec`
+             ,        SUM(`received_bytes`) `sum_received_bytes`
+             ,        MIN(`received_bytes`) `min_received_bytes`
+             ,        MAX(`received_bytes`) `max_received_bytes`
+             ,        SUM(`sent_bytes`) `sum_sent_bytes`
+             ,        MIN(`sent_bytes`) `min_sent_bytes`
+             ,        MAX(`sent_bytes`) `max_sent_bytes`
+             FROM     {}.`log_entry` `ety`
+             GROUP BY `ety`.`log_date_id`
+             ,        `ety`.`log_hour_id`
+             ,        `ety`.`log_url_id`
+             ,        `ety`.`log_reqtype_id`
+             ,        `ety`.`log_target_address_id`
+             ,        `ety`.`target_port`
+             ,        `ety`.`target_status_code`
+             ,        `ety`.`elb_status_code`
+          """.format(schema)
+
+    return sql
+
 
 def get_log():
     global LOGGER
@@ -59,24 +182,220 @@ def get_log():
     return LOGGER
 
 
+def parse_query_params(request_query):
+    # Returns (name, value) of every parameter in a query string, the values of a repeated
+    # parameter are joined
+    return [(name, "".join(values)) for name, values in parse_qs(request_query, keep_blank_values=True).items()]
+
+
+def compact_database(filename, target_filename, drop_indexes=False):
+    # Writes a compacted copy of a logs database, without free pages and optionally without the
+    # secondary indexes (they can be rebuilt), and verifies it against the original. Works on the
+    # files directly, opening a Database would load the dimension caches for nothing.
+    if os.path.exists(target_filename):
+        raise RuntimeError("Target for compacting '{}' already exists".format(target_filename))
+
+    get_log().info("Compacting {} into {}".format(filename, target_filename))
+
+    conn = sqlite3.connect(filename)
+    try:
+        conn.execute("VACUUM INTO ?;", (target_filename, ))
+
+        if drop_indexes:
+            # VACUUM INTO copies the indexes, dropping them leaves free pages that need another VACUUM
+            target_conn = sqlite3.connect(target_filename)
+            try:
+                for (indexname, sql) in SECONDARY_INDEXES:
+                    get_log().debug("Dropping index {}".format(indexname))
+                    target_conn.execute("DROP INDEX IF EXISTS `{}`;".format(indexname))
+                target_conn.commit()
+                target_conn.execute("VACUUM;")
+            finally:
+                target_conn.close()
+
+        verify_compacted_database(conn, target_filename)
+    except Exception:
+        if os.path.exists(target_filename):
+            os.remove(target_filename)
+        raise
+    finally:
+        conn.close()
+
+    get_log().info("Compacted {:,d} bytes into {:,d} bytes".format(os.path.getsize(filename), os.path.getsize(target_filename)))
+
+
+def verify_compacted_database(conn, target_filename):
+    # The copy must pass the integrity check and contain the same number of rows in every table
+    target_conn = sqlite3.connect(target_filename)
+    try:
+        result = target_conn.execute("PRAGMA integrity_check;").fetchone()[0]
+        if result != "ok":
+            raise RuntimeError("Integrity check of '{}' failed: {}".format(target_filename, result))
+
+        sql = "SELECT `name` FROM `sqlite_master` WHERE `type` = 'table' AND `name` NOT LIKE 'sqlite_%' ORDER BY `name`;"
+        for (tablename, ) in conn.execute(sql).fetchall():
+            count = conn.execute("SELECT COUNT(*) FROM `{}`;".format(tablename)).fetchone()[0]
+            target_count = target_conn.execute("SELECT COUNT(*) FROM `{}`;".format(tablename)).fetchone()[0]
+            if count != target_count:
+                raise RuntimeError("Table {} of '{}' has {} rows instead of {}".format(tablename, target_filename, target_count, count))
+    finally:
+        target_conn.close()
+
+    get_log().info("Verified compacted database {}".format(target_filename))
+
+
+def build_bloom_filters(filename, client_filter=False, false_positive_rate=bloom.DEFAULT_FALSE_POSITIVE_RATE):
+    # Returns the bloom filters of a logs database by kind: trace ids and optionally client addresses.
+    # Logs databases from before trace ids were stored get no trace filter.
+    result = {}
+
+    conn = sqlite3.connect(filename)
+    try:
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(`log_entry`);").fetchall()]
+        if "trace_id" in columns:
+            count = conn.execute("SELECT COUNT(*) FROM `log_entry`;").fetchone()[0]
+            values = (row[0] for row in conn.execute("SELECT `trace_id` FROM `log_entry`;"))
+            result["trace"] = bloom.build_filter(values, count, false_positive_rate)
+        else:
+            get_log().warning("Logs database {} has no trace ids, no trace filter built".format(filename))
+
+        if client_filter:
+            count = conn.execute("SELECT COUNT(*) FROM `log_client_address`;").fetchone()[0]
+            values = (row[0] for row in conn.execute("SELECT `client_address` FROM `log_client_address`;"))
+            result["client"] = bloom.build_filter(values, count, false_positive_rate)
+    finally:
+        conn.close()
+
+    return result
+
+
+def query_entries_by_trace_id(filename, trace_id, client_address=None):
+    # Returns the log entries of a logs database with the given trace id (and client address). There
+    # is no index on trace_id, a point lookup scans log_entry once.
+    conn = sqlite3.connect(filename)
+    conn.row_factory = sqlite3.Row
+    try:
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(`log_entry`);").fetchall()]
+        if "trace_id" not in columns:
+            get_log().warning("Logs database {} has no trace ids".format(filename))
+            return []
+
+        sql = """SELECT   `ety`.`timestamp` `timestamp`
+                 ,        `ety`.`trace_id` `trace_id`
+                 ,        `cla`.`client_address` `client_address`
+                 ,        `ety`.`client_port` `client_port`
+                 ,        `rte`.`reqtype` `reqtype`
+                 ,        `url`.`url` `url`
+                 ,        `ety`.`request_query` `request_query`
+                 ,        `tas`.`target_address` `target_address`
+                 ,        `ety`.`target_port` `target_port`
+                 ,        `ety`.`elb_status_code` `elb_status_code`
+                 ,        `ety`.`target_status_code` `target_status_code`
+                 ,        `ety`.`request_processing_time_sec` `request_processing_time_sec`
+                 ,        `ety`.`target_processing_time_sec` `target_processing_time_sec`
+                 ,        `ety`.`response_processing_time_sec` `response_processing_time_sec`
+                 FROM     `log_entry` `ety`
+                 JOIN     `log_client_address` `cla` ON `cla`.`id` = `ety`.`log_client_address_id`
+                 JOIN     `log_reqtype` `rte` ON `rte`.`id` = `ety`.`log_reqtype_id`
+                 JOIN     `log_url` `url` ON `url`.`id` = `ety`.`log_url_id`
+                 JOIN     `log_target_address` `tas` ON `tas`.`id` = `ety`.`log_target_address_id`
+                 WHERE    `ety`.`trace_id` = ?
+              """
+        params = [trace_id]
+        if client_address is not None:
+            sql += "AND      `cla`.`client_address` = ? "
+            params.append(client_address)
+        sql += "ORDER BY `ety`.`timestamp` "
+
+        get_log().debug("query_entries_by_trace_id: query = {}".format(sql))
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+class EntryBatch(object):
+    # The log entries of a log file, prepared by a worker process in parallel mode. Every entry
+    # refers to its dimension values (and query parameter names) by their index in the lists of
+    # distinct values of the file, so the process writing the database looks up the id of every
+    # distinct value once per file instead of all values of every entry.
+    def __init__(self):
+        self._dimension_values = [{} for dimension in ENTRY_DIMENSIONS]
+        self._query_param_names = {}
+        self._entries = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get_index(self, values, value):
+        index = values.get(value)
+        if index is None:
+            index = len(values)
+            values[value] = index
+        return index
+
+    def add_record(self, record):
+        dimensions = tuple(self._get_index(values, record[field]) for values, (tablename, columname, field) in zip(self._dimension_values, ENTRY_DIMENSIONS))
+        fields = tuple(record[field] for field in ENTRY_FIELDS)
+        query_params = [(self._get_index(self._query_param_names, name), value) for name, value in parse_query_params(record["request_query"])]
+        self._entries.append((dimensions, fields, query_params))
+
+    def get_dimension_values(self):
+        # per dimension the distinct values in order of their index
+        return [list(values.keys()) for values in self._dimension_values]
+
+    def get_query_param_names(self):
+        return list(self._query_param_names.keys())
+
+    def get_entries(self):
+        return self._entries
+
+
 class Database(object):
-    def __init__(self, filename, create=False):
+    def __init__(self, filename, create=False, batch_size=DEFAULT_BATCH_SIZE, cache_sizes=None):
         self._filename = filename
         self._create = create
         self._conn = None
         self._curs = None
-
-    def open(self):
+        self._batch_size = batch_size
+        self._entry_rows = []
+        self._query_param_value_rows = []
+        self._next_entry_id = None
+        self._cache_sizes = dict(DIMENSION_CACHE_SIZES)
+        if cache_sizes is not None:
+            self._cache_sizes.update(cache_sizes)
+        self._dimension_caches = {}
+        self._stats_base_built = False
+        self._bulk_load = False
+
+    def open(self, bulk_load=False):
+        # With bulk_load the database is opened for a bulk load (see begin_bulk_load), a new database
+        # is then created without the secondary indexes, end_bulk_load creates them
         if os.path.exists(self._filename):
             get_log().info("Opening existing database {}".format(self._filename))
-            return self._open_db()
+            self._open_db()
+            self._warm_dimension_caches()
+            if bulk_load:
+                self.begin_bulk_load()
+            return
 
         if self._create:
             get_log().info("Creating new database {}".format(self._filename))
-            return self._create_db()
+            self._create_db(secondary_indexes=not bulk_load)
+            if bulk_load:
+                self.begin_bulk_load()
+            return
 
         raise RuntimeError("Database at path '{}' does not exist and auto create is disabled".format(self._filename))
 
+    def open_serialized(self, data):
+        # Opens the database from its serialized content (e.g. a decompressed archive) in memory,
+        # nothing is written back to the file
+        get_log().info("Opening database {} in memory".format(self._filename))
+        self._conn = sqlite3.connect(":memory:")
+        self._conn.deserialize(data)
+        self._conn.row_factory = sqlite3.Row
+        self._warm_dimension_caches()
+
     def _get_conn(self):
         return self._conn
 
@@ -91,19 +410,29 @@ class Database(object):
             get_log().error("No active transactions")
             raise RuntimeError("No active transaction")
 
+        self.flush()
+
         get_log().info("Committing transaction")
         self._get_conn().commit()
-        self._curs is None
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            self._curs = None
 
     def _open_db(self):
         self._conn = sqlite3.connect(self._filename)
         self._conn.row_factory = sqlite3.Row
 
-    def _create_db(self):
+    def _create_db(self, secondary_indexes=True):
         self._open_db()
 
         curs = self._get_cursor()
 
+        # the page size can only be changed before the first table is created
+        curs.execute("PRAGMA page_size = {}".format(PAGE_SIZE))
+
         sql = ""
         sql += "CREATE TABLE `log_source` (`id` INTEGER PRIMARY KEY "
         sql += ",                          `name` TEXT);"
@@ -246,10 +575,6 @@ class Database(object):
         sql += ",                                     `value` TEXT);"
         curs.execute(sql)
 
-        sql = ""
-        sql += "CREATE UNIQUE INDEX `ux_log_query_param_value_entry_query_param` ON `log_query_param_value`(`log_entry_id`, `log_query_param_id`);"
-        curs.execute(sql)
-
         sql = ""
         sql += "CREATE TABLE `log_entry` (`id` INTEGER PRIMARY KEY "
         sql += ",                         `log_source_id` INTEGER "
@@ -283,10 +608,83 @@ class Database(object):
         sql += ",                         `request_query` TEXT "
         sql += ",                         `request_creation_time` TEXT "
         sql += ",                         `actions_executed` TEXT "
+        sql += ",                         `trace_id` TEXT "
         sql += ");"
         curs.execute(sql)
 
+        if secondary_indexes:
+            self._create_secondary_indexes()
+
+        self.commit()
+
+    def _create_secondary_indexes(self):
+        for (indexname, sql) in SECONDARY_INDEXES:
+            get_log().info("Creating index {}".format(indexname))
+            self._get_cursor().execute(sql)
+
+    def _get_index_names(self):
+        sql = "SELECT `name` FROM `sqlite_master` WHERE `type` = 'index';"
+        return set(row[0] for row in self._get_cursor().execute(sql).fetchall())
+
+    def _drop_secondary_indexes(self):
+        # a new database opened for a bulk load has no secondary indexes to drop
+        existing = self._get_index_names()
+        for (indexname, sql) in SECONDARY_INDEXES:
+            if indexname in existing:
+                get_log().debug("Dropping index {}".format(indexname))
+                self._get_cursor().execute("DROP INDEX `{}`;".format(indexname))
+
+    def ensure_secondary_indexes(self):
+        # Rebuilds the secondary indexes when they are missing, e.g. in a database that was archived
+        # without them
+        existing = self._get_index_names()
+        if all(indexname in existing for (indexname, sql) in SECONDARY_INDEXES):
+            return
+
+        get_log().info("BEGIN: Rebuilding secondary indexes")
+        self._create_secondary_indexes()
         self.commit()
+        get_log().info("END: Rebuilding secondary indexes")
+
+    def _execute_pragmas(self, pragmas):
+        for pragma in pragmas:
+            get_log().debug("Executing {}".format(pragma))
+            self._get_cursor().execute(pragma)
+
+    def begin_bulk_load(self):
+        # Prepares the database for loading a large number of log entries: the secondary indexes
+        # are dropped and the connection is switched to the bulk load pragmas. Call end_bulk_load
+        # when done, until then the database can be corrupted by a crash.
+        if self._bulk_load:
+            raise RuntimeError("Bulk load already started")
+
+        get_log().info("Starting bulk load")
+
+        # the journal mode can not be changed inside a transaction, without a cursor nothing has been
+        # executed yet and there is no transaction to commit
+        if self._curs is not None:
+            self.commit()
+
+        self._execute_pragmas(BULK_LOAD_PRAGMAS)
+        self._drop_secondary_indexes()
+        self._bulk_load = True
+
+    def end_bulk_load(self):
+        if not self._bulk_load:
+            raise RuntimeError("No bulk load started")
+
+        self.commit()
+
+        get_log().info("BEGIN: Creating secondary indexes")
+        self._create_secondary_indexes()
+        self.commit()
+        get_log().info("END: Creating secondary indexes")
+
+        self._execute_pragmas(DEFAULT_PRAGMAS)
+        self._get_cursor().execute("PRAGMA optimize")
+        self._bulk_load = False
+
+        get_log().info("Finished bulk load")
 
     def _add_dimension(self, tablename, columname, value):
         sql = ""
@@ -297,16 +695,62 @@ class Database(object):
 
         return id
 
+    def _get_dimension_cache(self, tablename):
+        cache = self._dimension_caches.get(tablename)
+        if cache is None:
+            cache = DimensionCache(self._cache_sizes.get(tablename))
+            self._dimension_caches[tablename] = cache
+
+        return cache
+
+    def _warm_dimension_caches(self):
+        for (tablename, columname) in DIMENSION_TABLES:
+            cache = self._get_dimension_cache(tablename)
+            sql = ""
+            sql += "SELECT `id`, `{}` FROM `{}` ".format(columname, tablename)
+            sql += "ORDER BY `id` "
+            if cache.get_max_size() is not None:
+                # keep the most recently added values when the dimension does not fit in the cache
+                sql += "DESC LIMIT {}".format(cache.get_max_size())
+
+            for row in self._get_cursor().execute(sql):
+                cache.put(row[1], row[0])
+
+            get_log().debug("Warmed dimension cache for {} with {} values".format(tablename, len(cache)))
+
+    def get_cache_stats(self):
+        result = {}
+        for tablename in sorted(self._dimension_caches.keys()):
+            result[tablename] = self._dimension_caches[tablename].get_stats()
+
+        return result
+
+    def log_cache_stats(self):
+        for tablename, stats in self.get_cache_stats().items():
+            get_log().info("Dimension cache {}: size = {}, hits = {}, misses = {}".format(tablename, stats["size"], stats["hits"], stats["misses"]))
+
     def _get_or_add_dimension(self, tablename, columname, value):
+        if tablename in INTEGER_DIMENSION_TABLES:
+            value = int(value)
+
+        cache = self._get_dimension_cache(tablename)
+        id = cache.get(value)
+        if id is not None:
+            return id
+
         sql = ""
         sql += "SELECT `id` FROM `{}` WHERE `{}` = ?".format(tablename, columname);
 
         res = self._get_cursor().execute(sql, (value, ))
         row = res.fetchone()
         if row:
-            return row[0]
+            id = row[0]
         else:
-            return self._add_dimension( tablename, columname, value)
+            id = self._add_dimension( tablename, columname, value)
+
+        cache.put(value, id)
+
+        return id
 
     def add_source(self, logname):
         sql = ""
@@ -359,6 +803,20 @@ class Database(object):
     def get_or_add_query_param(self, value):
         return self._get_or_add_dimension("log_query_param", "query_param", value)
 
+    def _allocate_entry_id(self):
+        # log_entry rows are buffered, so their ids are assigned here instead of taken from lastrowid
+        if self._next_entry_id is None:
+            res = self._get_cursor().execute("SELECT MAX(`id`) FROM `log_entry`;")
+            max_id = res.fetchone()[0]
+            if max_id is None:
+                max_id = 0
+            self._next_entry_id = max_id + 1
+
+        log_entry_id = self._next_entry_id
+        self._next_entry_id += 1
+
+        return log_entry_id
+
     def save_record(self, log_source_id, record):
         log_reqtype_id = self.get_or_add_reqtype(record["type"])
         log_date_id = self.get_or_add_date(record["datepart"])
@@ -374,70 +832,130 @@ class Database(object):
         log_target_address_id = self.get_or_add_target_address(record["target_ip"])
         log_client_address_id = self.get_or_add_client_address(record["client_ip"])
 
-        self._get_cursor().execute(ENTRY_INSERT_SQL, (log_source_id, log_reqtype_id, log_date_id, log_hour_id,
-                                                      log_minute_id, log_elb_id, log_method_id, log_url_id,
-                                                      log_http_version_id, log_user_agent_id, log_target_group_id,
-                                                      log_domain_id, log_target_address_id, log_client_address_id,
-                                                      record["secondspart"], record["microsecondspart"],
-                                                      record["timestamp"], record["type"], record["elb"],
-                                                      record["client_port"],
-                                                      record["target_port"], record["request_processing_time"],
-                                                      record["target_processing_time"],
-                                                      record["response_processing_time"], record["elb_status_code"],
-                                                      record["target_status_code"], record["received_bytes"],
-                                                      record["sent_bytes"], record["request_query"],
-                                                      record["request_creation_time"], record["actions_executed"]))
-        log_entry_id = self._get_cursor().lastrowid
+        log_entry_id = self._allocate_entry_id()
+
+        self._entry_rows.append((log_entry_id, log_source_id, log_reqtype_id, log_date_id, log_hour_id,
+                                 log_minute_id, log_elb_id, log_method_id, log_url_id,
+                                 log_http_version_id, log_user_agent_id, log_target_group_id,
+                                 log_domain_id, log_target_address_id, log_client_address_id,
+                                 record["secondspart"], record["microsecondspart"],
+                                 record["timestamp"], record["type"], record["elb"],
+                                 record["client_port"],
+                                 record["target_port"], record["request_processing_time"],
+                                 record["target_processing_time"],
+                                 record["response_processing_time"], record["elb_status_code"],
+                                 record["target_status_code"], record["received_bytes"],
+                                 record["sent_bytes"], record["request_query"],
+                                 record["request_creation_time"], record["actions_executed"],
+                                 record["trace_id"]))
 
         self.process_request_query(log_entry_id, record["request_query"])
 
+        if len(self._entry_rows) >= self._batch_size:
+            self.flush()
+
+    def save_entry_batch(self, log_source_id, batch):
+        # Saves the entries of an EntryBatch, with the same ids as save_record would assign: the
+        # distinct values of a dimension are in order of their first entry
+        dimension_ids = []
+        for (tablename, columname, field), values in zip(ENTRY_DIMENSIONS, batch.get_dimension_values()):
+            dimension_ids.append([self._get_or_add_dimension(tablename, columname, value) for value in values])
+
+        query_param_ids = [self.get_or_add_query_param(name) for name in batch.get_query_param_names()]
+
+        for dimensions, fields, query_params in batch.get_entries():
+            log_entry_id = self._allocate_entry_id()
+            self._entry_rows.append((log_entry_id, log_source_id) + tuple(map(list.__getitem__, dimension_ids, dimensions)) + fields)
+
+            for index, value in query_params:
+                self._query_param_value_rows.append((log_entry_id, query_param_ids[index], value))
+
+            if len(self._entry_rows) >= self._batch_size:
+                self.flush()
+
     def process_request_query(self, log_entry_id, request_query):
-        query_params = parse_qs(request_query, keep_blank_values=True)
-        for query_param_name in query_params.keys():
-            values = query_params[query_param_name]
-            value_string = "".join(values)
+        for query_param_name, value_string in parse_query_params(request_query):
             self.save_query_param_value(log_entry_id, query_param_name, value_string)
 
     def save_query_param_value(self, log_entry_id, query_param_name, query_param_value):
         log_query_param_id = self.get_or_add_query_param(query_param_name)
-        self._get_cursor().execute(QUERY_PARAM_VALUE_INSERT_SQL, (log_entry_id, log_query_param_id, query_param_value))
+        self._query_param_value_rows.append((log_entry_id, log_query_param_id, query_param_value))
+
+    def flush(self):
+        # Writes the buffered log_entry and log_query_param_value rows, called automatically
+        # when the buffer reaches the batch size and on commit
+        if self._entry_rows:
+            get_log().debug("Flushing {} log entries".format(len(self._entry_rows)))
+            self._get_cursor().executemany(ENTRY_INSERT_SQL, self._entry_rows)
+            self._entry_rows = []
+            self._stats_base_built = False
+
+        if self._query_param_value_rows:
+            get_log().debug("Flushing {} query parameter values".format(len(self._query_param_value_rows)))
+            self._get_cursor().executemany(QUERY_PARAM_VALUE_INSERT_SQL, self._query_param_value_rows)
+            self._query_param_value_rows = []
+
+    def _ensure_stats_base(self):
+        # The stats queries all aggregate from the same pre-aggregated temporary table, so log_entry
+        # is only scanned once no matter how many of the stats queries are executed
+        if self._stats_base_built:
+            return
+
+        self.flush()
+
+        sql = """DROP TABLE IF EXISTS temp.`stats_base`"""
+        self._get_cursor().execute(sql)
+
+        sql = "CREATE TEMP TABLE `stats_base` AS " + build_stats_base_sql()
+
+        get_log().debug("_ensure_stats_base: query = {}".format(sql))
+
+        get_log().info("BEGIN: Creating stats base table")
+        self._get_cursor().execute(sql)
+        get_log().info("END: Creating stats base table")
+
+        self._stats_base_built = True
 
     def query_url_stats(self):
-        sql = ""
-        sql += "SELECT   `url`.`url`  `url`  "
-        sql += ",        `dte`.`date` `date` "
-        sql += ",        `hr`.`hour`  `hour` "
-        sql += ",        `ety`.`elb_status_code`  `elb_status_code` "
-        sql += ",        `rte`.`reqtype` `reqtype` "
-        sql += ",        COUNT(*)     `request_count` "
-        sql += ",        SUM(`request_processing_time_sec`) `sum_request_processing_time_sec` "
-        sql += ",        MIN(`request_processing_time_sec`) `min_request_processing_time_sec` "
-        sql += ",        MAX(`request_processing_time_sec`) `max_request_processing_time_sec` "
-        sql += ",        SUM(`target_processing_time_sec`) `sum_target_processing_time_sec` "
-        sql += ",        MIN(`target_processing_time_sec`) `min_target_processing_time_sec` "
-        sql += ",        MAX(`target_processing_time_sec`) `max_target_processing_time_sec` "
-        sql += ",        SUM(`response_processing_time_sec`) `sum_response_processing_time_sec` "
-        sql += ",        MIN(`response_processing_time_sec`) `min_response_processing_time_sec` "
-        sql += ",        MAX(`response_processing_time_sec`) `max_response_processing_time_sec` "
-        sql += ",        SUM(`received_bytes`) `sum_received_bytes` "
-        sql += ",        MIN(`received_bytes`) `min_received_bytes` "
-        sql += ",        MAX(`received_bytes`) `max_received_bytes` "
-        sql += ",        SUM(`sent_bytes`) `sum_sent_bytes` "
-        sql += ",        MIN(`sent_bytes`) `min_sent_bytes` "
-        sql += ",        MAX(`sent_bytes`) `max_sent_bytes` "
-        sql += "FROM     `log_url`   `url` "
-        sql += ",        `log_date`  `dte` "
-        sql += ",        `log_hour`  `hr` "
-        sql += ",        `log_entry` `ety` "
-        sql += ",        `log_reqtype` `rte` "
-        sql += "WHERE    `url`.`id` = `ety`.`log_url_id`"
-        sql += "AND      `dte`.`id` = `ety`.`log_date_id`"
-        sql += "AND      `hr`.`id`  = `ety`.`log_hour_id`"
-        sql += "AND      `rte`.`id`  = `ety`.`log_reqtype_id`"
-        sql += "GROUP BY `url`.`url` "
-        sql += ",        `rte`.`reqtype` "
-        sql += ",        `dte`.`date` "
-        sql += ",        `hr`.`hour`  "
+        # The url stats are grouped on url, request type, date and hour only, the elb status code of
+        # a row is the highest one of its entries
+        self._ensure_stats_base()
+
+        sql = """SELECT   `url`.`url`  `url`
+                 ,        `dte`.`date` `date`
+                 ,        `hr`.`hour`  `hour`
+                 ,        MAX(`bse`.`elb_status_code`)  `elb_status_code`
+                 ,        `rte`.`reqtype` `reqtype`
+                 ,        SUM(`bse`.`request_count`) `request_count`
+                 ,        SUM(`bse`.`sum_request_processing_time_sec`) `sum_request_processing_time_sec`
+                 ,        MIN(`bse`.`min_request_processing_time_sec`) `min_request_processing_time_sec`
+                 ,        MAX(`bse`.`max_request_processing_time_sec`) `max_request_processing_time_sec`
+                 ,        SUM(`bse`.`sum_target_processing_time_sec`) `sum_target_processing_time_sec`
+                 ,        MIN(`bse`.`min_target_processing_time_sec`) `min_target_processing_time_sec`
+                 ,        MAX(`bse`.`max_target_processing_time_sec`) `max_target_processing_time_sec`
+                 ,        SUM(`bse`.`sum_response_processing_time_sec`) `sum_response_processing_time_sec`
+                 ,        MIN(`bse`.`min_response_processing_time_sec`) `min_response_processing_time_sec`
+                 ,        MAX(`bse`.`max_response_processing_time_sec`) `max_response_processing_time_sec`
+                 ,        SUM(`bse`.`sum_received_bytes`) `sum_received_bytes`
+                 ,        MIN(`bse`.`min_received_bytes`) `min_received_bytes`
+                 ,        MAX(`bse`.`max_received_bytes`) `max_received_bytes`
+                 ,        SUM(`bse`.`sum_sent_bytes`) `sum_sent_bytes`
+                 ,        MIN(`bse`.`min_sent_bytes`) `min_sent_bytes`
+                 ,        MAX(`bse`.`max_sent_bytes`) `max_sent_bytes`
+                 FROM     `log_url`   `url`
+                 ,        `log_date`  `dte`
+                 ,        `log_hour`  `hr`
+                 ,        temp.`stats_base` `bse`
+                 ,        `log_reqtype` `rte`
+                 WHERE    `url`.`id` = `bse`.`log_url_id`
+                 AND      `dte`.`id` = `bse`.`log_date_id`
+                 AND      `hr`.`id`  = `bse`.`log_hour_id`
+                 AND      `rte`.`id`  = `bse`.`log_reqtype_id`
+                 GROUP BY `url`.`url`
+                 ,        `rte`.`reqtype`
+                 ,        `dte`.`date`
+                 ,        `hr`.`hour`
+              """
 
         get_log().debug("query_url_stats: query = {}".format(sql))
 
@@ -448,38 +966,40 @@ class Database(object):
         return result
 
     def query_target_address_stats(self):
-        sql = ""
-        sql += "SELECT   `tas`.`target_address`  `target_address`  "
-        sql += ",        `ety`.`target_port` `target_port` "
-        sql += ",        `dte`.`date` `date` "
-        sql += ",        `hr`.`hour`  `hour` "
-        sql += ",        COUNT(*)     `request_count` "
-        sql += ",        SUM(`request_processing_time_sec`) `sum_request_processing_time_sec` "
-        sql += ",        MIN(`request_processing_time_sec`) `min_request_processing_time_sec` "
-        sql += ",        MAX(`request_processing_time_sec`) `max_request_processing_time_sec` "
-        sql += ",        SUM(`target_processing_time_sec`) `sum_target_processing_time_sec` "
-        sql += ",        MIN(`target_processing_time_sec`) `min_target_processing_time_sec` "
-        sql += ",        MAX(`target_processing_time_sec`) `max_target_processing_time_sec` "
-        sql += ",        SUM(`response_processing_time_sec`) `sum_response_processing_time_sec` "
-        sql += ",        MIN(`response_processing_time_sec`) `min_response_processing_time_sec` "
-        sql += ",        MAX(`response_processing_time_sec`) `max_response_processing_time_sec` "
-        sql += ",        SUM(`received_bytes`) `sum_received_bytes` "
-        sql += ",        MIN(`received_bytes`) `min_received_bytes` "
-        sql += ",        MAX(`received_bytes`) `max_received_bytes` "
-        sql += ",        SUM(`sent_bytes`) `sum_sent_bytes` "
-        sql += ",        MIN(`sent_bytes`) `min_sent_bytes` "
-        sql += ",        MAX(`sent_bytes`) `max_sent_bytes` "
-        sql += "FROM     `log_target_address`   `tas` "
-        sql += ",        `log_date`  `dte` "
-        sql += ",        `log_hour`  `hr` "
-        sql += ",        `log_entry` `ety` "
-        sql += "WHERE    `tas`.`id` = `ety`.`log_target_address_id`"
-        sql += "AND      `dte`.`id` = `ety`.`log_date_id`"
-        sql += "AND      `hr`.`id`  = `ety`.`log_hour_id`"
-        sql += "GROUP BY `tas`.`target_address` "
-        sql += ",        `ety`.`target_port` "
-        sql += ",        `dte`.`date` "
-        sql += ",        `hr`.`hour`  "
+        self._ensure_stats_base()
+
+        sql = """SELECT   `tas`.`target_address`  `target_address`
+                 ,        `bse`.`target_port` `target_port`
+                 ,        `dte`.`date` `date`
+                 ,        `hr`.`hour`  `hour`
+                 ,        SUM(`bse`.`request_count`) `request_count`
+                 ,        SUM(`bse`.`sum_request_processing_time_sec`) `sum_request_processing_time_sec`
+                 ,        MIN(`bse`.`min_request_processing_time_sec`) `min_request_processing_time_sec`
+                 ,        MAX(`bse`.`max_request_processing_time_sec`) `max_request_processing_time_sec`
+                 ,        SUM(`bse`.`sum_target_processing_time_sec`) `sum_target_processing_time_sec`
+                 ,        MIN(`bse`.`min_target_processing_time_sec`) `min_target_processing_time_sec`
+                 ,        MAX(`bse`.`max_target_processing_time_sec`) `max_target_processing_time_sec`
+                 ,        SUM(`bse`.`sum_response_processing_time_sec`) `sum_response_processing_time_sec`
+                 ,        MIN(`bse`.`min_response_processing_time_sec`) `min_response_processing_time_sec`
+                 ,        MAX(`bse`.`max_response_processing_time_sec`) `max_response_processing_time_sec`
+                 ,        SUM(`bse`.`sum_received_bytes`) `sum_received_bytes`
+                 ,        MIN(`bse`.`min_received_bytes`) `min_received_bytes`
+                 ,        MAX(`bse`.`max_received_bytes`) `max_received_bytes`
+                 ,        SUM(`bse`.`sum_sent_bytes`) `sum_sent_bytes`
+                 ,        MIN(`bse`.`min_sent_bytes`) `min_sent_bytes`
+                 ,        MAX(`bse`.`max_sent_bytes`) `max_sent_bytes`
+                 FROM     `log_target_address`   `tas`
+                 ,        `log_date`  `dte`
+                 ,        `log_hour`  `hr`
+                 ,        temp.`stats_base` `bse`
+                 WHERE    `tas`.`id` = `bse`.`log_target_address_id`
+                 AND      `dte`.`id` = `bse`.`log_date_id`
+                 AND      `hr`.`id`  = `bse`.`log_hour_id`
+                 GROUP BY `tas`.`target_address`
+                 ,        `bse`.`target_port`
+                 ,        `dte`.`date`
+                 ,        `hr`.`hour`
+              """
 
         get_log().debug("query_target_stats: query = {}".format(sql))
 
@@ -490,35 +1010,37 @@ class Database(object):
         return result
 
     def query_status_code_stats(self):
-        sql = """SELECT   `ety`.`target_status_code` `target_status_code`
-                 ,        `ety`.`elb_status_code` `elb_status_code`
+        self._ensure_stats_base()
+
+        sql = """SELECT   `bse`.`target_status_code` `target_status_code`
+                 ,        `bse`.`elb_status_code` `elb_status_code`
                  ,        `dte`.`date` `date`
                  ,        `hr`.`hour`  `hour`
-                 ,        COUNT(*)     `request_count`
-                 ,        SUM(`request_processing_time_sec`) `sum_request_processing_time_sec`
-                 ,        MIN(`request_processing_time_sec`) `min_request_processing_time_sec`
-                 ,        MAX(`request_processing_time_sec`) `max_request_processing_time_sec`
-                 ,        SUM(`target_processing_time_sec`) `sum_target_processing_time_sec`
-                 ,        MIN(`target_processing_time_sec`) `min_target_processing_time_sec`
-                 ,        MAX(`target_processing_time_sec`) `max_target_processing_time_sec`
-                 ,        SUM(`response_processing_time_sec`) `sum_response_processing_time_sec`
-                 ,        MIN(`response_processing_time_sec`) `min_response_processing_time_sec`
-                 ,        MAX(`response_processing_time_sec`) `max_response_processing_time_sec`
-                 ,        SUM(`received_bytes`) `sum_received_bytes`
-                 ,        MIN(`received_bytes`) `min_received_bytes`
-                 ,        MAX(`received_bytes`) `max_received_bytes`
-                 ,        SUM(`sent_bytes`) `sum_sent_bytes`
-                 ,        MIN(`sent_bytes`) `min_sent_bytes`
-                 ,        MAX(`sent_bytes`) `max_sent_bytes`
+                 ,        SUM(`bse`.`request_count`) `request_count`
+                 ,        SUM(`bse`.`sum_request_processing_time_sec`) `sum_request_processing_time_sec`
+                 ,        MIN(`bse`.`min_request_processing_time_sec`) `min_request_processing_time_sec`
+                 ,        MAX(`bse`.`max_request_processing_time_sec`) `max_request_processing_time_sec`
+                 ,        SUM(`bse`.`sum_target_processing_time_sec`) `sum_target_processing_time_sec`
+                 ,        MIN(`bse`.`min_target_processing_time_sec`) `min_target_processing_time_sec`
+                 ,        MAX(`bse`.`max_target_processing_time_sec`) `max_target_processing_time_sec`
+                 ,        SUM(`bse`.`sum_response_processing_time_sec`) `sum_response_processing_time_sec`
+                 ,        MIN(`bse`.`min_response_processing_time_sec`) `min_response_processing_time_sec`
+                 ,        MAX(`bse`.`max_response_processing_time_sec`) `max_response_processing_time_sec`
+                 ,        SUM(`bse`.`sum_received_bytes`) `sum_received_bytes`
+                 ,        MIN(`bse`.`min_received_bytes`) `min_received_bytes`
+                 ,        MAX(`bse`.`max_received_bytes`) `max_received_bytes`
+                 ,        SUM(`bse`.`sum_sent_bytes`) `sum_sent_bytes`
+                 ,        MIN(`bse`.`min_sent_bytes`) `min_sent_bytes`
+                 ,        MAX(`bse`.`max_sent_bytes`) `max_sent_bytes`
                  FROM     `log_date`  `dte`
                  ,        `log_hour`  `hr`
-                 ,        `log_entry` `ety`
-                 WHERE    `dte`.`id` = `ety`.`log_date_id`
-                 AND      `hr`.`id`  = `ety`.`log_hour_id`
-                 GROUP BY `ety`.`target_status_code`
-                 ,        `ety`.`elb_status_code`
-                 ,        `dte`.`date` 
-                 ,        `hr`.`hour`  
+                 ,        temp.`stats_base` `bse`
+                 WHERE    `dte`.`id` = `bse`.`log_date_id`
+                 AND      `hr`.`id`  = `bse`.`log_hour_id`
+                 GROUP BY `bse`.`target_status_code`
+                 ,        `bse`.`elb_status_code`
+                 ,        `dte`.`date`
+                 ,        `hr`.`hour`
               """
 
         get_log().debug("query_status_code_stats: query = {}".format(sql))
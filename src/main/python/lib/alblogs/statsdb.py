@@ -2,8 +2,246 @@ import os.path
 import sqlite3
 import logging
 
+from alblogs import logsdb
+from alblogs.dimcache import DimensionCache
+
 LOGGER = None
 
+# Dimension tables (table name, value column) that are cached in memory by the Database
+DIMENSION_TABLES = [("log_reqtype", "reqtype"),
+                    ("log_date", "date"),
+                    ("log_hour", "hour"),
+                    ("log_elb", "elb"),
+                    ("log_method", "method"),
+                    ("log_url", "url"),
+                    ("log_http_version", "http_version"),
+                    ("log_user_agent", "user_agent"),
+                    ("log_target_group", "target_group"),
+                    ("log_domain", "domain"),
+                    ("log_target_address", "target_address"),
+                    ("log_client_address", "client_address")]
+
+# Dimension tables with an INTEGER value column, their values are cached as int so the values read
+# from the database and the strings of the parsed logs map to the same cache entry
+INTEGER_DIMENSION_TABLES = ["log_hour", "log_minute"]
+
+# Maximum number of cached values for high cardinality dimensions, least recently used values are
+# evicted when the cache is full. Dimensions that are not listed are cached without a limit.
+DIMENSION_CACHE_SIZES = {"log_user_agent": 100000,
+                         "log_client_address": 100000}
+
+# Daily rollup tables, maintained by refresh_date from the hourly stats tables
+ROLLUP_TABLES = ["stats_url_day", "stats_reqtype_day", "stats_status_code_day", "stats_day"]
+
+sql = ""
+sql += "CREATE TABLE IF NOT EXISTS `stats_url_day` (`id` INTEGER PRIMARY KEY "
+sql += ",                         `log_date_id` INTEGER "
+sql += ",                         `log_url_id` INTEGER "
+sql += ",                         `request_count` INTEGER "
+sql += ",                         `sum_target_processing_time_sec` REAL "
+sql += ",                         `request_count_excl_5xx` INTEGER "
+sql += ",                         `sum_target_processing_time_sec_excl_5xx` REAL "
+sql += ");"
+
+STATS_URL_DAY_CREATE_SQL = sql
+
+sql = ""
+sql += "CREATE TABLE IF NOT EXISTS `stats_reqtype_day` (`id` INTEGER PRIMARY KEY "
+sql += ",                         `log_date_id` INTEGER "
+sql += ",                         `log_reqtype_id` INTEGER "
+sql += ",                         `request_count` INTEGER "
+sql += ",                         `sum_target_processing_time_sec` REAL "
+sql += ");"
+
+STATS_REQTYPE_DAY_CREATE_SQL = sql
+
+sql = ""
+sql += "CREATE TABLE IF NOT EXISTS `stats_status_code_day` (`id` INTEGER PRIMARY KEY "
+sql += ",                         `log_date_id` INTEGER "
+sql += ",                         `target_status_code` INTEGER "
+sql += ",                         `elb_status_code` INTEGER "
+sql += ",                         `request_count` INTEGER "
+sql += ",                         `sum_target_processing_time_sec` REAL "
+sql += ");"
+
+STATS_STATUS_CODE_DAY_CREATE_SQL = sql
+
+sql = ""
+sql += "CREATE TABLE IF NOT EXISTS `stats_day` (`id` INTEGER PRIMARY KEY "
+sql += ",                         `log_date_id` INTEGER "
+sql += ",                         `request_count` INTEGER "
+sql += ",                         `sum_target_processing_time_sec` REAL "
+sql += ");"
+
+STATS_DAY_CREATE_SQL = sql
+
+
+def build_rollup_sql(condition):
+    # Statements that fill the daily rollup tables from the hourly stats tables for the rows
+    # matching condition, a condition on `log_date_id`
+    statements = []
+
+    sql = """INSERT INTO `stats_url_day` (`log_date_id`, `log_url_id`, `request_count`, `sum_target_processing_time_sec`, `request_count_excl_5xx`, `sum_target_processing_time_sec_excl_5xx`)
+             SELECT   `log_date_id`
+             ,        `log_url_id`
+             ,        SUM(`request_count`)
+             ,        SUM(`sum_target_processing_time_sec`)
+             ,        SUM(CASE WHEN `elb_status_code` < 500 THEN `request_count` ELSE 0 END)
+             ,        SUM(CASE WHEN `elb_status_code` < 500 THEN `sum_target_processing_time_sec` ELSE 0 END)
+             FROM     `stats_url`
+             WHERE    {}
+             GROUP BY `log_date_id`
+             ,        `log_url_id`
+          """.format(condition)
+    statements.append(sql)
+
+    sql = """INSERT INTO `stats_reqtype_day` (`log_date_id`, `log_reqtype_id`, `request_count`, `sum_target_processing_time_sec`)
+             SELECT   `log_date_id`
+             ,        `log_reqtype_id`
+             ,        SUM(`request_count`)
+             ,        SUM(`sum_target_processing_time_sec`)
+             FROM     `stats_url`
+             WHERE    {}
+             GROUP BY `log_date_id`
+             ,        `log_reqtype_id`
+          """.format(condition)
+    statements.append(sql)
+
+    sql = """INSERT INTO `stats_status_code_day` (`log_date_id`, `target_status_code`, `elb_status_code`, `request_count`, `sum_target_processing_time_sec`)
+             SELECT   `log_date_id`
+             ,        `target_status_code`
+             ,        `elb_status_code`
+             ,        SUM(`request_count`)
+             ,        SUM(`sum_target_processing_time_sec`)
+             FROM     `stats_status_code`
+             WHERE    {}
+             GROUP BY `log_date_id`
+             ,        `target_status_code`
+             ,        `elb_status_code`
+          """.format(condition)
+    statements.append(sql)
+
+    sql = """INSERT INTO `stats_day` (`log_date_id`, `request_count`, `sum_target_processing_time_sec`)
+             SELECT   `log_date_id`
+             ,        SUM(`request_count`)
+             ,        SUM(`sum_target_processing_time_sec`)
+             FROM     `stats_target_address`
+             WHERE    {}
+             GROUP BY `log_date_id`
+          """.format(condition)
+    statements.append(sql)
+
+    return statements
+
+
+# Catalog of the loaded dates, log_date_id is the source date of the stats (source_log_date_id)
+sql = ""
+sql += "CREATE TABLE IF NOT EXISTS `stats_loaded_date` (`id` INTEGER PRIMARY KEY "
+sql += ",                         `log_date_id` INTEGER "
+sql += ",                         `date` TEXT "
+sql += ",                         `loaded_at` TEXT "
+sql += ",                         `url_row_count` INTEGER "
+sql += ",                         `target_address_row_count` INTEGER "
+sql += ",                         `status_code_row_count` INTEGER "
+sql += ",                         `request_count` INTEGER "
+sql += ");"
+
+STATS_LOADED_DATE_CREATE_SQL = sql
+
+
+def build_loaded_date_sql(condition, source_column="source_log_date_id"):
+    # Statement that adds the source dates matching condition, a condition on `dte`.`id`, to the
+    # catalog of loaded dates. A date is loaded when stats have been loaded from its logs, the stats
+    # of other dates in those logs (around midnight) do not make those dates loaded. source_column
+    # is the column of the stats tables with the source date.
+    sql = """INSERT INTO `stats_loaded_date` (`log_date_id`, `date`, `loaded_at`, `url_row_count`, `target_address_row_count`, `status_code_row_count`, `request_count`)
+             SELECT   `dte`.`id`
+             ,        `dte`.`date`
+             ,        datetime('now')
+             ,        (SELECT COUNT(*) FROM `stats_url` WHERE `{1}` = `dte`.`id`)
+             ,        (SELECT COUNT(*) FROM `stats_target_address` WHERE `{1}` = `dte`.`id`)
+             ,        (SELECT COUNT(*) FROM `stats_status_code` WHERE `{1}` = `dte`.`id`)
+             ,        (SELECT SUM(`request_count`) FROM `stats_target_address` WHERE `{1}` = `dte`.`id`)
+             FROM     `log_date` `dte`
+             WHERE    EXISTS (SELECT 1 FROM `stats_target_address` WHERE `{1}` = `dte`.`id`)
+             AND      {0}
+          """.format(condition, source_column)
+
+    return sql
+
+
+# Schema migrations, applied in order when a database is opened. Each migration is a list of SQL
+# statements, the schema version of a database is the number of migrations applied to it. Only
+# add new migrations to the end of the list, never change one that has been released.
+MIGRATIONS = [
+    # 1: covering indexes on the stats tables, the report queries all select a single date
+    ["CREATE INDEX IF NOT EXISTS `ix_stats_url_date_url` ON `stats_url`(`log_date_id`, `log_url_id`, `log_reqtype_id`, `elb_status_code`, `request_count`, `sum_target_processing_time_sec`);",
+     "CREATE INDEX IF NOT EXISTS `ix_stats_target_address_date_hour` ON `stats_target_address`(`log_date_id`, `log_hour_id`, `log_target_address_id`, `request_count`, `sum_target_processing_time_sec`);",
+     "CREATE INDEX IF NOT EXISTS `ix_stats_status_code_date_status_code` ON `stats_status_code`(`log_date_id`, `target_status_code`, `elb_status_code`, `request_count`, `sum_target_processing_time_sec`);",
+     "ANALYZE;"],
+    # 2: daily rollup tables, filled for all dates that are already loaded
+    [STATS_URL_DAY_CREATE_SQL,
+     "CREATE UNIQUE INDEX IF NOT EXISTS `ux_stats_url_day_date_url` ON `stats_url_day`(`log_date_id`, `log_url_id`);",
+     STATS_REQTYPE_DAY_CREATE_SQL,
+     "CREATE UNIQUE INDEX IF NOT EXISTS `ux_stats_reqtype_day_date_reqtype` ON `stats_reqtype_day`(`log_date_id`, `log_reqtype_id`);",
+     STATS_STATUS_CODE_DAY_CREATE_SQL,
+     "CREATE UNIQUE INDEX IF NOT EXISTS `ux_stats_status_code_day_date_status_code` ON `stats_status_code_day`(`log_date_id`, `target_status_code`, `elb_status_code`);",
+     STATS_DAY_CREATE_SQL,
+     "CREATE UNIQUE INDEX IF NOT EXISTS `ux_stats_day_date` ON `stats_day`(`log_date_id`);"]
+    + build_rollup_sql("1 = 1"),
+    # 3: catalog of the loaded dates, filled for the dates that are already loaded. The stats rows
+    # loaded so far are their own source date, migration 4 adds the source_log_date_id column.
+    [STATS_LOADED_DATE_CREATE_SQL,
+     "CREATE UNIQUE INDEX IF NOT EXISTS `ux_stats_loaded_date_date` ON `stats_loaded_date`(`date`);",
+     build_loaded_date_sql("1 = 1", "log_date_id")],
+    # 4: date of the source logs of the stats rows, the partition key used by replace_date
+    ["ALTER TABLE `stats_url` ADD COLUMN `source_log_date_id` INTEGER;",
+     "UPDATE `stats_url` SET `source_log_date_id` = `log_date_id`;",
+     "CREATE INDEX IF NOT EXISTS `ix_stats_url_source_date` ON `stats_url`(`source_log_date_id`);",
+     "ALTER TABLE `stats_target_address` ADD COLUMN `source_log_date_id` INTEGER;",
+     "UPDATE `stats_target_address` SET `source_log_date_id` = `log_date_id`;",
+     "CREATE INDEX IF NOT EXISTS `ix_stats_target_address_source_date` ON `stats_target_address`(`source_log_date_id`);",
+     "ALTER TABLE `stats_status_code` ADD COLUMN `source_log_date_id` INTEGER;",
+     "UPDATE `stats_status_code` SET `source_log_date_id` = `log_date_id`;",
+     "CREATE INDEX IF NOT EXISTS `ix_stats_status_code_source_date` ON `stats_status_code`(`source_log_date_id`);"],
+]
+
+# Hourly stats tables, partitioned on source_log_date_id by replace_date
+STATS_TABLES = ["stats_url", "stats_target_address", "stats_status_code"]
+
+# Dimension tables (table name, value column) that are copied from a logs database by transfer_date
+# and from another stats database by merge_database
+TRANSFER_DIMENSION_TABLES = [("log_date", "date"),
+                             ("log_hour", "hour"),
+                             ("log_url", "url"),
+                             ("log_reqtype", "reqtype"),
+                             ("log_target_address", "target_address")]
+
+# Measure columns of the stats tables and how they are aggregated from the stats base table
+TRANSFER_MEASURE_SQL = """SUM(`bse`.`request_count`) `request_count`
+                           ,        SUM(`bse`.`sum_request_processing_time_sec`) `sum_request_processing_time_sec`
+                           ,        MIN(`bse`.`min_request_processing_time_sec`) `min_request_processing_time_sec`
+                           ,        MAX(`bse`.`max_request_processing_time_sec`) `max_request_processing_time_sec`
+                           ,        SUM(`bse`.`sum_target_processing_time_sec`) `sum_target_processing_time_sec`
+                           ,        MIN(`bse`.`min_target_processing_time_sec`) `min_target_processing_time_sec`
+                           ,        MAX(`bse`.`max_target_processing_time_sec`) `max_target_processing_time_sec`
+                           ,        SUM(`bse`.`sum_response_processing_time_sec`) `sum_response_processing_time_sec`
+                           ,        MIN(`bse`.`min_response_processing_time_sec`) `min_response_processing_time_sec`
+                           ,        MAX(`bse`.`max_response_processing_time_sec`) `max_response_processing_time_sec`
+                           ,        SUM(`bse`.`sum_received_bytes`) `sum_received_bytes`
+                           ,        MIN(`bse`.`min_received_bytes`) `min_received_bytes`
+                           ,        MAX(`bse`.`max_received_bytes`) `max_received_bytes`
+                           ,        SUM(`bse`.`sum_sent_bytes`) `sum_sent_bytes`
+                           ,        MIN(`bse`.`min_sent_bytes`) `min_sent_bytes`
+                           ,        MAX(`bse`.`max_sent_bytes`) `max_sent_bytes`"""
+
+TRANSFER_MEASURE_COLUMNS = ["request_count",
+                            "sum_request_processing_time_sec", "min_request_processing_time_sec", "max_request_processing_time_sec",
+                            "sum_target_processing_time_sec", "min_target_processing_time_sec", "max_target_processing_time_sec",
+                            "sum_response_processing_time_sec", "min_response_processing_time_sec", "max_response_processing_time_sec",
+                            "sum_received_bytes", "min_received_bytes", "max_received_bytes",
+                            "sum_sent_bytes", "min_sent_bytes", "max_sent_bytes"]
+
 sql = ""
 sql += "INSERT INTO `stats_url`  "
 sql += "(                         `log_date_id` "
@@ -27,7 +265,8 @@ sql += ",                         `max_received_bytes` "
 sql += ",                         `sum_sent_bytes` "
 sql += ",                         `min_sent_bytes` "
 sql += ",                         `max_sent_bytes` "
-sql += ") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);"
+sql += ",                         `source_log_date_id` "
+sql += ") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);"
 
 STATS_URL_INSERT_SQL = sql
 
@@ -53,7 +292,8 @@ sql += ",                         `max_received_bytes` "
 sql += ",                         `sum_sent_bytes` "
 sql += ",                         `min_sent_bytes` "
 sql += ",                         `max_sent_bytes` "
-sql += ") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);"
+sql += ",                         `source_log_date_id` "
+sql += ") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);"
 
 STATS_TARGET_ADDRESS_INSERT_SQL = sql
 
@@ -79,7 +319,8 @@ sql += ",                         `max_received_bytes` "
 sql += ",                         `sum_sent_bytes` "
 sql += ",                         `min_sent_bytes` "
 sql += ",                         `max_sent_bytes` "
-sql += ") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);"
+sql += ",                         `source_log_date_id` "
+sql += ") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);"
 
 STATS_STATUS_CODE_INSERT_SQL = sql
 
@@ -92,20 +333,31 @@ def get_log():
 
 
 class Database(object):
-    def __init__(self, filename, create=False):
+    def __init__(self, filename, create=False, cache_sizes=None):
         self._filename = filename
         self._create = create
         self._conn = None
         self._curs = None
+        self._cache_sizes = dict(DIMENSION_CACHE_SIZES)
+        if cache_sizes is not None:
+            self._cache_sizes.update(cache_sizes)
+        self._dimension_caches = {}
+        self._saved_dates = set()
+        self._saved_source_date_ids = set()
 
     def open(self):
         if os.path.exists(self._filename):
             get_log().info("Opening existing database {}".format(self._filename))
-            return self._open_db()
+            self._open_db()
+            self._migrate()
+            self._warm_dimension_caches()
+            return
 
         if self._create:
             get_log().info("Creating new database {}".format(self._filename))
-            return self._create_db()
+            self._create_db()
+            self._migrate()
+            return
 
         raise RuntimeError("Database at path '{}' does not exist and auto create is disabled".format(self._filename))
 
@@ -125,7 +377,12 @@ class Database(object):
 
         get_log().info("Committing transaction")
         self._get_conn().commit()
-        self._curs is None
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            self._curs = None
 
     def _open_db(self):
         self._conn = sqlite3.connect(self._filename)
@@ -322,6 +579,36 @@ class Database(object):
 
         self.commit()
 
+    def get_schema_version(self):
+        sql = ""
+        sql += "CREATE TABLE IF NOT EXISTS `schema_version` (`version` INTEGER PRIMARY KEY "
+        sql += ",                                            `applied_at` TEXT);"
+        self._get_cursor().execute(sql)
+
+        row = self._get_cursor().execute("SELECT MAX(`version`) FROM `schema_version`;").fetchone()
+        if row[0] is None:
+            return 0
+
+        return row[0]
+
+    def _migrate(self):
+        version = self.get_schema_version()
+        if version > len(MIGRATIONS):
+            raise RuntimeError("Database '{}' has schema version {}, this version only supports up to {}".format(self._filename, version, len(MIGRATIONS)))
+
+        for statements in MIGRATIONS[version:]:
+            version += 1
+            get_log().info("Migrating database {} to schema version {}".format(self._filename, version))
+
+            # explicit transaction, DDL statements do not start one implicitly
+            curs = self._get_cursor()
+            curs.execute("BEGIN")
+            for sql in statements:
+                get_log().debug("_migrate: query = {}".format(sql))
+                curs.execute(sql)
+            curs.execute("INSERT INTO `schema_version` (`version`, `applied_at`) VALUES (?, datetime('now'));", (version, ))
+            self.commit()
+
     def _add_dimension(self, tablename, columname, value):
         sql = ""
         sql += "INSERT INTO `{}` (`{}`) VALUES (?);".format(tablename, columname)
@@ -331,16 +618,62 @@ class Database(object):
 
         return id
 
+    def _get_dimension_cache(self, tablename):
+        cache = self._dimension_caches.get(tablename)
+        if cache is None:
+            cache = DimensionCache(self._cache_sizes.get(tablename))
+            self._dimension_caches[tablename] = cache
+
+        return cache
+
+    def _warm_dimension_caches(self):
+        for (tablename, columname) in DIMENSION_TABLES:
+            cache = self._get_dimension_cache(tablename)
+            sql = ""
+            sql += "SELECT `id`, `{}` FROM `{}` ".format(columname, tablename)
+            sql += "ORDER BY `id` "
+            if cache.get_max_size() is not None:
+                # keep the most recently added values when the dimension does not fit in the cache
+                sql += "DESC LIMIT {}".format(cache.get_max_size())
+
+            for row in self._get_cursor().execute(sql):
+                cache.put(row[1], row[0])
+
+            get_log().debug("Warmed dimension cache for {} with {} values".format(tablename, len(cache)))
+
+    def get_cache_stats(self):
+        result = {}
+        for tablename in sorted(self._dimension_caches.keys()):
+            result[tablename] = self._dimension_caches[tablename].get_stats()
+
+        return result
+
+    def log_cache_stats(self):
+        for tablename, stats in self.get_cache_stats().items():
+            get_log().info("Dimension cache {}: size = {}, hits = {}, misses = {}".format(tablename, stats["size"], stats["hits"], stats["misses"]))
+
     def _get_or_add_dimension(self, tablename, columname, value):
+        if tablename in INTEGER_DIMENSION_TABLES:
+            value = int(value)
+
+        cache = self._get_dimension_cache(tablename)
+        id = cache.get(value)
+        if id is not None:
+            return id
+
         sql = ""
         sql += "SELECT `id` FROM `{}` WHERE `{}` = ?".format(tablename, columname);
 
         res = self._get_cursor().execute(sql, (value, ))
         row = res.fetchone()
         if row:
-            return row[0]
+            id = row[0]
         else:
-            return self._add_dimension( tablename, columname, value)
+            id = self._add_dimension( tablename, columname, value)
+
+        cache.put(value, id)
+
+        return id
 
     def add_source(self, logname):
         sql = ""
@@ -390,86 +723,512 @@ class Database(object):
     def get_or_add_client_address(self, value):
         return self._get_or_add_dimension("log_client_address", "client_address", value)
 
-    def save_url_stats(self, record):
+    def save_url_stats(self, record, source_log_date_id=None):
+        self._get_cursor().execute(STATS_URL_INSERT_SQL, self._url_stats_values(record, source_log_date_id))
+
+    def save_target_address_stats(self, record, source_log_date_id=None):
+        self._get_cursor().execute(STATS_TARGET_ADDRESS_INSERT_SQL, self._target_address_stats_values(record, source_log_date_id))
+
+    def save_status_code_stats(self, record, source_log_date_id=None):
+        self._get_cursor().execute(STATS_STATUS_CODE_INSERT_SQL, self._status_code_stats_values(record, source_log_date_id))
+
+    def _url_stats_values(self, record, source_log_date_id):
+        # source_log_date_id is the date of the logs the stats were loaded from, by default the
+        # date of the stats themselves
+        self._saved_dates.add(record["date"])
         log_date_id = self.get_or_add_date(record["date"])
         log_hour_id = self.get_or_add_hour(record["hour"])
         log_url_id = self.get_or_add_url(record["url"])
         log_reqtype_id = self.get_or_add_reqtype(record["reqtype"])
 
-        self._get_cursor().execute(STATS_URL_INSERT_SQL, (log_date_id, log_hour_id, log_url_id, log_reqtype_id,
-                                   record["elb_status_code"],
-                                   record["request_count"],
-                                   record["sum_request_processing_time_sec"],
-                                   record["min_request_processing_time_sec"],
-                                   record["max_request_processing_time_sec"],
-                                   record["sum_target_processing_time_sec"],
-                                   record["min_target_processing_time_sec"],
-                                   record["max_target_processing_time_sec"],
-                                   record["sum_response_processing_time_sec"],
-                                   record["min_response_processing_time_sec"],
-                                   record["max_response_processing_time_sec"],
-                                   record["sum_received_bytes"],
-                                   record["min_received_bytes"],
-                                   record["max_received_bytes"],
-                                   record["sum_sent_bytes"],
-                                   record["min_sent_bytes"],
-                                   record["max_sent_bytes"]))
-
-    def save_target_address_stats(self, record):
+        if source_log_date_id is None:
+            source_log_date_id = log_date_id
+        self._saved_source_date_ids.add(source_log_date_id)
+
+        return (log_date_id, log_hour_id, log_url_id, log_reqtype_id,
+                record["elb_status_code"],
+                record["request_count"],
+                record["sum_request_processing_time_sec"],
+                record["min_request_processing_time_sec"],
+                record["max_request_processing_time_sec"],
+                record["sum_target_processing_time_sec"],
+                record["min_target_processing_time_sec"],
+                record["max_target_processing_time_sec"],
+                record["sum_response_processing_time_sec"],
+                record["min_response_processing_time_sec"],
+                record["max_response_processing_time_sec"],
+                record["sum_received_bytes"],
+                record["min_received_bytes"],
+                record["max_received_bytes"],
+                record["sum_sent_bytes"],
+                record["min_sent_bytes"],
+                record["max_sent_bytes"],
+                source_log_date_id)
+
+    def _target_address_stats_values(self, record, source_log_date_id):
+        self._saved_dates.add(record["date"])
         log_date_id = self.get_or_add_date(record["date"])
         log_hour_id = self.get_or_add_hour(record["hour"])
         log_target_address_id = self.get_or_add_target_address(record["target_address"])
 
-        self._get_cursor().execute(STATS_TARGET_ADDRESS_INSERT_SQL, (log_date_id, log_hour_id, log_target_address_id,
-                                   record["target_port"],
-                                   record["request_count"],
-                                   record["sum_request_processing_time_sec"],
-                                   record["min_request_processing_time_sec"],
-                                   record["max_request_processing_time_sec"],
-                                   record["sum_target_processing_time_sec"],
-                                   record["min_target_processing_time_sec"],
-                                   record["max_target_processing_time_sec"],
-                                   record["sum_response_processing_time_sec"],
-                                   record["min_response_processing_time_sec"],
-                                   record["max_response_processing_time_sec"],
-                                   record["sum_received_bytes"],
-                                   record["min_received_bytes"],
-                                   record["max_received_bytes"],
-                                   record["sum_sent_bytes"],
-                                   record["min_sent_bytes"],
-                                   record["max_sent_bytes"]))
-
-    def save_status_code_stats(self, record):
+        if source_log_date_id is None:
+            source_log_date_id = log_date_id
+        self._saved_source_date_ids.add(source_log_date_id)
+
+        return (log_date_id, log_hour_id, log_target_address_id,
+                record["target_port"],
+                record["request_count"],
+                record["sum_request_processing_time_sec"],
+                record["min_request_processing_time_sec"],
+                record["max_request_processing_time_sec"],
+                record["sum_target_processing_time_sec"],
+                record["min_target_processing_time_sec"],
+                record["max_target_processing_time_sec"],
+                record["sum_response_processing_time_sec"],
+                record["min_response_processing_time_sec"],
+                record["max_response_processing_time_sec"],
+                record["sum_received_bytes"],
+                record["min_received_bytes"],
+                record["max_received_bytes"],
+                record["sum_sent_bytes"],
+                record["min_sent_bytes"],
+                record["max_sent_bytes"],
+                source_log_date_id)
+
+    def _status_code_stats_values(self, record, source_log_date_id):
+        self._saved_dates.add(record["date"])
         log_date_id = self.get_or_add_date(record["date"])
         log_hour_id = self.get_or_add_hour(record["hour"])
 
-        self._get_cursor().execute(STATS_STATUS_CODE_INSERT_SQL, (log_date_id, log_hour_id,
-                                   record["target_status_code"],
-                                   record["elb_status_code"],
-                                   record["request_count"],
-                                   record["sum_request_processing_time_sec"],
-                                   record["min_request_processing_time_sec"],
-                                   record["max_request_processing_time_sec"],
-                                   record["sum_target_processing_time_sec"],
-                                   record["min_target_processing_time_sec"],
-                                   record["max_target_processing_time_sec"],
-                                   record["sum_response_processing_time_sec"],
-                                   record["min_response_processing_time_sec"],
-                                   record["max_response_processing_time_sec"],
-                                   record["sum_received_bytes"],
-                                   record["min_received_bytes"],
-                                   record["max_received_bytes"],
-                                   record["sum_sent_bytes"],
-                                   record["min_sent_bytes"],
-                                   record["max_sent_bytes"]))
+        if source_log_date_id is None:
+            source_log_date_id = log_date_id
+        self._saved_source_date_ids.add(source_log_date_id)
+
+        return (log_date_id, log_hour_id,
+                record["target_status_code"],
+                record["elb_status_code"],
+                record["request_count"],
+                record["sum_request_processing_time_sec"],
+                record["min_request_processing_time_sec"],
+                record["max_request_processing_time_sec"],
+                record["sum_target_processing_time_sec"],
+                record["min_target_processing_time_sec"],
+                record["max_target_processing_time_sec"],
+                record["sum_response_processing_time_sec"],
+                record["min_response_processing_time_sec"],
+                record["max_response_processing_time_sec"],
+                record["sum_received_bytes"],
+                record["min_received_bytes"],
+                record["max_received_bytes"],
+                record["sum_sent_bytes"],
+                record["min_sent_bytes"],
+                record["max_sent_bytes"],
+                source_log_date_id)
+
+    def _refresh_date(self, datestr):
+        get_log().info("Refreshing daily rollups for {}".format(datestr))
+
+        curs = self._get_cursor()
+        row = curs.execute("SELECT `id` FROM `log_date` WHERE `date` = ?;", (datestr, )).fetchone()
+        if row is None:
+            get_log().warning("No stats found for {}, rollups not refreshed".format(datestr))
+            return
+
+        log_date_id = row[0]
+        for tablename in ROLLUP_TABLES:
+            curs.execute("DELETE FROM `{}` WHERE `log_date_id` = ?;".format(tablename), (log_date_id, ))
+
+        for sql in build_rollup_sql("`log_date_id` = ?"):
+            curs.execute(sql, (log_date_id, ))
+
+    def _refresh_loaded_date(self, source_log_date_id):
+        # The catalog entry is removed when no stats are left for the source date
+        curs = self._get_cursor()
+        curs.execute("DELETE FROM `stats_loaded_date` WHERE `log_date_id` = ?;", (source_log_date_id, ))
+        curs.execute(build_loaded_date_sql("`dte`.`id` = ?"), (source_log_date_id, ))
+
+    def refresh_date(self, datestr):
+        # Rebuilds the daily rollups of a date and its loaded dates catalog entry from the hourly
+        # stats tables, call after the hourly stats of the date have been saved. Commits the
+        # transaction, so the stats, rollups and catalog of a date are committed together.
+        self._refresh_date(datestr)
+        self._refresh_loaded_date(self.get_or_add_date(datestr))
+        self.commit()
+
+    def refresh_saved_dates(self):
+        # Refreshes the daily rollups of all dates for which stats have been saved, and the catalog
+        # entries of the source dates they were loaded from
+        for datestr in sorted(self._saved_dates):
+            self._refresh_date(datestr)
+
+        for source_log_date_id in sorted(self._saved_source_date_ids):
+            self._refresh_loaded_date(source_log_date_id)
+
+        self._saved_dates.clear()
+        self._saved_source_date_ids.clear()
+        self.commit()
+
+    def replace_date(self, datestr, url_rows, target_address_rows, status_code_rows):
+        # Replaces all stats loaded from the logs of a date (the source date partition) by the given
+        # stats rows and refreshes the rollups of every affected date, all in a single transaction.
+        # Rows of other dates (logs around midnight) are part of the partition as well.
+        get_log().info("Replacing stats loaded from the logs of {}".format(datestr))
+
+        curs = self._get_cursor()
+        source_log_date_id = self.get_or_add_date(datestr)
+        self._delete_source_date(source_log_date_id)
+
+        # the values are built before executemany, building them can add dimension values
+        values = [self._url_stats_values(row, source_log_date_id) for row in url_rows]
+        curs.executemany(STATS_URL_INSERT_SQL, values)
+        get_log().info("Saved {} url stats".format(len(values)))
+
+        values = [self._target_address_stats_values(row, source_log_date_id) for row in target_address_rows]
+        curs.executemany(STATS_TARGET_ADDRESS_INSERT_SQL, values)
+        get_log().info("Saved {} target address stats".format(len(values)))
+
+        values = [self._status_code_stats_values(row, source_log_date_id) for row in status_code_rows]
+        curs.executemany(STATS_STATUS_CODE_INSERT_SQL, values)
+        get_log().info("Saved {} status code stats".format(len(values)))
+
+        self.refresh_saved_dates()
+
+    def _delete_source_date(self, source_log_date_id):
+        curs = self._get_cursor()
+        self._saved_source_date_ids.add(source_log_date_id)
+        for tablename in STATS_TABLES:
+            # the replaced stats may include dates that are not in the new stats, those are refreshed as well
+            sql = ""
+            sql += "SELECT DISTINCT `dte`.`date` "
+            sql += "FROM   `{}` `sts` ".format(tablename)
+            sql += ",      `log_date` `dte` "
+            sql += "WHERE  `dte`.`id` = `sts`.`log_date_id` "
+            sql += "AND    `sts`.`source_log_date_id` = ? "
+            for row in curs.execute(sql, (source_log_date_id, )).fetchall():
+                self._saved_dates.add(row[0])
+
+            curs.execute("DELETE FROM `{}` WHERE `source_log_date_id` = ?;".format(tablename), (source_log_date_id, ))
+
+    def transfer_date(self, datestr, logsdb_filename):
+        # Same result as replace_date with the stats queried from the logs database of the date, but
+        # the logs database is attached and the stats are copied with INSERT ... SELECT statements,
+        # so no rows pass through Python
+        if not os.path.exists(logsdb_filename):
+            raise RuntimeError("Database at path '{}' does not exist".format(logsdb_filename))
+
+        get_log().info("Transferring stats from logs database {}".format(logsdb_filename))
+
+        # ATTACH is not allowed inside a transaction
+        self.commit()
+        curs = self._get_cursor()
+        curs.execute("ATTACH DATABASE ? AS `logs`;", (logsdb_filename, ))
+
+        try:
+            source_log_date_id = self.get_or_add_date(datestr)
+            self._delete_source_date(source_log_date_id)
+
+            get_log().info("BEGIN: Creating stats base table")
+            curs.execute("DROP TABLE IF EXISTS temp.`stats_base`;")
+            curs.execute("CREATE TEMP TABLE `stats_base` AS " + logsdb.build_stats_base_sql("`logs`"))
+            get_log().info("END: Creating stats base table")
+
+            insert_columns = ", ".join("`{}`".format(column) for column in TRANSFER_MEASURE_COLUMNS)
+            select_columns = ", ".join("`agg`.`{}`".format(column) for column in TRANSFER_MEASURE_COLUMNS)
+
+            for (tablename, columname) in TRANSFER_DIMENSION_TABLES:
+                sql = "INSERT OR IGNORE INTO main.`{0}` (`{1}`) SELECT `{1}` FROM `logs`.`{0}`;".format(tablename, columname)
+                curs.execute(sql)
+
+            # The stats base is first aggregated on the ids of the logs database, which map one to one
+            # on the dimension values, so the dimension ids are only looked up for the aggregated rows
+            sql = """INSERT INTO `stats_url` (`log_date_id`, `log_hour_id`, `log_url_id`, `log_reqtype_id`, `elb_status_code`, {insert_columns}, `source_log_date_id`)
+                     SELECT   `sdte`.`id`
+                     ,        `shr`.`id`
+                     ,        `surl`.`id`
+                     ,        `srte`.`id`
+                     ,        `agg`.`elb_status_code`
+                     ,        {select_columns}
+                     ,        ?
+                     FROM     (SELECT   `bse`.`log_date_id` `log_date_id`
+                               ,        `bse`.`log_hour_id` `log_hour_id`
+                               ,        `bse`.`log_url_id` `log_url_id`
+                               ,        `bse`.`log_reqtype_id` `log_reqtype_id`
+                               ,        MAX(`bse`.`elb_status_code`) `elb_status_code`
+                               ,        {measures}
+                               FROM     temp.`stats_base` `bse`
+                               GROUP BY `bse`.`log_date_id`
+                               ,        `bse`.`log_hour_id`
+                               ,        `bse`.`log_url_id`
+                               ,        `bse`.`log_reqtype_id`
+                              ) `agg`
+                     JOIN     `logs`.`log_date` `ldte` ON `ldte`.`id` = `agg`.`log_date_id`
+                     JOIN     main.`log_date` `sdte` ON `sdte`.`date` = `ldte`.`date`
+                     JOIN     `logs`.`log_hour` `lhr` ON `lhr`.`id` = `agg`.`log_hour_id`
+                     JOIN     main.`log_hour` `shr` ON `shr`.`hour` = `lhr`.`hour`
+                     JOIN     `logs`.`log_url` `lurl` ON `lurl`.`id` = `agg`.`log_url_id`
+                     JOIN     main.`log_url` `surl` ON `surl`.`url` = `lurl`.`url`
+                     JOIN     `logs`.`log_reqtype` `lrte` ON `lrte`.`id` = `agg`.`log_reqtype_id`
+                     JOIN     main.`log_reqtype` `srte` ON `srte`.`reqtype` = `lrte`.`reqtype`
+                  """.format(insert_columns=insert_columns, select_columns=select_columns, measures=TRANSFER_MEASURE_SQL)
+
+            get_log().debug("transfer_date: query = {}".format(sql))
+            curs.execute(sql, (source_log_date_id, ))
+            get_log().info("Saved {} url stats".format(curs.rowcount))
+
+            sql = """INSERT INTO `stats_target_address` (`log_date_id`, `log_hour_id`, `log_target_address_id`, `target_port`, {insert_columns}, `source_log_date_id`)
+                     SELECT   `sdte`.`id`
+                     ,        `shr`.`id`
+                     ,        `stas`.`id`
+                     ,        `agg`.`target_port`
+                     ,        {select_columns}
+                     ,        ?
+                     FROM     (SELECT   `bse`.`log_date_id` `log_date_id`
+                               ,        `bse`.`log_hour_id` `log_hour_id`
+                               ,        `bse`.`log_target_address_id` `log_target_address_id`
+                               ,        `bse`.`target_port` `target_port`
+                               ,        {measures}
+                               FROM     temp.`stats_base` `bse`
+                               GROUP BY `bse`.`log_date_id`
+                               ,        `bse`.`log_hour_id`
+                               ,        `bse`.`log_target_address_id`
+                               ,        `bse`.`target_port`
+                              ) `agg`
+                     JOIN     `logs`.`log_date` `ldte` ON `ldte`.`id` = `agg`.`log_date_id`
+                     JOIN     main.`log_date` `sdte` ON `sdte`.`date` = `ldte`.`date`
+                     JOIN     `logs`.`log_hour` `lhr` ON `lhr`.`id` = `agg`.`log_hour_id`
+                     JOIN     main.`log_hour` `shr` ON `shr`.`hour` = `lhr`.`hour`
+                     JOIN     `logs`.`log_target_address` `ltas` ON `ltas`.`id` = `agg`.`log_target_address_id`
+                     JOIN     main.`log_target_address` `stas` ON `stas`.`target_address` = `ltas`.`target_address`
+                  """.format(insert_columns=insert_columns, select_columns=select_columns, measures=TRANSFER_MEASURE_SQL)
+
+            get_log().debug("transfer_date: query = {}".format(sql))
+            curs.execute(sql, (source_log_date_id, ))
+            get_log().info("Saved {} target address stats".format(curs.rowcount))
+
+            sql = """INSERT INTO `stats_status_code` (`log_date_id`, `log_hour_id`, `target_status_code`, `elb_status_code`, {insert_columns}, `source_log_date_id`)
+                     SELECT   `sdte`.`id`
+                     ,        `shr`.`id`
+                     ,        `agg`.`target_status_code`
+                     ,        `agg`.`elb_status_code`
+                     ,        {select_columns}
+                     ,        ?
+                     FROM     (SELECT   `bse`.`log_date_id` `log_date_id`
+                               ,        `bse`.`log_hour_id` `log_hour_id`
+                               ,        `bse`.`target_status_code` `target_status_code`
+                               ,        `bse`.`elb_status_code` `elb_status_code`
+                               ,        {measures}
+                               FROM     temp.`stats_base` `bse`
+                               GROUP BY `bse`.`log_date_id`
+                               ,        `bse`.`log_hour_id`
+                               ,        `bse`.`target_status_code`
+                               ,        `bse`.`elb_status_code`
+                              ) `agg`
+                     JOIN     `logs`.`log_date` `ldte` ON `ldte`.`id` = `agg`.`log_date_id`
+                     JOIN     main.`log_date` `sdte` ON `sdte`.`date` = `ldte`.`date`
+                     JOIN     `logs`.`log_hour` `lhr` ON `lhr`.`id` = `agg`.`log_hour_id`
+                     JOIN     main.`log_hour` `shr` ON `shr`.`hour` = `lhr`.`hour`
+                  """.format(insert_columns=insert_columns, select_columns=select_columns, measures=TRANSFER_MEASURE_SQL)
+
+            get_log().debug("transfer_date: query = {}".format(sql))
+            curs.execute(sql, (source_log_date_id, ))
+            get_log().info("Saved {} status code stats".format(curs.rowcount))
+
+            sql = ""
+            sql += "SELECT DISTINCT `ldte`.`date` "
+            sql += "FROM   temp.`stats_base` `bse` "
+            sql += ",      `logs`.`log_date` `ldte` "
+            sql += "WHERE  `ldte`.`id` = `bse`.`log_date_id` "
+            for row in curs.execute(sql).fetchall():
+                self._saved_dates.add(row[0])
+
+            curs.execute("DROP TABLE temp.`stats_base`;")
+
+            self.refresh_saved_dates()
+        except Exception:
+            self._get_conn().rollback()
+            # the caches may hold ids of dimension values that were rolled back
+            self._dimension_caches = {}
+            self._saved_dates.clear()
+            self._saved_source_date_ids.clear()
+            raise
+        finally:
+            curs.execute("DETACH DATABASE `logs`;")
+
+    def merge_database(self, filename, append=False):
+        # Merges the stats of another (partial) stats database into this one. The dimension ids of
+        # both databases are unrelated, so the stats are mapped on the dimension values. By default
+        # every source date partition of the other database replaces the same partition in this one,
+        # with append the stats are added to it instead (e.g. stats of other load balancers).
+        if not os.path.exists(filename):
+            raise RuntimeError("Database at path '{}' does not exist".format(filename))
+
+        get_log().info("Merging stats from database {}".format(filename))
+
+        # ATTACH is not allowed inside a transaction
+        self.commit()
+        curs = self._get_cursor()
+        curs.execute("ATTACH DATABASE ? AS `part`;", (filename, ))
+
+        try:
+            row = curs.execute("SELECT MAX(`version`) FROM `part`.`schema_version`;").fetchone()
+            if row[0] != len(MIGRATIONS):
+                raise RuntimeError("Database '{}' has schema version {}, expected {}".format(filename, row[0], len(MIGRATIONS)))
+
+            source_dates = set()
+            for tablename in STATS_TABLES:
+                sql = ""
+                sql += "SELECT DISTINCT `src`.`date` `source_date` "
+                sql += ",               `dte`.`date` `date` "
+                sql += "FROM   `part`.`{}` `sts` ".format(tablename)
+                sql += ",      `part`.`log_date` `src` "
+                sql += ",      `part`.`log_date` `dte` "
+                sql += "WHERE  `src`.`id` = `sts`.`source_log_date_id` "
+                sql += "AND    `dte`.`id` = `sts`.`log_date_id` "
+                for row in curs.execute(sql).fetchall():
+                    source_dates.add(row["source_date"])
+                    self._saved_dates.add(row["date"])
+
+            for datestr in sorted(source_dates):
+                source_log_date_id = self.get_or_add_date(datestr)
+                self._saved_source_date_ids.add(source_log_date_id)
+                if not append:
+                    self._delete_source_date(source_log_date_id)
+
+            for (tablename, columname) in TRANSFER_DIMENSION_TABLES:
+                sql = "INSERT OR IGNORE INTO main.`{0}` (`{1}`) SELECT `{1}` FROM `part`.`{0}`;".format(tablename, columname)
+                curs.execute(sql)
+
+            insert_columns = ", ".join("`{}`".format(column) for column in TRANSFER_MEASURE_COLUMNS)
+            select_columns = ", ".join("`sts`.`{}`".format(column) for column in TRANSFER_MEASURE_COLUMNS)
+
+            sql = """INSERT INTO `stats_url` (`log_date_id`, `log_hour_id`, `log_url_id`, `log_reqtype_id`, `elb_status_code`, {insert_columns}, `source_log_date_id`)
+                     SELECT   `sdte`.`id`
+                     ,        `shr`.`id`
+                     ,        `surl`.`id`
+                     ,        `srte`.`id`
+                     ,        `sts`.`elb_status_code`
+                     ,        {select_columns}
+                     ,        `ssrc`.`id`
+                     FROM     `part`.`stats_url` `sts`
+                     JOIN     `part`.`log_date` `pdte` ON `pdte`.`id` = `sts`.`log_date_id`
+                     JOIN     main.`log_date` `sdte` ON `sdte`.`date` = `pdte`.`date`
+                     JOIN     `part`.`log_hour` `phr` ON `phr`.`id` = `sts`.`log_hour_id`
+                     JOIN     main.`log_hour` `shr` ON `shr`.`hour` = `phr`.`hour`
+                     JOIN     `part`.`log_url` `purl` ON `purl`.`id` = `sts`.`log_url_id`
+                     JOIN     main.`log_url` `surl` ON `surl`.`url` = `purl`.`url`
+                     JOIN     `part`.`log_reqtype` `prte` ON `prte`.`id` = `sts`.`log_reqtype_id`
+                     JOIN     main.`log_reqtype` `srte` ON `srte`.`reqtype` = `prte`.`reqtype`
+                     JOIN     `part`.`log_date` `psrc` ON `psrc`.`id` = `sts`.`source_log_date_id`
+                     JOIN     main.`log_date` `ssrc` ON `ssrc`.`date` = `psrc`.`date`
+                  """.format(insert_columns=insert_columns, select_columns=select_columns)
+
+            get_log().debug("merge_database: query = {}".format(sql))
+            curs.execute(sql)
+            get_log().info("Merged {} url stats".format(curs.rowcount))
+
+            sql = """INSERT INTO `stats_target_address` (`log_date_id`, `log_hour_id`, `log_target_address_id`, `target_port`, {insert_columns}, `source_log_date_id`)
+                     SELECT   `sdte`.`id`
+                     ,        `shr`.`id`
+                     ,        `stas`.`id`
+                     ,        `sts`.`target_port`
+                     ,        {select_columns}
+                     ,        `ssrc`.`id`
+                     FROM     `part`.`stats_target_address` `sts`
+                     JOIN     `part`.`log_date` `pdte` ON `pdte`.`id` = `sts`.`log_date_id`
+                     JOIN     main.`log_date` `sdte` ON `sdte`.`date` = `pdte`.`date`
+                     JOIN     `part`.`log_hour` `phr` ON `phr`.`id` = `sts`.`log_hour_id`
+                     JOIN     main.`log_hour` `shr` ON `shr`.`hour` = `phr`.`hour`
+                     JOIN     `part`.`log_target_address` `ptas` ON `ptas`.`id` = `sts`.`log_target_address_id`
+                     JOIN     main.`log_target_address` `stas` ON `stas`.`target_address` = `ptas`.`target_address`
+                     JOIN     `part`.`log_date` `psrc` ON `psrc`.`id` = `sts`.`source_log_date_id`
+                     JOIN     main.`log_date` `ssrc` ON `ssrc`.`date` = `psrc`.`date`
+                  """.format(insert_columns=insert_columns, select_columns=select_columns)
+
+            get_log().debug("merge_database: query = {}".format(sql))
+            curs.execute(sql)
+            get_log().info("Merged {} target address stats".format(curs.rowcount))
+
+            sql = """INSERT INTO `stats_status_code` (`log_date_id`, `log_hour_id`, `target_status_code`, `elb_status_code`, {insert_columns}, `source_log_date_id`)
+                     SELECT   `sdte`.`id`
+                     ,        `shr`.`id`
+                     ,        `sts`.`target_status_code`
+                     ,        `sts`.`elb_status_code`
+                     ,        {select_columns}
+                     ,        `ssrc`.`id`
+                     FROM     `part`.`stats_status_code` `sts`
+                     JOIN     `part`.`log_date` `pdte` ON `pdte`.`id` = `sts`.`log_date_id`
+                     JOIN     main.`log_date` `sdte` ON `sdte`.`date` = `pdte`.`date`
+                     JOIN     `part`.`log_hour` `phr` ON `phr`.`id` = `sts`.`log_hour_id`
+                     JOIN     main.`log_hour` `shr` ON `shr`.`hour` = `phr`.`hour`
+                     JOIN     `part`.`log_date` `psrc` ON `psrc`.`id` = `sts`.`source_log_date_id`
+                     JOIN     main.`log_date` `ssrc` ON `ssrc`.`date` = `psrc`.`date`
+                  """.format(insert_columns=insert_columns, select_columns=select_columns)
+
+            get_log().debug("merge_database: query = {}".format(sql))
+            curs.execute(sql)
+            get_log().info("Merged {} status code stats".format(curs.rowcount))
+
+            self.refresh_saved_dates()
+        except Exception:
+            self._get_conn().rollback()
+            # the caches may hold ids of dimension values that were rolled back
+            self._dimension_caches = {}
+            self._saved_dates.clear()
+            self._saved_source_date_ids.clear()
+            raise
+        finally:
+            curs.execute("DETACH DATABASE `part`;")
+
+    def is_date_loaded(self, datestr):
+        # True when stats have been loaded from the logs of the date, the partition replace_date and
+        # transfer_date replace. Stats of the date in the logs of the next date do not count.
+        sql = "SELECT 1 FROM `stats_loaded_date` WHERE `date` = ?;"
+        row = self._get_cursor().execute(sql, (datestr, )).fetchone()
+
+        return row is not None
+
+    def query_loaded_date(self, datestr):
+        # Catalog entry of a loaded date (loaded_at and row counts), None when it is not loaded
+        sql = """select `lde`.`date` `date`
+                 ,      `lde`.`loaded_at` `loaded_at`
+                 ,      `lde`.`url_row_count` `url_row_count`
+                 ,      `lde`.`target_address_row_count` `target_address_row_count`
+                 ,      `lde`.`status_code_row_count` `status_code_row_count`
+                 ,      `lde`.`request_count` `request_count`
+                 from   `stats_loaded_date` `lde`
+                 where  `lde`.`date` = ?
+              """
+
+        return self._get_cursor().execute(sql, (datestr, )).fetchone()
+
+    def query_missing_dates(self, from_date, to_date):
+        # Dates in a date range (inclusive) that have not been loaded
+        sql = """with recursive `enum_date`(`date`) as (
+                     select ?
+                     union all
+                     select date(`date`, '+1 day') from `enum_date` where `date` < ?
+                 )
+                 select `enm`.`date` `date`
+                 from   `enum_date` `enm`
+                 where  not exists (select 1 from `stats_loaded_date` `lde` where `lde`.`date` = `enm`.`date`)
+                 order by `enm`.`date`
+              """
+
+        get_log().debug("query_missing_dates: query = {}".format(sql))
+
+        get_log().info("BEGIN: Executing query_missing_dates")
+        result = self._get_cursor().execute(sql, (from_date, to_date))
+        get_log().info("END: Executing query_missing_dates")
+
+        return [row["date"] for row in result]
 
     def query_day_totals(self, datestr):
         sql = ""
-        sql += "SELECT SUM(`tas`.`request_count`) `request_count` "
-        sql += ",      SUM(`tas`.`sum_target_processing_time_sec`) `target_processing_time_sec` "
-        sql += "FROM   `stats_target_address` `tas` "
+        sql += "SELECT SUM(`sdy`.`request_count`) `request_count` "
+        sql += ",      SUM(`sdy`.`sum_target_processing_time_sec`) `target_processing_time_sec` "
+        sql += "FROM   `stats_day` `sdy` "
         sql += ",      `log_date` `dte` "
-        sql += "WHERE  `dte`.`id` = `tas`.`log_date_id` "
+        sql += "WHERE  `dte`.`id` = `sdy`.`log_date_id` "
         sql += "AND    `dte`.`date` = ? "
 
         get_log().debug("query_day_totals: query = {}".format(sql))
@@ -480,6 +1239,32 @@ class Database(object):
 
         return result
 
+    def query_day_totals_for_dates(self, from_date, to_date, exclude_dates=None):
+        # Day totals for all dates in a date range (inclusive) except the excluded dates, one row per
+        # date for which there is data
+        if exclude_dates is None:
+            exclude_dates = []
+
+        sql = ""
+        sql += "SELECT   `dte`.`date` `date` "
+        sql += ",        SUM(`sdy`.`request_count`) `request_count` "
+        sql += ",        SUM(`sdy`.`sum_target_processing_time_sec`) `target_processing_time_sec` "
+        sql += "FROM     `stats_day` `sdy` "
+        sql += ",        `log_date` `dte` "
+        sql += "WHERE    `dte`.`id` = `sdy`.`log_date_id` "
+        sql += "AND      `dte`.`date` BETWEEN ? AND ? "
+        sql += "AND      `dte`.`date` NOT IN ({}) ".format(", ".join("?" * len(exclude_dates)))
+        sql += "GROUP BY `dte`.`date` "
+        sql += "ORDER BY `dte`.`date` "
+
+        get_log().debug("query_day_totals_for_dates: query = {}".format(sql))
+
+        get_log().info("BEGIN: Executing query_day_totals_for_dates")
+        result = self._get_cursor().execute(sql, [from_date, to_date] + list(exclude_dates))
+        get_log().info("END: Executing query_day_totals_for_dates")
+
+        return result
+
     def query_target_address_stats(self, datestr):
         sql = ""
         sql += "SELECT   `hr`.`hour` `hour` "
@@ -510,7 +1295,7 @@ class Database(object):
         sql = """select   `url`.`url` `url`
                  ,        sum(`sts`.`request_count`) `sum_request_count`
                  ,        sum(`sts`.`sum_target_processing_time_sec`) `sum_target_processing_time`
-                 from     `stats_url` `sts`
+                 from     `stats_url_day` `sts`
                  ,        `log_date` `dte`
                  ,        `log_url` `url`
                  where    `dte`.`id` = `sts`.`log_date_id`
@@ -533,7 +1318,7 @@ class Database(object):
         sql = """select  `url`.`url` `url`
                  ,        sum(`sts`.`request_count`) `sum_request_count`
                  ,        sum(`sts`.`sum_target_processing_time_sec`) `sum_target_processing_time`
-                 from     `stats_url` `sts`
+                 from     `stats_url_day` `sts`
                  ,        `log_date` `dte`
                  ,        `log_url` `url`
                  where    `dte`.`id` = `sts`.`log_date_id`
@@ -554,15 +1339,15 @@ class Database(object):
 
     def query_top_x_url_by_time_excl_5xx(self, datestr, limit=10):
         sql = """select  `url`.`url` `url`
-                 ,        sum(`sts`.`request_count`) `sum_request_count`
-                 ,        sum(`sts`.`sum_target_processing_time_sec`) `sum_target_processing_time`
-                 from     `stats_url` `sts`
+                 ,        sum(`sts`.`request_count_excl_5xx`) `sum_request_count`
+                 ,        sum(`sts`.`sum_target_processing_time_sec_excl_5xx`) `sum_target_processing_time`
+                 from     `stats_url_day` `sts`
                  ,        `log_date` `dte`
                  ,        `log_url` `url`
                  where    `dte`.`id` = `sts`.`log_date_id`
                  and      `url`.`id` = `sts`.`log_url_id`
                  and      `dte`.`date` = ?
-                 and       `sts`.`elb_status_code` < 500
+                 and      `sts`.`request_count_excl_5xx` > 0
                  group by `url`
                  order by `sum_target_processing_time` desc
                  limit    ?
@@ -576,12 +1361,53 @@ class Database(object):
 
         return result
 
+    def query_top_x_url_by_time_for_dates(self, from_date, to_date, limit=10, excl_5xx=False):
+        # Top x urls by total processing time for every date in a date range (inclusive), ranked
+        # per date. The rank of a url within its date is returned as pos, starting at 1.
+        if excl_5xx:
+            count_column = "request_count_excl_5xx"
+            time_column = "sum_target_processing_time_sec_excl_5xx"
+        else:
+            count_column = "request_count"
+            time_column = "sum_target_processing_time_sec"
+
+        sql = """select   `rnk`.`date` `date`
+                 ,        `rnk`.`pos` `pos`
+                 ,        `rnk`.`url` `url`
+                 ,        `rnk`.`sum_request_count` `sum_request_count`
+                 ,        `rnk`.`sum_target_processing_time` `sum_target_processing_time`
+                 from     (select   `dte`.`date` `date`
+                           ,        `url`.`url` `url`
+                           ,        `sts`.`{count_column}` `sum_request_count`
+                           ,        `sts`.`{time_column}` `sum_target_processing_time`
+                           ,        row_number() over (partition by `dte`.`date` order by `sts`.`{time_column}` desc) `pos`
+                           from     `stats_url_day` `sts`
+                           ,        `log_date` `dte`
+                           ,        `log_url` `url`
+                           where    `dte`.`id` = `sts`.`log_date_id`
+                           and      `url`.`id` = `sts`.`log_url_id`
+                           and      `dte`.`date` between ? and ?
+                           and      `sts`.`{count_column}` > 0
+                          ) `rnk`
+                 where    `rnk`.`pos` <= ?
+                 order by `rnk`.`date`
+                 ,        `rnk`.`pos`
+              """.format(count_column=count_column, time_column=time_column)
+
+        get_log().debug("query_top_x_url_by_time_for_dates: query = {}".format(sql))
+
+        get_log().info("BEGIN: Executing query_top_x_url_by_time_for_dates")
+        result = self._get_cursor().execute(sql, (from_date, to_date, limit))
+        get_log().info("END: Executing query_top_x_url_by_time_for_dates")
+
+        return result
+
     def query_top_100_average_processing_time(self, datestr):
         sql = """select   `url`.`url` `url`
                  ,        sum(`sts`.`sum_target_processing_time_sec`) /  sum(`sts`.`request_count`) `avg_target_processing_time`
                  ,        sum(`sts`.`request_count`) `sum_request_count`
                  ,        sum(`sts`.`sum_target_processing_time_sec`) `sum_target_processing_time`
-                 from     `stats_url` `sts`
+                 from     `stats_url_day` `sts`
                  ,        `log_date` `dte`
                  ,        `log_url` `url`
                  where    `dte`.`id` = `sts`.`log_date_id`
@@ -606,7 +1432,7 @@ class Database(object):
                  ,        sum(`sts`.`request_count`) `sum_request_count`
                  ,        sum(`sts`.`sum_target_processing_time_sec`) `sum_target_processing_time`
                  ,        sum(`sts`.`sum_target_processing_time_sec`) / sum(`sts`.`request_count`) `avg_target_processing_time`
-                 from     `stats_status_code` `sts`
+                 from     `stats_status_code_day` `sts`
                  ,        `log_date` `dte`
                  where    `dte`.`id` = `sts`.`log_date_id`
                  and      `dte`.`date` = ?
@@ -629,7 +1455,7 @@ class Database(object):
                  ,        sum(`sts`.`request_count`) `sum_request_count`
                  ,        sum(`sts`.`sum_target_processing_time_sec`) `sum_target_processing_time`
                  ,        sum(`sts`.`sum_target_processing_time_sec`) / sum(`sts`.`request_count`) `avg_target_processing_time`
-                 from     `stats_url` `sts`
+                 from     `stats_reqtype_day` `sts`
                  ,        `log_date` `dte`
                  ,        `log_reqtype` `rte`
                  where    `dte`.`id` = `sts`.`log_date_id`
@@ -647,13 +1473,42 @@ class Database(object):
 
         return result
 
+    def query_request_type_for_dates(self, from_date, to_date, exclude_dates=None):
+        # Request type stats for all dates in a date range (inclusive) except the excluded dates,
+        # one row per date and request type
+        if exclude_dates is None:
+            exclude_dates = []
+
+        sql = """select   `dte`.`date` `date`
+                 ,        `rte`.`reqtype` `request_type`
+                 ,        sum(`sts`.`request_count`) `sum_request_count`
+                 ,        sum(`sts`.`sum_target_processing_time_sec`) `sum_target_processing_time`
+                 ,        sum(`sts`.`sum_target_processing_time_sec`) / sum(`sts`.`request_count`) `avg_target_processing_time`
+                 from     `stats_reqtype_day` `sts`
+                 ,        `log_date` `dte`
+                 ,        `log_reqtype` `rte`
+                 where    `dte`.`id` = `sts`.`log_date_id`
+                 and      `rte`.`id` = `sts`.`log_reqtype_id`
+                 and      `dte`.`date` between ? and ?
+                 and      `dte`.`date` not in ({})
+                 group by `dte`.`date`
+                 ,        `rte`.`reqtype`
+                 order by `dte`.`date`
+                 ,        `rte`.`reqtype`
+              """.format(", ".join("?" * len(exclude_dates)))
+
+        get_log().debug("query_request_type_for_dates: query = {}".format(sql))
+
+        get_log().info("BEGIN: Executing query_request_type_for_dates")
+        result = self._get_cursor().execute(sql, [from_date, to_date] + list(exclude_dates))
+        get_log().info("END: Executing query_request_type_for_dates")
+
+        return result
+
     def query_max_date(self):
-        # Joins stats_status_code on log_date and finds max date for which there is data
-        # stats_status_code is chosen because it is the smallest table
-        sql = """select max(`dte`.`date`) as `max_date`
-                 from   `stats_status_code` `sts`
-                 ,      `log_date` `dte`
-                 where   `dte`.`id` = `sts`.`log_date_id` 
+        # Highest loaded date, an index lookup on the loaded dates catalog
+        sql = """select max(`lde`.`date`) as `max_date`
+                 from   `stats_loaded_date` `lde`
               """
 
         get_log().debug("query_max_date: query = {}".format(sql))
@@ -665,19 +1520,16 @@ class Database(object):
         return row["max_date"]
 
     def query_min_date(self):
-        # Joins stats_status_code on log_date and finds max date for which there is data
-        # stats_status_code is chosen because it is the smallest table
-        sql = """select min(`dte`.`date`) as `min_date`
-                 from   `stats_status_code` `sts`
-                 ,      `log_date` `dte`
-                 where   `dte`.`id` = `sts`.`log_date_id` 
+        # Lowest loaded date, an index lookup on the loaded dates catalog
+        sql = """select min(`lde`.`date`) as `min_date`
+                 from   `stats_loaded_date` `lde`
               """
 
-        get_log().debug("query_max_date: query = {}".format(sql))
+        get_log().debug("query_min_date: query = {}".format(sql))
 
-        get_log().info("BEGIN: Executing query_max_date")
+        get_log().info("BEGIN: Executing query_min_date")
         result = self._get_cursor().execute(sql)
-        get_log().info("END: Executing query_max_date")
+        get_log().info("END: Executing query_min_date")
         row = result.fetchone()
         return row["min_date"]
 
@@ -685,7 +1537,7 @@ class Database(object):
         sql = """select  `url`.`url` `url`
                  ,        sum(`sts`.`request_count`) `sum_request_count`
                  ,        sum(`sts`.`sum_target_processing_time_sec`) `sum_target_processing_time`
-                 from     `stats_url` `sts`
+                 from     `stats_url_day` `sts`
                  ,        `log_date` `dte`
                  ,        `log_url` `url`
                  where    `dte`.`id` = `sts`.`log_date_id`
@@ -705,16 +1557,16 @@ class Database(object):
 
     def query_url_stats_for_url_and_date_excl_5xx(self, url, datestr):
         sql = """select  `url`.`url` `url`
-                 ,        sum(`sts`.`request_count`) `sum_request_count`
-                 ,        sum(`sts`.`sum_target_processing_time_sec`) `sum_target_processing_time`
-                 from     `stats_url` `sts`
+                 ,        sum(`sts`.`request_count_excl_5xx`) `sum_request_count`
+                 ,        sum(`sts`.`sum_target_processing_time_sec_excl_5xx`) `sum_target_processing_time`
+                 from     `stats_url_day` `sts`
                  ,        `log_date` `dte`
                  ,        `log_url` `url`
                  where    `dte`.`id` = `sts`.`log_date_id`
                  and      `url`.`id` = `sts`.`log_url_id`
                  and      `dte`.`date` = ?
                  and      `url`.`url` = ?
-                 and      `sts`.`elb_status_code` < 500
+                 and      `sts`.`request_count_excl_5xx` > 0
                  group by `url`
               """
 
@@ -726,6 +1578,40 @@ class Database(object):
 
         return result
 
+    def query_url_stats_for_urls_and_dates(self, urls, from_date, to_date, excl_5xx=False):
+        # Daily stats of a set of urls over a date range (inclusive) in a single query, one row per
+        # url and date for which there is data
+        if excl_5xx:
+            count_column = "request_count_excl_5xx"
+            time_column = "sum_target_processing_time_sec_excl_5xx"
+        else:
+            count_column = "request_count"
+            time_column = "sum_target_processing_time_sec"
+
+        sql = """select   `url`.`url` `url`
+                 ,        `dte`.`date` `date`
+                 ,        `sts`.`{count_column}` `sum_request_count`
+                 ,        `sts`.`{time_column}` `sum_target_processing_time`
+                 from     `stats_url_day` `sts`
+                 ,        `log_date` `dte`
+                 ,        `log_url` `url`
+                 where    `dte`.`id` = `sts`.`log_date_id`
+                 and      `url`.`id` = `sts`.`log_url_id`
+                 and      `dte`.`date` between ? and ?
+                 and      `url`.`url` in ({url_params})
+                 and      `sts`.`{count_column}` > 0
+                 order by `url`.`url`
+                 ,        `dte`.`date`
+              """.format(count_column=count_column, time_column=time_column, url_params=", ".join("?" * len(urls)))
+
+        get_log().debug("query_url_stats_for_urls_and_dates: query = {}".format(sql))
+
+        get_log().info("BEGIN: Executing query_url_stats_for_urls_and_dates")
+        result = self._get_cursor().execute(sql, [from_date, to_date] + list(urls))
+        get_log().info("END: Executing query_url_stats_for_urls_and_dates")
+
+        return result
+
     def query_request_types(self):
         sql = """select   `rte`.`reqtype` `request_type`
                  from     `log_reqtype` `rte`
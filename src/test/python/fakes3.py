@@ -0,0 +1,93 @@
+import io
+import hashlib
+
+
+class FakePaginator(object):
+    def __init__(self, s3, page_size):
+        self._s3 = s3
+        self._page_size = page_size
+
+    def paginate(self, Bucket, Prefix):
+        keys = sorted(key for key in self._s3.get_objects(Bucket) if key.startswith(Prefix))
+        for start in range(0, max(1, len(keys)), self._page_size):
+            page = {}
+            items = [self._s3.get_item(Bucket, key) for key in keys[start:start + self._page_size]]
+            if len(items) > 0:
+                page["Contents"] = items
+            yield page
+
+
+class FailingBody(object):
+    # Body that returns the first part of the data and then fails, like a dropped connection
+    def __init__(self, data, key):
+        self._data = io.BytesIO(data)
+        self._limit = len(data) // 2
+        self._key = key
+
+    def read(self, size=-1):
+        remaining = self._limit - self._data.tell()
+        if remaining <= 0:
+            raise IOError("Connection reset while reading {}".format(self._key))
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        return self._data.read(size)
+
+
+class FakeS3Client(object):
+    # Stand-in for the boto3 S3 client with the methods used by alblogs.download, objects are kept
+    # in memory. Failures can be injected per key, downloads of a failing key write part of the
+    # object before raising, like an interrupted transfer. With midway the body of get_object fails
+    # halfway instead of the request itself.
+    def __init__(self, page_size=1000):
+        self._buckets = {}
+        self._failures = {}
+        self._page_size = page_size
+        self.requested_keys = []
+        self.requested_ranges = []
+
+    def put_object(self, bucket_name, key, data):
+        self._buckets.setdefault(bucket_name, {})[key] = data
+
+    def fail(self, key, count=1, midway=False):
+        self._failures[key] = (count, midway)
+
+    def get_objects(self, bucket_name):
+        return self._buckets.get(bucket_name, {})
+
+    def get_item(self, bucket_name, key):
+        data = self._buckets[bucket_name][key]
+        return {"Key": key, "Size": len(data), "ETag": '"{}"'.format(hashlib.md5(data).hexdigest())}
+
+    def _request(self, bucket_name, key):
+        self.requested_keys.append(key)
+        data = self._buckets[bucket_name][key]
+        count, midway = self._failures.get(key, (0, False))
+        if count > 0:
+            self._failures[key] = (count - 1, midway)
+            return data, "midway" if midway else "request"
+        return data, None
+
+    def get_paginator(self, name):
+        if name != "list_objects_v2":
+            raise RuntimeError("Paginator {} is not supported".format(name))
+        return FakePaginator(self, self._page_size)
+
+    def get_object(self, Bucket, Key, Range=None):
+        data, failing = self._request(Bucket, Key)
+        if Range is not None:
+            # only the open ended form "bytes=<start>-" is used
+            self.requested_ranges.append((Key, Range))
+            data = data[int(Range[len("bytes="):-1]):]
+        if failing == "request":
+            raise IOError("Connection reset while fetching {}".format(Key))
+        if failing == "midway":
+            return {"Body": FailingBody(data, Key)}
+        return {"Body": io.BytesIO(data)}
+
+    def download_file(self, bucket_name, key, filename):
+        data, failing = self._request(bucket_name, key)
+        with open(filename, "wb") as fhandle:
+            if failing:
+                fhandle.write(data[:len(data) // 2])
+                raise IOError("Connection reset while downloading {}".format(key))
+            fhandle.write(data)
@@ -0,0 +1,160 @@
+import os
+import sys
+import random
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "main", "python", "lib"))
+
+import alblogs
+
+from alblogs import archive, config, jobs, logsdb, logparser
+
+FIXTURE_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "2018-07-25.log")
+
+
+def make_data(size):
+    # partly compressible data, like a database file
+    rnd = random.Random(0)
+    return b"".join(rnd.choice([b"log_entry ", b"10.1.0.3:80 ", rnd.getrandbits(64).to_bytes(8, "big")]) for index in range(size // 8))[:size]
+
+
+def create_logsdb(filename):
+    db = logsdb.Database(filename, create=True)
+    db.open()
+    log_source_id = db.add_source(os.path.basename(FIXTURE_LOG))
+    with logparser.open_logfile(FIXTURE_LOG) as fhandle:
+        for record in logparser.parse_lines(fhandle):
+            db.save_record(log_source_id, record)
+    db.commit()
+    db.close()
+
+
+class DictConfiguration(config.Configuration):
+    # Configuration with its data from a dict instead of the application.config file
+    def __init__(self, data):
+        self._test_data = data
+        super(DictConfiguration, self).__init__(None)
+
+    def _init(self):
+        self._data = self._test_data
+
+
+class CompressTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self._dir, "2018-07-25-alblogs.db")
+        self.data = make_data(300 * 1024)
+        with open(self.filename, "wb") as fhandle:
+            fhandle.write(self.data)
+
+        # small blocks, so the file is compressed as several blocks by the workers
+        self._buffer_size = jobs.BUFFER_SIZE
+        jobs.BUFFER_SIZE = 64 * 1024
+
+    def tearDown(self):
+        jobs.BUFFER_SIZE = self._buffer_size
+        shutil.rmtree(self._dir)
+
+    def compress(self, archive_format, pool=None, workers=1):
+        target_zip = archive.get_archive_filename(self.filename, archive_format)
+        with open(self.filename, "rb") as infile:
+            if pool is None:
+                processed = jobs.compress_serial(infile, target_zip, archive_format)
+            else:
+                processed = jobs.compress_parallel(infile, target_zip, archive_format, pool, workers)
+
+        self.assertEqual(processed, len(self.data))
+        return target_zip
+
+    def get_formats(self):
+        return [archive_format for archive_format in sorted(archive.FORMAT_EXTENSIONS.keys()) if archive.is_format_available(archive_format)]
+
+    def test_parallel_round_trip(self):
+        with multiprocessing.Pool(processes=2) as pool:
+            for archive_format in self.get_formats():
+                target_zip = self.compress(archive_format, pool, 2)
+
+                self.assertEqual(archive.read_archive(target_zip, len(self.data)), self.data, archive_format)
+                os.remove(target_zip)
+
+    def test_parallel_and_serial_archives_read_the_same(self):
+        with multiprocessing.Pool(processes=2) as pool:
+            parallel_zip = self.compress("gz", pool, 2)
+        os.replace(parallel_zip, parallel_zip + ".parallel")
+        serial_zip = self.compress("gz")
+
+        self.assertEqual(archive.read_archive(parallel_zip + ".parallel", len(self.data)), archive.read_archive(serial_zip, len(self.data)))
+
+    def test_read_archive_over_limit(self):
+        target_zip = self.compress("gz")
+
+        self.assertIsNone(archive.read_archive(target_zip, len(self.data) - 1))
+
+
+class OpenArchivedLogsdbTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._configuration = alblogs.CONFIGURATION
+        alblogs.CONFIGURATION = DictConfiguration({"directories": {"data": os.path.join(self._dir, "data"),
+                                                                   "temp": os.path.join(self._dir, "temp"),
+                                                                   "archive": os.path.join(self._dir, "archive")}})
+        for name in ("data", "temp", "archive"):
+            os.makedirs(os.path.join(self._dir, name))
+
+        self.filename = os.path.join(self._dir, "data", "2018-07-25-alblogs.db")
+        create_logsdb(self.filename)
+        self.entry_count = self.count_entries(self.filename)
+
+        with multiprocessing.Pool(processes=2) as pool:
+            jobs.archive_file(os.path.basename(self.filename), self.filename, os.path.getsize(self.filename),
+                              alblogs.CONFIGURATION.get_archive_dir(), "gz", pool, 2,
+                              compact_dir=alblogs.CONFIGURATION.get_temp_dir(), drop_indexes=True)
+
+    def tearDown(self):
+        alblogs.CONFIGURATION = self._configuration
+        shutil.rmtree(self._dir)
+
+    def count_entries(self, filename):
+        db = logsdb.Database(filename)
+        db.open()
+        try:
+            return db._get_cursor().execute("SELECT COUNT(*) FROM `log_entry`;").fetchone()[0]
+        finally:
+            db.close()
+
+    def check_database(self, db):
+        curs = db._get_cursor()
+        self.assertEqual(curs.execute("SELECT COUNT(*) FROM `log_entry`;").fetchone()[0], self.entry_count)
+        index_names = set(row[0] for row in curs.execute("SELECT `name` FROM `sqlite_master` WHERE `type` = 'index';"))
+        self.assertTrue(set(name for name, sql in logsdb.SECONDARY_INDEXES) <= index_names)
+
+    def test_open_from_archive_cache(self):
+        self.assertFalse(os.path.exists(self.filename))
+
+        db = alblogs.open_logsdb(self.filename)
+        try:
+            self.check_database(db)
+        finally:
+            db.close()
+
+        cached_filename = os.path.join(alblogs.CONFIGURATION.archive.get_cache_dir(), os.path.basename(self.filename))
+        self.assertTrue(os.path.exists(cached_filename))
+        self.assertEqual(alblogs.get_logsdb_path(self.filename), cached_filename)
+
+    def test_open_from_archive_in_memory(self):
+        db = alblogs.open_logsdb(self.filename, in_memory=True)
+        try:
+            self.check_database(db)
+        finally:
+            db.close()
+
+        self.assertFalse(os.path.exists(alblogs.CONFIGURATION.archive.get_cache_dir()))
+
+
+if __name__ == "__main__":
+    unittest.main()
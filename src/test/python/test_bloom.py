@@ -0,0 +1,95 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "main", "python", "lib"))
+
+from alblogs import archive, bloom, jobs, logsdb, logparser
+
+FIXTURE_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "2018-07-25.log")
+
+
+def make_trace_id(index):
+    return "Root=1-5b57ad5e-{:024x}".format(index * 7919)
+
+
+class BloomFilterTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def test_no_false_negatives(self):
+        values = [make_trace_id(index) for index in range(5000)]
+        bloom_filter = bloom.build_filter(values + [None], len(values))
+        filename = os.path.join(self._dir, "trace.bloom")
+        bloom_filter.save(filename)
+        loaded = bloom.BloomFilter.load(filename)
+
+        self.assertEqual(bloom_filter.get_count(), len(values))
+        for value in values:
+            self.assertTrue(bloom_filter.might_contain(value), value)
+            self.assertTrue(loaded.might_contain(value), value)
+            self.assertTrue(bloom.file_might_contain(filename, value), value)
+
+        # with a rate of 0.001 about 5 of the missing values are false positives
+        false_positives = sum(1 for index in range(5000, 10000) if bloom.file_might_contain(filename, make_trace_id(index)))
+        self.assertLess(false_positives, 50)
+
+    def test_truncated_filter(self):
+        filename = os.path.join(self._dir, "trace.bloom")
+        bloom.build_filter([make_trace_id(0)], 1).save(filename)
+        with open(filename, "r+b") as fhandle:
+            fhandle.truncate(os.path.getsize(filename) - 1)
+
+        with self.assertRaises(RuntimeError):
+            bloom.BloomFilter.load(filename)
+
+
+class ArchiveFilterTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self.arch_dir = os.path.join(self._dir, "archive")
+        os.makedirs(self.arch_dir)
+        self.filename = os.path.join(self._dir, "2018-07-25-alblogs.db")
+
+        with logparser.open_logfile(FIXTURE_LOG) as fhandle:
+            self.records = list(logparser.parse_lines(fhandle))
+
+        db = logsdb.Database(self.filename, create=True)
+        db.open()
+        log_source_id = db.add_source(os.path.basename(FIXTURE_LOG))
+        for record in self.records:
+            db.save_record(log_source_id, record)
+        db.commit()
+        db.close()
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def test_stored_values_are_found(self):
+        jobs.write_bloom_filters(self.filename, self.arch_dir, client_filter=True)
+
+        for record in self.records:
+            self.assertTrue(archive.filter_might_contain(self.arch_dir, self.filename, "trace", record["trace_id"]))
+            self.assertTrue(archive.filter_might_contain(self.arch_dir, self.filename, "client", record["client_ip"]))
+
+    def test_missing_filter_might_contain_anything(self):
+        missing = "Root=1-5b57ad5e-ffffffffffffffffffffffff"
+        self.assertTrue(archive.filter_might_contain(self.arch_dir, self.filename, "trace", missing))
+        self.assertTrue(archive.filter_might_contain(self.arch_dir, self.filename, "client", "10.9.9.9"))
+
+        # with a filter the day is skipped, unless the value is a false positive
+        jobs.write_bloom_filters(self.filename, self.arch_dir, client_filter=False)
+        self.assertFalse(os.path.exists(archive.get_filter_filename(self.arch_dir, self.filename, "client")))
+        self.assertFalse(archive.filter_might_contain(self.arch_dir, self.filename, "trace", missing))
+        self.assertTrue(archive.filter_might_contain(self.arch_dir, self.filename, "client", "10.9.9.9"))
+
+
+if __name__ == "__main__":
+    unittest.main()
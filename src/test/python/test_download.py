@@ -0,0 +1,207 @@
+import os
+import sys
+import gzip
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "main", "python", "lib"))
+
+from alblogs import download
+from fakes3 import FakeS3Client
+
+BUCKET = "logs-bucket"
+PREFIX = "AWSLogs/123/elasticloadbalancing/eu-west-1/2018/07/25"
+
+LOG_LINE = ('https 2018-07-25T00:00:46.076050Z app/my-lb/50dc6c495c0c9188 10.0.1.18:38459 10.1.0.3:80 0.000 0.036 0.000 '
+            '200 200 363 38673 "GET https://example.com:443/api/v1/item{} HTTP/1.1" "Mozilla/5.0" '
+            'ECDHE-RSA-AES128-GCM-SHA256 TLSv1.2 arn:aws:elasticloadbalancing:eu-west-1:123:targetgroup/tg/73e2d6bc24d8a067 '
+            '"Root=1-58337262-5daeec044f2e2ee8b656a71{}" "example.com" "arn:aws:acm:eu-west-1:123:certificate/abc" 0 '
+            '2018-07-25T00:00:46.076050Z "forward" "-" "-"\n')
+
+
+def make_key(name):
+    return "{}/{}".format(PREFIX, name)
+
+
+def make_log(index, count):
+    return gzip.compress("".join(LOG_LINE.format(index, line) for line in range(count)).encode("latin-1"))
+
+
+class DownloadLogsTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        # a small page size, so listing needs more than one page
+        self.client = FakeS3Client(page_size=2)
+        for index in range(3):
+            self.client.put_object(BUCKET, make_key("f{}.log.gz".format(index)), "content of file {}".format(index).encode() * 10)
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def download(self):
+        return download.download_logs(self.client, BUCKET, PREFIX, self._dir, concurrency=2, retries=0, backoff_sec=0)
+
+    def read_file(self, name):
+        with open(os.path.join(self._dir, name), "rb") as fhandle:
+            return fhandle.read()
+
+    def read_manifest(self):
+        with open(os.path.join(self._dir, download.MANIFEST_NAME), "r") as fhandle:
+            return json.load(fhandle)
+
+    def test_download_all_files(self):
+        progress = self.download()
+
+        self.assertEqual(progress.get_downloaded_files(), 3)
+        self.assertEqual(sorted(self.read_manifest().keys()), ["f0.log.gz", "f1.log.gz", "f2.log.gz"])
+        self.assertEqual(self.read_file("f1.log.gz"), b"content of file 1" * 10)
+
+    def test_resume_after_failed_download(self):
+        self.client.fail(make_key("f1.log.gz"))
+        with self.assertRaises(RuntimeError):
+            self.download()
+
+        # the interrupted file is not left behind as a truncated log file, nor in the manifest
+        self.assertFalse(os.path.exists(os.path.join(self._dir, "f1.log.gz")))
+        self.assertEqual(sorted(self.read_manifest().keys()), ["f0.log.gz", "f2.log.gz"])
+
+        self.client.requested_keys = []
+        progress = self.download()
+
+        self.assertEqual(self.client.requested_keys, [make_key("f1.log.gz")])
+        self.assertEqual(progress.get_skipped_files(), 2)
+        self.assertEqual(self.read_file("f1.log.gz"), b"content of file 1" * 10)
+
+    def test_retry_after_failed_attempt(self):
+        self.client.fail(make_key("f1.log.gz"))
+        progress = download.download_logs(self.client, BUCKET, PREFIX, self._dir, concurrency=2, retries=1, backoff_sec=0)
+
+        self.assertEqual(progress.get_retries(), 1)
+        self.assertEqual(progress.get_failed_files(), 0)
+        self.assertEqual(self.read_file("f1.log.gz"), b"content of file 1" * 10)
+
+    def test_skip_downloaded_files(self):
+        self.download()
+        self.client.requested_keys = []
+        progress = self.download()
+
+        self.assertEqual(self.client.requested_keys, [])
+        self.assertEqual(progress.get_skipped_files(), 3)
+        self.assertEqual(progress.get_downloaded_files(), 0)
+
+    def test_skip_file_without_manifest_entry_matching_etag(self):
+        # files downloaded before the manifest existed are checked against the ETag (MD5)
+        with open(os.path.join(self._dir, "f0.log.gz"), "wb") as fhandle:
+            fhandle.write(b"content of file 0" * 10)
+        with open(os.path.join(self._dir, "f1.log.gz"), "wb") as fhandle:
+            fhandle.write(b"CONTENT OF FILE 1" * 10)
+
+        self.download()
+
+        self.assertEqual(sorted(self.client.requested_keys), [make_key("f1.log.gz"), make_key("f2.log.gz")])
+        self.assertEqual(self.read_file("f1.log.gz"), b"content of file 1" * 10)
+        self.assertIn("f0.log.gz", self.read_manifest())
+
+    def test_changed_object_is_downloaded_again(self):
+        self.download()
+        self.client.put_object(BUCKET, make_key("f2.log.gz"), b"changed content of file 2" * 10)
+        self.client.requested_keys = []
+        self.download()
+
+        self.assertEqual(self.client.requested_keys, [make_key("f2.log.gz")])
+        self.assertEqual(self.read_file("f2.log.gz"), b"changed content of file 2" * 10)
+
+
+class CountingBody(object):
+    def __init__(self, data):
+        self._data = data
+        self.position = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self._data)
+        block = self._data[self.position:self.position + size]
+        self.position += len(block)
+        return block
+
+
+class StreamLogsTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self.client = FakeS3Client()
+        for index in range(3):
+            self.client.put_object(BUCKET, make_key("f{}.log.gz".format(index)), make_log(index, index + 1))
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def stream(self, tee_dir=None, retries=0):
+        return dict((name, sum(1 for record in records)) for name, records in download.stream_logs(self.client, BUCKET, PREFIX, tee_dir, concurrency=2, retries=retries, backoff_sec=0))
+
+    def test_stream_without_tee_dir(self):
+        self.assertEqual(self.stream(), {"f0.log.gz": 1, "f1.log.gz": 2, "f2.log.gz": 3})
+        self.stream()
+
+        self.assertEqual(len(self.client.requested_keys), 6)
+
+    def test_stream_with_tee_dir(self):
+        self.stream(self._dir)
+
+        for index in range(3):
+            with open(os.path.join(self._dir, "f{}.log.gz".format(index)), "rb") as fhandle:
+                self.assertEqual(fhandle.read(), make_log(index, index + 1))
+
+    def test_resume_reads_downloaded_files(self):
+        self.client.fail(make_key("f1.log.gz"))
+        with self.assertRaises(RuntimeError):
+            self.stream(self._dir)
+
+        self.assertFalse(os.path.exists(os.path.join(self._dir, "f1.log.gz")))
+        self.client.requested_keys = []
+
+        # the file completed before the failure is read from the tee directory
+        self.assertEqual(self.stream(self._dir), {"f0.log.gz": 1, "f1.log.gz": 2, "f2.log.gz": 3})
+        self.assertIn(make_key("f1.log.gz"), self.client.requested_keys)
+        self.assertNotIn(make_key("f0.log.gz"), self.client.requested_keys)
+
+    def test_retry_continues_at_offset(self):
+        data = make_log(1, 2)
+        self.client.fail(make_key("f1.log.gz"), midway=True)
+
+        # the records of the first half are not parsed twice
+        self.assertEqual(self.stream(self._dir, retries=1), {"f0.log.gz": 1, "f1.log.gz": 2, "f2.log.gz": 3})
+        self.assertEqual(self.client.requested_ranges, [(make_key("f1.log.gz"), "bytes={}-".format(len(data) // 2))])
+        with open(os.path.join(self._dir, "f1.log.gz"), "rb") as fhandle:
+            self.assertEqual(fhandle.read(), data)
+
+    def test_records_parsed_while_downloading(self):
+        data = make_log(0, 2000)
+        self.client.put_object(BUCKET, make_key("big.log.gz"), data)
+        body = CountingBody(data)
+        get_object = self.client.get_object
+        self.client.get_object = lambda Bucket, Key, Range=None: {"Body": body} if Key == make_key("big.log.gz") else get_object(Bucket, Key, Range)
+
+        buffer_size = download.BUFFER_SIZE
+        queue_blocks = download.STREAM_QUEUE_BLOCKS
+        download.BUFFER_SIZE = 1024
+        download.STREAM_QUEUE_BLOCKS = 1
+        try:
+            for name, records in download.stream_logs(self.client, BUCKET, PREFIX, concurrency=2, retries=0, backoff_sec=0):
+                if name == "big.log.gz":
+                    next(records)
+                    # with blocks of 1 KB and a queue of 1 block only a few blocks are read ahead
+                    self.assertLess(body.position, len(data) // 2)
+                    self.assertEqual(sum(1 for record in records), 1999)
+        finally:
+            download.BUFFER_SIZE = buffer_size
+            download.STREAM_QUEUE_BLOCKS = queue_blocks
+
+        self.assertEqual(body.position, len(data))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "main", "python", "lib"))
+
+from alblogs import logparser
+
+LOG_LINE = ('{type} 2018-07-25T00:00:46.076050Z app/my-lb/50dc6c495c0c9188 {client} {target} {times} '
+            '{status_codes} 363 38673 "{request}" "{user_agent}" '
+            'ECDHE-RSA-AES128-GCM-SHA256 TLSv1.2 arn:aws:elasticloadbalancing:eu-west-1:123:targetgroup/tg/73e2d6bc24d8a067 '
+            '"Root=1-58337262-5daeec044f2e2ee8b656a712" "{domain}" "{cert}" 0 '
+            '2018-07-25T00:00:46.076050Z "forward" "-" "-"')
+
+DEFAULT_FIELDS = {"type": "https",
+                  "client": "10.0.1.18:38459",
+                  "target": "10.1.0.3:80",
+                  "times": "0.000 0.036 0.000",
+                  "status_codes": "200 200",
+                  "request": "GET https://example.com:443/api/v1/item?id=1 HTTP/1.1",
+                  "user_agent": "Mozilla/5.0",
+                  "domain": "example.com",
+                  "cert": "arn:aws:acm:eu-west-1:123:certificate/abc"}
+
+
+def make_line(**fields):
+    values = dict(DEFAULT_FIELDS)
+    values.update(fields)
+    return LOG_LINE.format(**values)
+
+
+class TokenizerTest(unittest.TestCase):
+
+    def assertSameFields(self, line):
+        fields = logparser.tokenize_line(line)
+        self.assertIsNotNone(fields)
+        self.assertEqual(fields, logparser.match_line(line))
+        return fields
+
+    def test_plain_line(self):
+        fields = self.assertSameFields(make_line())
+        self.assertEqual(fields[15], "https://example.com:443/api/v1/item?id=1")
+
+    def test_user_agent_with_spaces(self):
+        user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/67.0.3396.99"
+        fields = self.assertSameFields(make_line(user_agent=user_agent))
+        self.assertEqual(fields[17], user_agent)
+
+    def test_request_types(self):
+        for request_type in ("http", "h2", "ws", "wss"):
+            self.assertSameFields(make_line(type=request_type))
+
+    def test_error_status_without_target_status(self):
+        fields = self.assertSameFields(make_line(times="0.000 -1 -1", status_codes="502 -"))
+        self.assertEqual(fields[8:12], ["-1", "-1", "502", "-"])
+
+    def test_ipv6_client(self):
+        self.assertSameFields(make_line(client="2001:db8::8a2e:370:7334:38459"))
+
+    def test_empty_quoted_fields(self):
+        self.assertSameFields(make_line(user_agent="", domain="", cert="-"))
+
+    def test_request_without_http_version(self):
+        self.assertSameFields(make_line(request="- http://example.com:80- -"))
+
+    def test_escaped_quotes_fall_back_to_regex(self):
+        line = make_line(user_agent='Mozilla/5.0 \\"quoted\\" agent')
+
+        self.assertIsNone(logparser.tokenize_line(line))
+        self.assertEqual(logparser.parse_line(line), logparser.build_record(logparser.match_line(line)))
+
+    def test_line_without_target_is_not_parsed(self):
+        # the target is "-" when the request was not forwarded, neither format matches such lines
+        line = make_line(target="-", times="-1 -1 -1", status_codes="460 -")
+
+        self.assertIsNone(logparser.tokenize_line(line))
+        self.assertIsNone(logparser.match_line(line))
+
+
+if __name__ == "__main__":
+    unittest.main()
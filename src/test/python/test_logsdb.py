@@ -0,0 +1,147 @@
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "main", "python", "lib"))
+
+from alblogs import logsdb, logparser
+
+LOG_LINE = ('https 2018-07-25T0{}:0{}:46.076050Z app/my-lb/50dc6c495c0c9188 10.0.1.18:38459 10.1.0.3:80 0.000 0.036 0.000 '
+            '200 200 363 38673 "GET https://example.com:443/api/v1/item?id=1 HTTP/1.1" "Mozilla/5.0" '
+            'ECDHE-RSA-AES128-GCM-SHA256 TLSv1.2 arn:aws:elasticloadbalancing:eu-west-1:123:targetgroup/tg/73e2d6bc24d8a067 '
+            '"Root=1-58337262-5daeec044f2e2ee8b656a712" "example.com" "arn:aws:acm:eu-west-1:123:certificate/abc" 0 '
+            '2018-07-25T00:00:46.076050Z "forward" "-" "-"')
+
+
+def make_record(hour, minute):
+    return logparser.parse_line(LOG_LINE.format(hour, minute))
+
+
+class DimensionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self._dir, "logs.db")
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def open(self):
+        db = logsdb.Database(self.filename, create=True)
+        db.open()
+        return db
+
+    def save(self, db, logname, records):
+        log_source_id = db.add_source(logname)
+        for record in records:
+            db.save_record(log_source_id, record)
+        db.commit()
+
+    def test_reopened_database_hits_warmed_cache(self):
+        db = self.open()
+        self.save(db, "first.log", [make_record(7, 5), make_record(8, 6)])
+        db.close()
+
+        db = self.open()
+        try:
+            self.save(db, "second.log", [make_record(7, 5), make_record(8, 6)])
+            stats = db.get_cache_stats()
+            hour_count = db._get_cursor().execute("SELECT COUNT(*) FROM `log_hour`;").fetchone()[0]
+        finally:
+            db.close()
+
+        # the parsed hour and minute strings ("07") match the integers read from the database
+        for tablename in ("log_hour", "log_minute"):
+            self.assertEqual(stats[tablename], {"size": 2, "max_size": None, "hits": 2, "misses": 0})
+        self.assertEqual(hour_count, 2)
+
+    def test_entry_batch_hits_warmed_cache(self):
+        db = self.open()
+        self.save(db, "first.log", [make_record(7, 5)])
+        db.close()
+
+        batch = logsdb.EntryBatch()
+        batch.add_record(make_record(7, 5))
+        db = self.open()
+        try:
+            db.save_entry_batch(db.add_source("second.log"), batch)
+            db.commit()
+            stats = db.get_cache_stats()
+        finally:
+            db.close()
+
+        self.assertEqual(stats["log_minute"]["hits"], 1)
+        self.assertEqual(stats["log_minute"]["size"], 1)
+
+
+class CompactDatabaseTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self._dir, "logs.db")
+        self.target_filename = os.path.join(self._dir, "compacted.db")
+
+        db = logsdb.Database(self.filename, create=True)
+        db.open()
+        log_source_id = db.add_source("test.log")
+        for index in range(500):
+            db.save_record(log_source_id, make_record(index % 10, index % 7))
+        db.commit()
+        # the deleted entries leave free pages behind
+        db._get_cursor().execute("DELETE FROM `log_query_param_value` WHERE `log_entry_id` > 100;")
+        db._get_cursor().execute("DELETE FROM `log_entry` WHERE `id` > 100;")
+        db.commit()
+        db.close()
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def dump(self, filename):
+        conn = sqlite3.connect(filename)
+        try:
+            sql = "SELECT `name` FROM `sqlite_master` WHERE `type` = 'table' AND `name` NOT LIKE 'sqlite_%' ORDER BY `name`;"
+            return dict((tablename, conn.execute("SELECT * FROM `{}` ORDER BY 1;".format(tablename)).fetchall()) for (tablename, ) in conn.execute(sql).fetchall())
+        finally:
+            conn.close()
+
+    def check_compacted(self, drop_indexes):
+        logsdb.compact_database(self.filename, self.target_filename, drop_indexes)
+
+        self.assertEqual(self.dump(self.target_filename), self.dump(self.filename))
+        self.assertLess(os.path.getsize(self.target_filename), os.path.getsize(self.filename))
+
+        secondary_indexes = set(indexname for (indexname, sql) in logsdb.SECONDARY_INDEXES)
+        db = logsdb.Database(self.target_filename)
+        db.open()
+        try:
+            index_count = len(db._get_index_names() & secondary_indexes)
+            db.ensure_secondary_indexes()
+            self.assertEqual(db._get_index_names() & secondary_indexes, secondary_indexes)
+            self.assertEqual(db._get_cursor().execute("PRAGMA integrity_check;").fetchone()[0], "ok")
+        finally:
+            db.close()
+
+        return index_count
+
+    def test_compact(self):
+        self.assertEqual(self.check_compacted(drop_indexes=False), len(logsdb.SECONDARY_INDEXES))
+
+    def test_compact_without_indexes(self):
+        self.assertEqual(self.check_compacted(drop_indexes=True), 0)
+
+    def test_existing_target(self):
+        with open(self.target_filename, "wb") as fhandle:
+            fhandle.write(b"existing")
+
+        with self.assertRaises(RuntimeError):
+            logsdb.compact_database(self.filename, self.target_filename)
+
+        with open(self.target_filename, "rb") as fhandle:
+            self.assertEqual(fhandle.read(), b"existing")
+
+
+if __name__ == "__main__":
+    unittest.main()
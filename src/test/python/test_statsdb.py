@@ -0,0 +1,254 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "main", "python", "lib"))
+
+from alblogs import statsdb, logsdb, logparser
+from alblogs import aggregator as aggregator_module
+
+FIXTURE_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "2018-07-25.log")
+
+MEASURE_COLUMNS = ", ".join("`sts`.`{}`".format(column) for column in statsdb.TRANSFER_MEASURE_COLUMNS)
+
+# The stats rows with their dimension values instead of ids, the ids differ between databases
+STATS_DUMP_SQL = {
+    "stats_url": """SELECT `dte`.`date`, `hr`.`hour`, `url`.`url`, `rte`.`reqtype`, `sts`.`elb_status_code`, typeof(`sts`.`elb_status_code`), {0}, `src`.`date`
+                    FROM   `stats_url` `sts`
+                    JOIN   `log_date` `dte` ON `dte`.`id` = `sts`.`log_date_id`
+                    JOIN   `log_hour` `hr` ON `hr`.`id` = `sts`.`log_hour_id`
+                    JOIN   `log_url` `url` ON `url`.`id` = `sts`.`log_url_id`
+                    JOIN   `log_reqtype` `rte` ON `rte`.`id` = `sts`.`log_reqtype_id`
+                    JOIN   `log_date` `src` ON `src`.`id` = `sts`.`source_log_date_id`
+                    ORDER BY 1, 2, 3, 4""".format(MEASURE_COLUMNS),
+    "stats_target_address": """SELECT `dte`.`date`, `hr`.`hour`, `tad`.`target_address`, `sts`.`target_port`, {0}, `src`.`date`
+                               FROM   `stats_target_address` `sts`
+                               JOIN   `log_date` `dte` ON `dte`.`id` = `sts`.`log_date_id`
+                               JOIN   `log_hour` `hr` ON `hr`.`id` = `sts`.`log_hour_id`
+                               JOIN   `log_target_address` `tad` ON `tad`.`id` = `sts`.`log_target_address_id`
+                               JOIN   `log_date` `src` ON `src`.`id` = `sts`.`source_log_date_id`
+                               ORDER BY 1, 2, 3, 4""".format(MEASURE_COLUMNS),
+    "stats_status_code": """SELECT `dte`.`date`, `hr`.`hour`, `sts`.`target_status_code`, typeof(`sts`.`target_status_code`), `sts`.`elb_status_code`, typeof(`sts`.`elb_status_code`), {0}, `src`.`date`
+                            FROM   `stats_status_code` `sts`
+                            JOIN   `log_date` `dte` ON `dte`.`id` = `sts`.`log_date_id`
+                            JOIN   `log_hour` `hr` ON `hr`.`id` = `sts`.`log_hour_id`
+                            JOIN   `log_date` `src` ON `src`.`id` = `sts`.`source_log_date_id`
+                            ORDER BY 1, 2, 3, 5""".format(MEASURE_COLUMNS)}
+
+
+def make_record(datestr, hour, url="https://example.com:443/api/v1/item"):
+    return {"datepart": datestr, "hourpart": "{:02d}".format(hour), "elb_status_code": "200",
+            "request_processing_time": 0.001, "target_processing_time": 0.5, "response_processing_time": 0.001,
+            "received_bytes": "100", "sent_bytes": "1000", "request_url": url, "type": "https",
+            "target_ip": "10.1.0.1", "target_port": "80", "target_status_code": "200"}
+
+
+def aggregate(records):
+    aggregator = aggregator_module.StatsAggregator()
+    for record in records:
+        aggregator.add_record(record)
+    return aggregator
+
+
+class LoadedDateCatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self.db = statsdb.Database(os.path.join(self._dir, "stats.db"), create=True)
+        self.db.open()
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self._dir)
+
+    def load(self, datestr, records):
+        aggregator = aggregate(records)
+        self.db.replace_date(datestr, aggregator.get_url_stats(), aggregator.get_target_address_stats(), aggregator.get_status_code_stats())
+
+    def test_spill_over_date_is_not_loaded(self):
+        # the logs of a date start with a few entries of the previous date
+        self.load("2018-07-25", [make_record("2018-07-24", 23)] * 2 + [make_record("2018-07-25", 10)] * 5)
+
+        self.assertTrue(self.db.is_date_loaded("2018-07-25"))
+        self.assertFalse(self.db.is_date_loaded("2018-07-24"))
+        self.assertEqual(self.db.query_missing_dates("2018-07-24", "2018-07-25"), ["2018-07-24"])
+        self.assertEqual(self.db.query_min_date(), "2018-07-25")
+        self.assertEqual(self.db.query_max_date(), "2018-07-25")
+
+        # the rollups still include the spill-over rows
+        self.assertEqual(self.db.query_day_totals("2018-07-24").fetchone()["request_count"], 2)
+        self.assertEqual(self.db.query_loaded_date("2018-07-25")["request_count"], 7)
+
+    def test_reload_of_neighbour_keeps_catalog_entry(self):
+        self.load("2018-07-24", [make_record("2018-07-24", 10)] * 3)
+        self.load("2018-07-25", [make_record("2018-07-24", 23)] * 2 + [make_record("2018-07-25", 10)] * 5)
+        self.load("2018-07-25", [make_record("2018-07-24", 23)] * 1 + [make_record("2018-07-25", 10)] * 4)
+
+        self.assertEqual(self.db.query_loaded_date("2018-07-24")["request_count"], 3)
+        self.assertEqual(self.db.query_loaded_date("2018-07-25")["request_count"], 5)
+        self.assertEqual(self.db.query_day_totals("2018-07-24").fetchone()["request_count"], 4)
+
+    def test_replace_removes_spill_over_rows_of_source_date(self):
+        self.load("2018-07-25", [make_record("2018-07-24", 23)] * 2 + [make_record("2018-07-25", 10)] * 5)
+        self.load("2018-07-25", [make_record("2018-07-25", 10)] * 6)
+
+        self.assertIsNone(self.db.query_day_totals("2018-07-24").fetchone()["request_count"])
+        self.assertEqual(self.db.query_loaded_date("2018-07-25")["request_count"], 6)
+        self.assertEqual(self.db.query_loaded_date("2018-07-25")["target_address_row_count"], 1)
+
+    def test_neighbour_loaded_own_load_failed(self):
+        # backfill of 24-26, the load of 25 failed while 26 (with entries of 25) succeeded, a rerun
+        # without --replace must process 25 again
+        self.load("2018-07-24", [make_record("2018-07-24", 10)] * 3)
+        self.load("2018-07-26", [make_record("2018-07-25", 23)] * 2 + [make_record("2018-07-26", 10)] * 5)
+
+        self.assertFalse(self.db.is_date_loaded("2018-07-25"))
+        self.assertEqual(self.db.query_missing_dates("2018-07-24", "2018-07-26"), ["2018-07-25"])
+
+    def test_empty_reload_removes_catalog_entry(self):
+        self.load("2018-07-25", [make_record("2018-07-25", 10)] * 5)
+        self.load("2018-07-25", [])
+
+        self.assertFalse(self.db.is_date_loaded("2018-07-25"))
+
+
+class StatsPathTest(unittest.TestCase):
+    # The stats aggregated while parsing must be the same as the stats transferred from the logs database
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        with logparser.open_logfile(FIXTURE_LOG) as fhandle:
+            self.records = list(logparser.parse_lines(fhandle))
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def open_statsdb(self, name):
+        db = statsdb.Database(os.path.join(self._dir, name), create=True)
+        db.open()
+        return db
+
+    def dump(self, db, tablename):
+        return [tuple(row) for row in db._get_cursor().execute(STATS_DUMP_SQL[tablename])]
+
+    def test_aggregated_stats_match_transferred_stats(self):
+        logsdb_file = os.path.join(self._dir, "logs.db")
+        db = logsdb.Database(logsdb_file, create=True)
+        db.open()
+        log_source_id = db.add_source(os.path.basename(FIXTURE_LOG))
+        for record in self.records:
+            db.save_record(log_source_id, record)
+        db.commit()
+        db.close()
+
+        transferred = self.open_statsdb("transferred.db")
+        transferred.transfer_date("2018-07-25", logsdb_file)
+        transferred.commit()
+
+        aggregated = self.open_statsdb("aggregated.db")
+        aggregator = aggregate(self.records)
+        aggregated.replace_date("2018-07-25", aggregator.get_url_stats(), aggregator.get_target_address_stats(), aggregator.get_status_code_stats())
+        aggregated.commit()
+
+        try:
+            for tablename in sorted(STATS_DUMP_SQL.keys()):
+                rows = self.dump(aggregated, tablename)
+                self.assertTrue(len(rows) > 0)
+                self.assertEqual(rows, self.dump(transferred, tablename), tablename)
+
+            # the url row of the hour with a 502 gets the highest elb status code of its entries
+            self.assertIn(("2018-07-25", 0, "https://example.com:443/api/v1/item", "https", 502, "integer"),
+                          [row[:6] for row in self.dump(aggregated, "stats_url")])
+            # a missing target status code is kept as text, the -1 times count as 0
+            status_rows = [row for row in self.dump(aggregated, "stats_status_code") if row[2] == "-"]
+            self.assertEqual(sorted(row[4] for row in status_rows), [460, 502, 504])
+            self.assertEqual(set(row[3] for row in status_rows), {"text"})
+            self.assertEqual(set(row[10] for row in status_rows), {0})
+        finally:
+            transferred.close()
+            aggregated.close()
+
+
+class MergeDatabaseTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._databases = []
+
+    def tearDown(self):
+        for db in self._databases:
+            db.close()
+        shutil.rmtree(self._dir)
+
+    def open_statsdb(self, name):
+        db = statsdb.Database(os.path.join(self._dir, name), create=True)
+        db.open()
+        self._databases.append(db)
+        return db
+
+    def load(self, db, datestr, records):
+        aggregator = aggregate(records)
+        db.replace_date(datestr, aggregator.get_url_stats(), aggregator.get_target_address_stats(), aggregator.get_status_code_stats())
+        db.commit()
+
+    def dump(self, db, tablename):
+        return [tuple(row) for row in db._get_cursor().execute(STATS_DUMP_SQL[tablename])]
+
+    def dump_catalog(self, db):
+        sql = "SELECT `date`, `url_row_count`, `target_address_row_count`, `status_code_row_count`, `request_count` FROM `stats_loaded_date` ORDER BY `date`;"
+        return [tuple(row) for row in db._get_cursor().execute(sql)]
+
+    def test_merge_partial_databases(self):
+        first_day = [make_record("2018-07-24", 10, "https://example.com:443/a")] * 3 + [make_record("2018-07-24", 11, "https://example.com:443/b")] * 2
+        # the second day starts with entries of the first day and adds its dimension values in another order
+        second_day = ([make_record("2018-07-24", 23, "https://example.com:443/c"), make_record("2018-07-24", 23, "https://example.com:443/d")]
+                      + [make_record("2018-07-25", 11, "https://example.com:443/b")] * 4
+                      + [dict(make_record("2018-07-25", 10, "https://example.com:443/a"), target_ip="10.1.0.2")] * 5)
+
+        first = self.open_statsdb("first.db")
+        self.load(first, "2018-07-24", first_day)
+        second = self.open_statsdb("second.db")
+        self.load(second, "2018-07-25", second_day)
+
+        merged = self.open_statsdb("merged.db")
+        merged.merge_database(first._filename)
+        merged.merge_database(second._filename)
+        merged.commit()
+
+        expected = self.open_statsdb("expected.db")
+        self.load(expected, "2018-07-24", first_day)
+        self.load(expected, "2018-07-25", second_day)
+
+        # the dimension ids of the partial databases are remapped on their values
+        self.assertNotEqual(first.get_or_add_url("https://example.com:443/b"), second.get_or_add_url("https://example.com:443/b"))
+        for tablename in sorted(STATS_DUMP_SQL.keys()):
+            self.assertEqual(self.dump(merged, tablename), self.dump(expected, tablename), tablename)
+
+        self.assertEqual(merged.query_day_totals("2018-07-24").fetchone()["request_count"], 7)
+        self.assertEqual(merged.query_day_totals("2018-07-25").fetchone()["request_count"], 9)
+        self.assertEqual(self.dump_catalog(merged), self.dump_catalog(expected))
+        self.assertEqual(merged.query_loaded_date("2018-07-25")["request_count"], 11)
+
+    def test_merge_replaces_source_date(self):
+        merged = self.open_statsdb("merged.db")
+        self.load(merged, "2018-07-25", [make_record("2018-07-24", 23)] * 2 + [make_record("2018-07-25", 10)] * 5)
+
+        partial = self.open_statsdb("partial.db")
+        self.load(partial, "2018-07-25", [make_record("2018-07-25", 10)] * 4)
+
+        merged.merge_database(partial._filename)
+        merged.commit()
+
+        self.assertIsNone(merged.query_day_totals("2018-07-24").fetchone()["request_count"])
+        self.assertEqual(merged.query_loaded_date("2018-07-25")["request_count"], 4)
+
+        merged.merge_database(partial._filename, append=True)
+        merged.commit()
+
+        self.assertEqual(merged.query_loaded_date("2018-07-25")["request_count"], 8)
+
+
+if __name__ == "__main__":
+    unittest.main()